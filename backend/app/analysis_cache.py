@@ -0,0 +1,175 @@
+"""
+Analysis result cache - content-addressed, size-bounded LRU
+
+Results are keyed on the SHA-256 of the uploaded file, the sorted team Riot
+IDs and ANALYTICS_VERSION, so a re-opened analysis is served from memory
+without re-parsing the upload or re-rendering anything. Charts are stored on
+disk under the same content-derived analysis ID.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Bump whenever ScrimAnalytics output changes, so stale cached results are never served
+ANALYTICS_VERSION = "6"
+
+# Cache limits (per worker process)
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "64"))
+ANALYSIS_CACHE_MAX_MB = int(os.getenv("ANALYSIS_CACHE_MAX_MB", "128"))
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# Charts: exports/charts/<analysis_id>/<chart_name>.png
+CHARTS_DIR = Path(__file__).parent.parent / "exports" / "charts"
+CHART_NAMES = ("winrate", "kda", "radar")
+_ANALYSIS_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# (path, size, mtime) -> digest, so unchanged files are only hashed once
+_digest_memo: Dict[Tuple[str, int, int], str] = {}
+_digest_lock = threading.Lock()
+
+
+def file_digest(path: Path) -> str:
+    """SHA-256 of a file's content (memoized on path, size and mtime)"""
+    path = Path(path)
+    stat = path.stat()
+    memo_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+
+    with _digest_lock:
+        digest = _digest_memo.get(memo_key)
+    if digest:
+        return digest
+
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+
+    with _digest_lock:
+        if len(_digest_memo) >= 1024:
+            _digest_memo.clear()
+        _digest_memo[memo_key] = digest
+    return digest
+
+
+def remember_file_digest(path: Path, digest: str):
+    """Record the digest of a file that was hashed while it was written"""
+    path = Path(path)
+    stat = path.stat()
+    with _digest_lock:
+        if len(_digest_memo) >= 1024:
+            _digest_memo.clear()
+        _digest_memo[(str(path.resolve()), stat.st_size, stat.st_mtime_ns)] = digest
+
+
+def analysis_key(digest: str, team_riot_ids: Optional[List[str]] = None, *extra: str) -> str:
+    """Cache key for one analysis of one upload"""
+    payload = json.dumps(
+        [ANALYTICS_VERSION, digest, sorted(team_riot_ids or []), list(extra)],
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_analysis_id(value: str) -> bool:
+    """Whether a string is a well-formed analysis ID (safe to use in a path)"""
+    return bool(_ANALYSIS_ID_RE.match(value or ""))
+
+
+def chart_path(analysis_id: str, chart_name: str) -> Path:
+    """On-disk location of one chart of one analysis"""
+    return CHARTS_DIR / analysis_id / f"{chart_name}.png"
+
+
+def chart_url(analysis_id: str, chart_name: str) -> str:
+    """Immutable URL of one chart (content never changes for a given analysis ID)"""
+    return f"/api/charts/{analysis_id}/{chart_name}"
+
+
+def write_chart_manifest(analysis_id: str, data_file: Path, team_riot_ids: Optional[List[str]] = None):
+    """Record what an analysis was computed from, so its charts can be rendered on first request"""
+    manifest_path = CHARTS_DIR / analysis_id / "manifest.json"
+    if manifest_path.exists():
+        return
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = manifest_path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"data_file": str(data_file), "team_riot_ids": list(team_riot_ids or [])}, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def read_chart_manifest(analysis_id: str) -> Optional[Dict[str, Any]]:
+    """Manifest written by write_chart_manifest, or None if the analysis is unknown"""
+    try:
+        with open(CHARTS_DIR / analysis_id / "manifest.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class AnalysisCache:
+    """Thread-safe LRU cache of JSON-compatible results, bounded by entries and bytes"""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: Any):
+        size = len(json.dumps(value, separators=(",", ":"), default=str))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+
+            # Evict least recently used entries until both limits hold
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# Global cache instance
+analysis_cache = AnalysisCache(
+    max_entries=ANALYSIS_CACHE_MAX_ENTRIES,
+    max_bytes=ANALYSIS_CACHE_MAX_MB * 1024 * 1024
+)
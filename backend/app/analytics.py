@@ -2,37 +2,69 @@
 Analytics module - Adapts the Python script to work as an API service
 """
 import json
-import pandas as pd
+import os
+import tempfile
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')  # Non-GUI backend for server
-import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+from datetime import datetime
 import math
-from io import BytesIO
-from PIL import Image
 
-class ScrimAnalytics:
-    """Process and analyze League of Legends scrim data"""
+from match_table import MatchTable, load_artifact, save_artifact, merge_player_state
+from match_store import read_manifest, load_match_table, load_timelines
+from timeline import TimelineFrames
+from analysis_cache import (
+    ANALYTICS_VERSION, analysis_key, file_digest, chart_path, chart_url, write_chart_manifest, CHART_NAMES
+)
+
+# Row columns coerced to numbers (legacy "players" uploads may carry strings)
+NUMERIC_ROW_COLUMNS = [
+    "games_played", "wins", "losses", "winrate", "kda",
+    "total_kills", "total_deaths", "total_assists",
+    "avg_kill_participation", "per_min_damage", "per_min_gold", "per_min_cs"
+]
 
-    def __init__(self, data_file: Path, team_riot_ids: List[str] = None):
-        self.data_file = Path(data_file)
-        self.team_riot_ids = team_riot_ids or []  # RIOT IDs to filter (e.g., ["Player#TAG"])
-        self.export_dir = Path(__file__).parent.parent / "exports"
-        self.charts_dir = self.export_dir / "charts"
-        self.charts_dir.mkdir(parents=True, exist_ok=True)
 
-        # Load data
-        with open(self.data_file, 'r', encoding='utf-8') as f:
-            self.raw_data = json.load(f)
+def _to_number(value) -> Optional[float]:
+    """Coerce a value to a number, None if it is not numeric"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
 
-        # Detect data format and normalize
-        self._normalize_data()
 
-        # Configure matplotlib
-        self._setup_plotting()
+class ScrimAnalytics:
+    """Process and analyze League of Legends scrim data"""
+
+    def __init__(self, data_file: Optional[Path], team_riot_ids: List[str] = None, analysis_id: Optional[str] = None,
+                 players_state: Optional[Dict[str, Dict]] = None):
+        self.data_file = Path(data_file) if data_file else None
+        self.team_riot_ids = team_riot_ids or []  # RIOT IDs to filter (e.g., ["Player#TAG"])
+        # Content-derived ID: same upload + same team filter = same charts
+        if analysis_id is None and self.data_file is not None:
+            analysis_id = analysis_key(file_digest(self.data_file), self.team_riot_ids)
+        self.analysis_id = analysis_id
+        self._rows_cache = {}
+
+        # Load data: stored running aggregates, the memory-mapped columnar artifact
+        # if the upload has one, the match store (manifest uploads), else the JSON
+        self.match_table = None if players_state is not None else load_artifact(self.data_file)
+        if self.match_table is None and players_state is None and read_manifest(self.data_file) is not None:
+            self.match_table = load_match_table(self.data_file)
+
+        if players_state is not None:
+            self.raw_data = {"players": self._summarize_players(players_state)}
+        elif self.match_table is not None:
+            players_data = self.match_table.player_state(self.team_riot_ids)
+            self.raw_data = {"players": self._summarize_players(players_data)}
+        else:
+            with open(self.data_file, 'r', encoding='utf-8') as f:
+                self.raw_data = json.load(f)
+
+            # Detect data format and normalize
+            self._normalize_data()
 
     def _normalize_data(self):
         """Detect and normalize different JSON formats"""
@@ -50,123 +82,20 @@ class ScrimAnalytics:
 
     def _parse_riot_api_matches(self, matches: List[Dict]) -> List[Dict]:
         """Parse Riot API matches format into players analytics format"""
-        from collections import defaultdict
-        import random
-
-        # Track stats per player (by RIOT ID or PUUID for opponents)
-        players_data = defaultdict(lambda: {
-            "games": 0,
-            "wins": 0,
-            "losses": 0,
-            "totals": defaultdict(int),
-            "champions": defaultdict(lambda: {
-                "games": 0,
-                "wins": 0,
-                "kills": 0,
-                "deaths": 0,
-                "assists": 0,
-                "damage": 0
-            }),
-            "summoner_name": "",
-            "riot_id": "",
-            "position": "",
-            "total_game_time": 0,
-            "total_team_kills": 0,  # For KP calculation
-            "is_team_member": False  # Track if player is in our team
-        })
-
-        # Counter for anonymized opponents
-        opponent_counter = {}
-
-        # Process each match
-        for match in matches:
-            if "info" not in match or "participants" not in match["info"]:
-                continue
+        # Load every participant once into a columnar table, then aggregate
+        self.match_table = MatchTable.from_matches(matches)
+
+        # Keep it so later analyses of this upload skip JSON parsing
+        try:
+            save_artifact(self.match_table, self.data_file)
+        except OSError:
+            pass
 
-            game_duration_minutes = match["info"].get("gameDuration", 0) / 60.0
-            participants = match["info"]["participants"]
-
-            # Calculate team kills per team (100 vs 200)
-            team_kills = {100: 0, 200: 0}
-            for p in participants:
-                team_id = p.get("teamId", 0)
-                team_kills[team_id] += p.get("kills", 0)
-
-            for participant in participants:
-                # Build RIOT ID
-                riot_game_name = participant.get("riotIdGameName", "")
-                riot_tagline = participant.get("riotIdTagline", "")
-                riot_id = f"{riot_game_name}#{riot_tagline}" if riot_game_name and riot_tagline else ""
-
-                puuid = participant.get("puuid", "")
-
-                # Check if this is a team member
-                is_team = riot_id in self.team_riot_ids if self.team_riot_ids else True
-
-                # Use RIOT ID for team members, PUUID for opponents
-                player_key = riot_id if is_team else puuid
-
-                # Skip if no valid key
-                if not player_key:
-                    continue
-
-                player = players_data[player_key]
-                player["is_team_member"] = is_team
-
-                # Basic info (use most recent)
-                player["summoner_name"] = participant.get("summonerName", riot_game_name or "Unknown")
-                player["riot_id"] = riot_id
-                player["position"] = participant.get("teamPosition",
-                    participant.get("individualPosition", "UNKNOWN"))
-
-                # Game count
-                player["games"] += 1
-
-                # Win/Loss
-                if participant.get("win", False):
-                    player["wins"] += 1
-                else:
-                    player["losses"] += 1
-
-                # Get player's team kills for KP
-                team_id = participant.get("teamId", 0)
-                player_team_kills = team_kills.get(team_id, 1)  # Avoid division by zero
-
-                # Totals
-                kills = participant.get("kills", 0)
-                deaths = participant.get("deaths", 0)
-                assists = participant.get("assists", 0)
-
-                player["totals"]["kills"] += kills
-                player["totals"]["deaths"] += deaths
-                player["totals"]["assists"] += assists
-                player["totals"]["damage"] += participant.get("totalDamageDealtToChampions", 0)
-                player["totals"]["gold"] += participant.get("goldEarned", 0)
-                player["totals"]["cs"] += (participant.get("totalMinionsKilled", 0) +
-                                          participant.get("neutralMinionsKilled", 0))
-                player["totals"]["vision_score"] += participant.get("visionScore", 0)
-                player["totals"]["wards_placed"] += participant.get("wardsPlaced", 0)
-                player["totals"]["wards_destroyed"] += participant.get("wardsKilled", 0)
-                player["totals"]["damage_to_objectives"] += participant.get("damageDealtToObjectives", 0)
-                player["totals"]["damage_to_buildings"] += participant.get("damageDealtToBuildings", 0)
-
-                # Track team kills for KP calculation
-                player["total_team_kills"] += player_team_kills
-
-                # Track game time
-                player["total_game_time"] += game_duration_minutes
-
-                # Champion stats
-                champion_name = participant.get("championName", "Unknown")
-                champ = player["champions"][champion_name]
-                champ["games"] += 1
-                if participant.get("win", False):
-                    champ["wins"] += 1
-                champ["kills"] += kills
-                champ["deaths"] += deaths
-                champ["assists"] += assists
-                champ["damage"] += participant.get("totalDamageDealtToChampions", 0)
+        players_data = self.match_table.player_state(self.team_riot_ids)
+        return self._summarize_players(players_data)
 
+    def _summarize_players(self, players_data: Dict[str, Dict]) -> List[Dict]:
+        """Convert per-player running aggregates into the players analytics format"""
         # Convert to analytics format
         result = []
         opponent_id_map = {}  # Map puuid to anonymized name
@@ -264,7 +193,11 @@ class ScrimAnalytics:
         return self.team_players
 
     def _setup_plotting(self):
-        """Configure matplotlib style"""
+        """Import matplotlib (on first chart render only) and configure its style"""
+        import matplotlib
+        matplotlib.use('Agg')  # Non-GUI backend for server
+        import matplotlib.pyplot as plt
+
         plt.style.use('default')
         plt.rcParams['font.family'] = 'sans-serif'
         plt.rcParams['font.size'] = 11
@@ -272,58 +205,61 @@ class ScrimAnalytics:
         plt.rcParams['axes.facecolor'] = 'white'
         plt.rcParams['axes.grid'] = True
         plt.rcParams['grid.alpha'] = 0.3
+        return plt
+
+    def _player_row(self, p: Dict) -> Dict[str, Any]:
+        """Flatten one player's aggregates into an overview/chart row"""
+        # Calculate KDA: (Kills + Assists) / Deaths (avoid division by zero)
+        totals = p.get("totals", {})
+        kills = totals.get("kills", 0)
+        deaths = totals.get("deaths", 0)
+        assists = totals.get("assists", 0)
+        kda = round((kills + assists) / deaths, 1) if deaths > 0 else round(kills + assists, 1)
+
+        row = {
+            "name": p.get("summoner_name"),
+            "position": p.get("position"),
+            "games_played": p.get("games"),
+            "wins": p.get("wins"),
+            "losses": p.get("losses"),
+            "winrate": p.get("winrate"),
+            "kda": kda,
+        }
 
-    def _expand_players(self, players: List[Dict]) -> pd.DataFrame:
-        """Convert players data to DataFrame"""
-        rows = []
-        for p in players:
-            # Calculate KDA: (Kills + Assists) / Deaths (avoid division by zero)
-            totals = p.get("totals", {})
-            kills = totals.get("kills", 0)
-            deaths = totals.get("deaths", 0)
-            assists = totals.get("assists", 0)
-            kda = round((kills + assists) / deaths, 1) if deaths > 0 else round(kills + assists, 1)
-
-            base = {
-                "name": p.get("summoner_name"),  # Changed from "name" to "summoner_name"
-                "position": p.get("position"),
-                "games_played": p.get("games"),  # Changed from "games_played" to "games"
-                "wins": p.get("wins"),
-                "losses": p.get("losses"),
-                "winrate": p.get("winrate"),
-                "kda": kda,  # Calculate KDA from totals
-            }
-
-            # Handle totals
-            if "totals" in p:
-                for stat_name, stat_value in p["totals"].items():
-                    base[f"total_{stat_name}"] = stat_value
-
-            # Handle averages - using the actual field names from JSON
-            if "averages" in p:
-                averages = p["averages"]
-                base["avg_kills"] = averages.get("kills")
-                base["avg_deaths"] = averages.get("deaths")
-                base["avg_assists"] = averages.get("assists")
-                base["avg_kill_participation"] = averages.get("kill_participation")
-                base["per_min_damage"] = averages.get("damage_per_min")
-                base["per_min_gold"] = averages.get("gold_per_min")
-                base["per_min_cs"] = averages.get("cs_per_min")
-                base["avg_vision"] = averages.get("vision_per_game")
-                base["avg_wards_placed"] = averages.get("wards_placed_per_game")
-                base["avg_wards_destroyed"] = averages.get("wards_destroyed_per_game")
-                base["per_min_damage_to_objectives"] = averages.get("damage_to_objectives_per_min")
-                base["per_min_damage_to_buildings"] = averages.get("damage_to_buildings_per_min")
-
-            rows.append(base)
-
-        return pd.DataFrame(rows)
-
-    def _to_numeric_safe(self, df: pd.DataFrame, cols: List[str]):
-        """Convert columns to numeric safely"""
-        for c in cols:
-            if c in df.columns:
-                df[c] = pd.to_numeric(df[c], errors="coerce")
+        # Handle totals
+        for stat_name, stat_value in totals.items():
+            row[f"total_{stat_name}"] = stat_value
+
+        # Handle averages - using the actual field names from JSON
+        if "averages" in p:
+            averages = p["averages"]
+            row["avg_kills"] = averages.get("kills")
+            row["avg_deaths"] = averages.get("deaths")
+            row["avg_assists"] = averages.get("assists")
+            row["avg_kill_participation"] = averages.get("kill_participation")
+            row["per_min_damage"] = averages.get("damage_per_min")
+            row["per_min_gold"] = averages.get("gold_per_min")
+            row["per_min_cs"] = averages.get("cs_per_min")
+            row["avg_vision"] = averages.get("vision_per_game")
+            row["avg_wards_placed"] = averages.get("wards_placed_per_game")
+            row["avg_wards_destroyed"] = averages.get("wards_destroyed_per_game")
+            row["per_min_damage_to_objectives"] = averages.get("damage_to_objectives_per_min")
+            row["per_min_damage_to_buildings"] = averages.get("damage_to_buildings_per_min")
+
+        for col in NUMERIC_ROW_COLUMNS:
+            if col in row:
+                row[col] = _to_number(row[col])
+
+        return row
+
+    def _player_rows(self, team_only: bool = True) -> List[Dict[str, Any]]:
+        """Player rows, built once per instance and shared by the overview and all charts"""
+        key = "team" if team_only else "all"
+        if key not in self._rows_cache:
+            team_players = self.raw_data.get("players", [])
+            players = team_players if team_only else getattr(self, 'all_players', team_players)
+            self._rows_cache[key] = [self._player_row(p) for p in players]
+        return self._rows_cache[key]
 
     def get_players_overview(self) -> Dict[str, Any]:
         """Get overview statistics - returns team players + all players for comparison"""
@@ -331,14 +267,8 @@ class ScrimAnalytics:
         all_players_raw = getattr(self, 'all_players', team_players)
 
         # Process team players
-        players_df = self._expand_players(team_players)
-        numeric_cols = [
-            "games_played", "wins", "losses", "winrate", "kda",
-            "total_kills", "total_deaths", "total_assists",
-            "avg_kill_participation", "per_min_damage", "per_min_gold", "per_min_cs"
-        ]
-        self._to_numeric_safe(players_df, numeric_cols)
-        players_data = players_df.to_dict(orient='records')
+        team_rows = self._player_rows(team_only=True)
+        players_data = [dict(row) for row in team_rows]
 
         # Add champion stats back to team players
         for i, player_dict in enumerate(players_data):
@@ -350,9 +280,7 @@ class ScrimAnalytics:
                 player_dict["top_champions"] = sorted_champs[:5]
 
         # Process all players (team + opponents) with same format
-        all_players_df = self._expand_players(all_players_raw)
-        self._to_numeric_safe(all_players_df, numeric_cols)
-        all_players_data = all_players_df.to_dict(orient='records')
+        all_players_data = [dict(row) for row in self._player_rows(team_only=False)]
 
         # Add champion stats and is_team_member flag to all players
         for i, player_dict in enumerate(all_players_data):
@@ -365,74 +293,50 @@ class ScrimAnalytics:
             # Add is_team_member flag
             player_dict["is_team_member"] = original_player.get("is_team_member", True)
 
+        winrates = [r["winrate"] for r in team_rows if r.get("winrate") is not None]
+        kdas = [r["kda"] for r in team_rows if r.get("kda") is not None]
+        games = [r["games_played"] for r in team_rows if r.get("games_played") is not None]
+
         return {
             "players": players_data,  # Team only
             "all_players": all_players_data,  # Team + adversaires (same format as players)
             "total_players": len(players_data),
             "team_stats": {
-                "avg_winrate": round(float(players_df["winrate"].mean()), 1) if "winrate" in players_df else 0,
-                "avg_kda": round(float(players_df["kda"].mean()), 1) if "kda" in players_df else 0,
-                "total_games": int(players_df["games_played"].sum()) if "games_played" in players_df else 0
+                "avg_winrate": round(float(np.mean(winrates)), 1) if winrates else 0,
+                "avg_kda": round(float(np.mean(kdas)), 1) if kdas else 0,
+                "total_games": int(sum(games))
             }
         }
 
-    def generate_winrate_chart(self) -> str:
-        """Generate winrate bar chart"""
-        players = self.raw_data.get("players", [])
-        players_df = self._expand_players(players)
-        self._to_numeric_safe(players_df, ["winrate"])
+    # ==================== CHART SERIES ====================
 
-        ordered = players_df[["name", "winrate"]].sort_values("winrate", ascending=False)
+    def winrate_series(self) -> Dict[str, Any]:
+        """Winrate bars: team players sorted by winrate"""
+        rows = self._player_rows(team_only=True)
+        ordered = sorted(rows, key=lambda r: r.get("winrate") or 0.0, reverse=True)
 
-        # Convert to lists to avoid dtype issues with matplotlib
-        names = [str(x) for x in ordered["name"].tolist()]
-        winrates = [float(x) if pd.notna(x) else 0.0 for x in ordered["winrate"].tolist()]
-
-        plt.figure(figsize=(10, 6))
-        plt.bar(range(len(names)), winrates, color='#4ECDC4')
-        plt.xticks(range(len(names)), names, rotation=45, ha="right")
-        plt.ylabel("Winrate (%)")
-        plt.title("Winrate par joueur")
-        plt.tight_layout()
-
-        chart_path = self.charts_dir / "winrate_by_player.png"
-        plt.savefig(chart_path, dpi=200, bbox_inches="tight")
-        plt.close()
-
-        return str(chart_path)
-
-    def generate_kda_chart(self) -> str:
-        """Generate KDA comparison chart"""
-        players = self.raw_data.get("players", [])
-        players_df = self._expand_players(players)
-        self._to_numeric_safe(players_df, ["kda", "per_min_damage"])
-
-        # Convert to native Python types
-        kda_values = [float(x) if pd.notna(x) else 0.0 for x in players_df["kda"].tolist()]
-        dpm_values = [float(x) if pd.notna(x) else 0.0 for x in players_df["per_min_damage"].tolist()]
-        names = [str(x) for x in players_df["name"].tolist()]
-
-        plt.figure(figsize=(10, 6))
-        plt.scatter(kda_values, dpm_values, s=100, alpha=0.6, color='#FF6B6B')
-
-        for i, name in enumerate(names):
-            plt.annotate(name, (kda_values[i], dpm_values[i]),
-                        xytext=(5, 5), textcoords='offset points', fontsize=9)
-
-        plt.xlabel("KDA")
-        plt.ylabel("Damage per minute (DPM)")
-        plt.title("KDA vs DPM per player")
-        plt.grid(alpha=0.3)
-        plt.tight_layout()
+        return {
+            "labels": [str(r.get("name")) for r in ordered],
+            "values": [float(r.get("winrate") or 0.0) for r in ordered],
+        }
 
-        chart_path = self.charts_dir / "kda_vs_dpm.png"
-        plt.savefig(chart_path, dpi=200, bbox_inches="tight")
-        plt.close()
+    def kda_series(self) -> Dict[str, Any]:
+        """KDA vs DPM scatter points, one per team player"""
+        rows = self._player_rows(team_only=True)
 
-        return str(chart_path)
+        return {
+            "points": [
+                {
+                    "name": str(r.get("name")),
+                    "kda": float(r.get("kda") or 0.0),
+                    "dpm": float(r.get("per_min_damage") or 0.0),
+                }
+                for r in rows
+            ]
+        }
 
-    def generate_radar_players(self) -> str:
-        """Generate radar chart mosaic for all players"""
+    def radar_series(self) -> Dict[str, Any]:
+        """Min-max normalized radar vectors per player, plus the team average"""
         players = self.raw_data.get("players", [])
 
         # Helper function to calculate KDA
@@ -466,10 +370,14 @@ class ScrimAnalytics:
         ]
 
         labels = [lab for _, lab in metrics]
-        raw_rows, names = [], []
+        if not players:
+            return {"metrics": labels, "players": [], "team_average": [0.0] * len(labels)}
 
+        raw_rows, names, positions, games = [], [], [], []
         for p in players:
             names.append(p.get("summoner_name", ""))
+            positions.append(p.get("position", "UNKNOWN"))
+            games.append(p.get("games", 0))
             raw_rows.append([get_metric(p, key) for key, _ in metrics])
 
         raw_mat = np.array(raw_rows, dtype=float)
@@ -479,6 +387,97 @@ class ScrimAnalytics:
         norm = (raw_mat - mins) / rng
         team_avg = norm.mean(axis=0)
 
+        return {
+            "metrics": labels,
+            "players": [
+                {"name": name, "position": position, "games": n_games, "values": vals.tolist(), "raw": raw.tolist()}
+                for name, position, n_games, vals, raw in zip(names, positions, games, norm, raw_mat)
+            ],
+            "team_average": team_avg.tolist(),
+        }
+
+    def chart_data(self) -> Dict[str, Any]:
+        """All chart series, ready to plot client-side (no matplotlib involved)"""
+        return {
+            "winrate": self.winrate_series(),
+            "kda": self.kda_series(),
+            "radar": self.radar_series(),
+        }
+
+    # ==================== TIMELINES ====================
+
+    def timeline_stats(self) -> Optional[List[Dict[str, Any]]]:
+        """Gold/CS/XP at 10 and 15 min, lane-opponent diffs and XP curves per team player (None without timelines)"""
+        if self.match_table is None or self.data_file is None:
+            return None
+        timelines = load_timelines(self.data_file)
+        if not timelines:
+            return None
+        return TimelineFrames(self.match_table, timelines).player_stats(self.team_riot_ids)
+
+    # ==================== PNG CHARTS ====================
+
+    def generate_winrate_chart(self) -> str:
+        """Generate winrate bar chart"""
+        path = chart_path(self.analysis_id, "winrate")
+        if path.exists():
+            return str(path)
+
+        plt = self._setup_plotting()
+        series = self.winrate_series()
+        names, winrates = series["labels"], series["values"]
+
+        plt.figure(figsize=(10, 6))
+        plt.bar(range(len(names)), winrates, color='#4ECDC4')
+        plt.xticks(range(len(names)), names, rotation=45, ha="right")
+        plt.ylabel("Winrate (%)")
+        plt.title("Winrate par joueur")
+        plt.tight_layout()
+
+        self._save_chart(path, dpi=200, bbox_inches="tight")
+        return str(path)
+
+    def generate_kda_chart(self) -> str:
+        """Generate KDA comparison chart"""
+        path = chart_path(self.analysis_id, "kda")
+        if path.exists():
+            return str(path)
+
+        plt = self._setup_plotting()
+        points = self.kda_series()["points"]
+        kda_values = [p["kda"] for p in points]
+        dpm_values = [p["dpm"] for p in points]
+        names = [p["name"] for p in points]
+
+        plt.figure(figsize=(10, 6))
+        plt.scatter(kda_values, dpm_values, s=100, alpha=0.6, color='#FF6B6B')
+
+        for i, name in enumerate(names):
+            plt.annotate(name, (kda_values[i], dpm_values[i]),
+                        xytext=(5, 5), textcoords='offset points', fontsize=9)
+
+        plt.xlabel("KDA")
+        plt.ylabel("Damage per minute (DPM)")
+        plt.title("KDA vs DPM per player")
+        plt.grid(alpha=0.3)
+        plt.tight_layout()
+
+        self._save_chart(path, dpi=200, bbox_inches="tight")
+        return str(path)
+
+    def generate_radar_players(self) -> str:
+        """Generate radar chart mosaic for all players"""
+        path = chart_path(self.analysis_id, "radar")
+        if path.exists():
+            return str(path)
+
+        plt = self._setup_plotting()
+        series = self.radar_series()
+        labels = series["metrics"]
+        names = [p["name"] for p in series["players"]]
+        norm = [np.asarray(p["values"]) for p in series["players"]]
+        team_avg = np.asarray(series["team_average"])
+
         # Create figure with subplots
         n_players = len(names)
         cols = min(3, n_players)
@@ -511,19 +510,50 @@ class ScrimAnalytics:
 
         plt.tight_layout()
 
-        chart_path = self.charts_dir / "radar_players.png"
-        plt.savefig(chart_path, dpi=200, bbox_inches="tight", facecolor='white')
-        plt.close()
+        self._save_chart(path, dpi=200, bbox_inches="tight", facecolor='white')
+        return str(path)
 
-        return str(chart_path)
+    def _save_chart(self, path: Path, **savefig_kwargs):
+        """Write the current figure atomically (concurrent renders never expose a partial PNG)"""
+        import matplotlib.pyplot as plt
 
-    def process(self) -> Dict[str, Any]:
-        """Process all analytics and return results"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".png.tmp")
         try:
-            # Generate charts
-            winrate_chart = self.generate_winrate_chart()
-            kda_chart = self.generate_kda_chart()
-            radar_chart = self.generate_radar_players()
+            with os.fdopen(fd, "wb") as f:
+                plt.savefig(f, format="png", **savefig_kwargs)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        finally:
+            plt.close()
+
+    def render_chart(self, chart_name: str) -> str:
+        """Render one chart by name (no-op if it already exists) and return its path"""
+        renderers = {
+            "winrate": self.generate_winrate_chart,
+            "kda": self.generate_kda_chart,
+            "radar": self.generate_radar_players,
+        }
+        if chart_name not in renderers:
+            raise ValueError(f"Unknown chart: {chart_name}")
+        return renderers[chart_name]()
+
+    def process(self, chart_mode: str = "png") -> Dict[str, Any]:
+        """
+        Process all analytics and return results.
+
+        chart_mode "png": chart URLs, rendered on first request.
+        chart_mode "data": chart series to plot client-side (no rendering at all).
+        """
+        try:
+            if chart_mode == "data":
+                charts = self.chart_data()
+            else:
+                write_chart_manifest(self.analysis_id, self.data_file, self.team_riot_ids)
+                charts = {name: chart_url(self.analysis_id, name) for name in CHART_NAMES}
 
             # Get player stats
             players_stats = self.get_players_overview()
@@ -531,12 +561,11 @@ class ScrimAnalytics:
             return {
                 "success": True,
                 "data": players_stats,
-                "charts": {
-                    "winrate": winrate_chart.replace(str(self.export_dir), "/exports"),
-                    "kda": kda_chart.replace(str(self.export_dir), "/exports"),
-                    "radar": radar_chart.replace(str(self.export_dir), "/exports")
-                },
-                "timestamp": pd.Timestamp.now().isoformat()
+                "analysis_id": self.analysis_id,
+                "chart_mode": chart_mode,
+                "charts": charts,
+                "timeline": self.timeline_stats(),
+                "timestamp": datetime.now().isoformat()
             }
 
         except Exception as e:
@@ -544,3 +573,69 @@ class ScrimAnalytics:
                 "success": False,
                 "error": str(e)
             }
+
+
+# ==================== INCREMENTAL TEAM AGGREGATES ====================
+
+def _new_matches(table: MatchTable, seen: set) -> MatchTable:
+    """Drop matches already aggregated (by matchId); `seen` is updated with the kept ones"""
+    keep = []
+    for match_id in table.matches["match_id"]:
+        is_new = not match_id or match_id not in seen
+        keep.append(is_new)
+        if is_new and match_id:
+            seen.add(match_id)
+    return table.take_matches(np.asarray(keep, dtype=bool))
+
+
+def append_team_matches(aggregates: Optional[Dict[str, Any]], sources: List[str], new_file: str,
+                        team_riot_ids: List[str]) -> Dict[str, Any]:
+    """
+    Fold the matches of `new_file` into a saved analysis' running aggregates.
+
+    `aggregates` is the stored state ({version, team_riot_ids, match_ids,
+    sources, players}); matches whose matchId was already aggregated are
+    skipped. If there is no state yet, or it was built by another
+    ANALYTICS_VERSION, it is first rebuilt from `sources` (the files the
+    analysis was made of, oldest first).
+
+    Returns the new aggregates, the players overview to store as
+    analysis_results and how many matches were added / skipped.
+    """
+    if not aggregates or aggregates.get("version") != ANALYTICS_VERSION:
+        aggregates = {
+            "version": ANALYTICS_VERSION,
+            "team_riot_ids": list(team_riot_ids),
+            "match_ids": [],
+            "sources": [],
+            "players": {},
+        }
+        seen = set()
+        for source in sources:
+            table = _new_matches(load_match_table(Path(source)), seen)
+            aggregates["players"] = merge_player_state(aggregates["players"], table.player_state(team_riot_ids))
+            aggregates["match_ids"].extend(m for m in table.matches["match_id"] if m)
+            aggregates["sources"].append(str(source))
+
+    team_riot_ids = aggregates["team_riot_ids"]
+    seen = set(aggregates["match_ids"])
+
+    table = load_match_table(Path(new_file))
+    new_table = _new_matches(table, seen)
+    added = new_table.match_count
+
+    aggregates = dict(aggregates)
+    aggregates["players"] = merge_player_state(aggregates["players"], new_table.player_state(team_riot_ids))
+    aggregates["match_ids"] = aggregates["match_ids"] + [m for m in new_table.matches["match_id"] if m]
+    if added:
+        aggregates["sources"] = aggregates["sources"] + [str(new_file)]
+
+    overview = ScrimAnalytics(None, team_riot_ids=team_riot_ids,
+                              players_state=aggregates["players"]).get_players_overview()
+
+    return {
+        "aggregates": aggregates,
+        "analysis_results": overview,
+        "added_matches": added,
+        "skipped_matches": table.match_count - added,
+    }
@@ -7,10 +7,12 @@ from jose import JWTError, jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 
-from database import get_db, User
+from database import get_db, get_async_db, User
 import os
 from dotenv import load_dotenv
 
@@ -185,11 +187,11 @@ def create_user(db: Session, user_data: UserCreate) -> User:
     return db_user
 
 
-async def get_current_user(
+def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ) -> User:
-    """Get current authenticated user"""
+    """Get current authenticated user (sync session: runs in the threadpool, not on the event loop)"""
     token_data = verify_token(token)
     user = get_user_by_email(db, email=token_data.email)
 
@@ -200,3 +202,20 @@ async def get_current_user(
         )
 
     return user
+
+
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """Get current authenticated user, in the route's async session (for routes using get_async_db)"""
+    token_data = verify_token(token)
+    user = (await db.execute(select(User).where(User.email == token_data.email))).scalar_one_or_none()
+
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials"
+        )
+
+    return user
@@ -1,9 +1,10 @@
 """
 Database configuration and models
 """
-from sqlalchemy import create_engine, Column, String, Boolean, DateTime, JSON, ForeignKey, Table, Integer
+from sqlalchemy import create_engine, event, Column, String, Boolean, DateTime, JSON, ForeignKey, Table, Integer, Float, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship, backref
+from sqlalchemy.orm import sessionmaker, relationship, backref, deferred
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from datetime import datetime
 import uuid
 
@@ -20,13 +21,176 @@ DEFAULT_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DEFAULT_DB_PATH}")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}  # Only for SQLite
-)
+# ==================== ENGINE PROFILES ====================
+# DB_PROFILE picks the connection / journal / pool settings ("auto": from the URL):
+#   sqlite     WAL journal (readers never wait for the writer), busy timeout
+#              instead of immediate "database is locked", page cache + mmap
+#   sqlite-compat  previous settings (rollback journal), for file systems without WAL support
+#   postgres   sized connection pool with pre-ping and recycling
+
+DB_PROFILE = os.getenv("DB_PROFILE", "auto")
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_SQLITE_CACHE_MB = int(os.getenv("DB_SQLITE_CACHE_MB", "64"))
+DB_SQLITE_MMAP_MB = int(os.getenv("DB_SQLITE_MMAP_MB", "256"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+DB_PROFILES = ("sqlite", "sqlite-compat", "postgres")
+
+
+def resolve_db_profile(url: str, profile: str = "auto") -> str:
+    """Profile name for a database URL"""
+    if profile == "auto":
+        if url.startswith("postgresql"):
+            return "postgres"
+        # In-memory databases live in a single connection: no pool, no WAL
+        return "sqlite-compat" if url in ("sqlite://", "sqlite:///:memory:") else "sqlite"
+    if profile not in DB_PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE '{profile}' (expected auto, {', '.join(DB_PROFILES)})")
+    return profile
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")  # Durable across app crashes in WAL mode
+    cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{DB_SQLITE_CACHE_MB * 1024}")
+    cursor.execute(f"PRAGMA mmap_size={DB_SQLITE_MMAP_MB * 1024 * 1024}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def _engine_options(profile: str, async_driver: bool = False) -> dict:
+    """create_engine() arguments of a profile (sync or async driver)"""
+    if profile == "postgres":
+        if async_driver:
+            connect_args = {"server_settings": {
+                "application_name": "openrift", "statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)
+            }}
+        else:
+            connect_args = {
+                "application_name": "openrift",
+                "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+            }
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": True,
+            "connect_args": connect_args,
+        }
+    if profile == "sqlite-compat":
+        return {"connect_args": {"check_same_thread": False}}
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "connect_args": {"check_same_thread": False, "timeout": DB_BUSY_TIMEOUT_MS / 1000},
+    }
+    if async_driver:
+        # aiosqlite defaults to NullPool (a new connection, and pragmas, per session)
+        options["poolclass"] = AsyncAdaptedQueuePool
+    return options
+
+
+def create_profile_engine(url: str, profile: str = "auto"):
+    """Engine configured for a profile"""
+    profile = resolve_db_profile(url, profile)
+    profile_engine = create_engine(url, **_engine_options(profile))
+    if profile == "sqlite":
+        event.listen(profile_engine, "connect", _sqlite_pragmas)
+    return profile_engine
+
+
+def _pool_stats(pool) -> dict:
+    stats = {"pool": type(pool).__name__, "status": pool.status()}
+    # QueuePool counters (other pools, e.g. in-memory SQLite, don't have them)
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        counter = getattr(pool, name, None)
+        if callable(counter):
+            stats[name] = counter()
+    return stats
+
+
+def engine_stats() -> dict:
+    """Profile and connection pool statistics of the app engines"""
+    stats = {"profile": DB_PROFILE_NAME, "dialect": engine.dialect.name, **_pool_stats(engine.pool)}
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as connection:
+            stats["journal_mode"] = connection.exec_driver_sql("PRAGMA journal_mode").scalar()
+            stats["busy_timeout_ms"] = connection.exec_driver_sql("PRAGMA busy_timeout").scalar()
+    # Async engine, once a route has used it
+    stats["async"] = _pool_stats(_async_engine.pool) if _async_engine is not None else None
+    return stats
+
+
+DB_PROFILE_NAME = resolve_db_profile(SQLALCHEMY_DATABASE_URL, DB_PROFILE)
+engine = create_profile_engine(SQLALCHEMY_DATABASE_URL, DB_PROFILE_NAME)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+# ==================== ASYNC SESSIONS ====================
+# Same database and profile through an async driver (aiosqlite / asyncpg), for
+# routes whose queries must not block the event loop (get_async_db). Created
+# on first use, so scripts that only use SessionLocal don't need the driver.
+
+_ASYNC_DRIVERS = (
+    ("sqlite+pysqlite://", "sqlite+aiosqlite://"),
+    ("sqlite://", "sqlite+aiosqlite://"),
+    ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+    ("postgresql://", "postgresql+asyncpg://"),
+)
+
+_async_engine = None
+_async_sessionmaker = None
+
+
+def async_database_url(url: str) -> str:
+    """Async driver URL of a database URL (ASYNC_DATABASE_URL overrides it)"""
+    override = os.getenv("ASYNC_DATABASE_URL")
+    if override:
+        return override
+    for sync_prefix, async_prefix in _ASYNC_DRIVERS:
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+
+def get_async_engine():
+    """The app's async engine (same profile settings as `engine`)"""
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        _async_engine = create_async_engine(
+            async_database_url(SQLALCHEMY_DATABASE_URL), **_engine_options(DB_PROFILE_NAME, async_driver=True)
+        )
+        if DB_PROFILE_NAME == "sqlite":
+            event.listen(_async_engine.sync_engine, "connect", _sqlite_pragmas)
+        # Objects stay usable after commit (no implicit refresh: lazy IO is not allowed in async code)
+        _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+
+def AsyncSessionLocal():
+    """New AsyncSession (counterpart of SessionLocal)"""
+    get_async_engine()
+    return _async_sessionmaker()
+
+
+async def dispose_async_engine():
+    """Close the async engine's connections (app shutdown)"""
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = _async_sessionmaker = None
+
 Base = declarative_base()
 
 
@@ -37,7 +201,8 @@ team_members = Table(
     Column('team_id', String, ForeignKey('teams.id'), primary_key=True),
     Column('user_id', String, ForeignKey('users.id'), primary_key=True),
     Column('role', String, default='player'),  # owner, coach, player, analyst
-    Column('joined_at', DateTime, default=datetime.utcnow)
+    Column('joined_at', DateTime, default=datetime.utcnow),
+    Index('ix_team_members_user_id', 'user_id')  # "my teams" / membership checks (PK starts with team_id)
 )
 
 
@@ -86,6 +251,9 @@ class User(Base):
 class UserAnalytics(Base):
     """User's saved analytics data"""
     __tablename__ = "user_analytics"
+    __table_args__ = (
+        Index("ix_user_analytics_user_id_uploaded_at", "user_id", "uploaded_at"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
@@ -99,8 +267,10 @@ class UserAnalytics(Base):
     # Stored data path
     data_path = Column(String, nullable=False)
 
-    # Analysis results (cached)
-    analysis_results = Column(JSON, nullable=True)
+    # Analysis results: ID in the compressed results store (results_store.py).
+    # analysis_results only holds those of rows saved before it (deferred, large)
+    results_blob_id = Column(String, nullable=True)
+    analysis_results = deferred(Column(JSON, nullable=True))
 
     # Relationship
     user = relationship("User", back_populates="analytics")
@@ -136,6 +306,9 @@ class Team(Base):
 class Scrim(Base):
     """Scrim/Practice session model - Central hub for scrim data"""
     __tablename__ = "scrims"
+    __table_args__ = (
+        Index("ix_scrims_team_id_scheduled_at", "team_id", "scheduled_at"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     team_id = Column(String, ForeignKey("teams.id"), nullable=False)
@@ -164,6 +337,10 @@ class Scrim(Base):
 class ScrimGame(Base):
     """Individual game within a scrim session (max 5 games - Bo5)"""
     __tablename__ = "scrim_games"
+    __table_args__ = (
+        Index("ix_scrim_games_scrim_id_game_number", "scrim_id", "game_number"),
+        Index("ix_scrim_games_draft_id", "draft_id"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     scrim_id = Column(String, ForeignKey("scrims.id"), nullable=False)
@@ -195,6 +372,10 @@ class ScrimGame(Base):
 class TeamAnalytics(Base):
     """Team's saved analytics data"""
     __tablename__ = "team_analytics"
+    __table_args__ = (
+        Index("ix_team_analytics_team_id_uploaded_at", "team_id", "uploaded_at"),
+        Index("ix_team_analytics_scrim_id", "scrim_id"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     team_id = Column(String, ForeignKey("teams.id"), nullable=False)
@@ -209,8 +390,14 @@ class TeamAnalytics(Base):
     # Stored data path
     data_path = Column(String, nullable=False)
 
-    # Analysis results (cached)
-    analysis_results = Column(JSON, nullable=True)
+    # Analysis results: ID in the compressed results store (results_store.py).
+    # analysis_results only holds those of rows saved before it (deferred, large)
+    results_blob_id = Column(String, nullable=True)
+    analysis_results = deferred(Column(JSON, nullable=True))
+
+    # Running per-player/per-champion aggregates, for appending new matches
+    # ({version, team_riot_ids, match_ids, sources, players}) - deferred too
+    aggregates = deferred(Column(JSON, nullable=True))
 
     # Link to scrim (optional)
     scrim_id = Column(String, ForeignKey("scrims.id"), nullable=True)
@@ -223,6 +410,10 @@ class TeamAnalytics(Base):
 class TeamInvite(Base):
     """Team invitation model"""
     __tablename__ = "team_invites"
+    __table_args__ = (
+        Index("ix_team_invites_invited_user_id_status", "invited_user_id", "status"),
+        Index("ix_team_invites_team_id", "team_id"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     team_id = Column(String, ForeignKey("teams.id"), nullable=False)
@@ -241,6 +432,10 @@ class TeamInvite(Base):
 class JoinRequest(Base):
     """Join request model - user requests to join a team"""
     __tablename__ = "join_requests"
+    __table_args__ = (
+        Index("ix_join_requests_team_id_status_created_at", "team_id", "status", "created_at"),
+        Index("ix_join_requests_user_id_status", "user_id", "status"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     team_id = Column(String, ForeignKey("teams.id"), nullable=False)
@@ -257,6 +452,9 @@ class JoinRequest(Base):
 class AvailabilitySlot(Base):
     """User availability slot model - flexible time slots for scheduling"""
     __tablename__ = "availability_slots"
+    __table_args__ = (
+        Index("ix_availability_slots_user_id_team_id_start_time", "user_id", "team_id", "start_time"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
@@ -280,6 +478,9 @@ class AvailabilitySlot(Base):
 class TeamEvent(Base):
     """Team event model - scrims, training, soloq, meetings"""
     __tablename__ = "team_events"
+    __table_args__ = (
+        Index("ix_team_events_team_id_start_time", "team_id", "start_time"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     team_id = Column(String, ForeignKey("teams.id"), nullable=False)
@@ -403,6 +604,9 @@ class SummonerData(Base):
 class Notification(Base):
     """User notification model"""
     __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_user_id_is_read_created_at", "user_id", "is_read", "created_at"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
@@ -471,6 +675,9 @@ class ChampionPool(Base):
 class ChampionPoolEntry(Base):
     """Single champion entry in a pool"""
     __tablename__ = "champion_pool_entries"
+    __table_args__ = (
+        Index("ix_champion_pool_entries_pool_id_tier_position", "pool_id", "tier", "position"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     pool_id = Column(String, ForeignKey("champion_pools.id"), nullable=False)
@@ -499,6 +706,11 @@ class ChampionPoolEntry(Base):
 class Draft(Base):
     """Saved draft composition"""
     __tablename__ = "drafts"
+    __table_args__ = (
+        Index("ix_drafts_team_id_updated_at", "team_id", "updated_at"),
+        Index("ix_drafts_user_id_updated_at", "user_id", "updated_at"),
+        Index("ix_drafts_scrim_id", "scrim_id"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
@@ -530,11 +742,112 @@ class Draft(Base):
     scrim_game = relationship("ScrimGame", back_populates="draft", uselist=False, foreign_keys="ScrimGame.draft_id")
 
 
+class DraftIndexEntry(Base):
+    """What one draft currently contributes to its team's DraftStat counters"""
+    __tablename__ = "draft_index_entries"
+
+    draft_id = Column(String, ForeignKey("drafts.id"), primary_key=True)
+    team_id = Column(String, ForeignKey("teams.id"), nullable=False, index=True)
+
+    side = Column(String, nullable=False)  # 'blue' or 'red' (the team's side)
+    result = Column(String, nullable=True)  # linked ScrimGame result: 'win', 'lose', null
+
+    # Counter keys added for this draft: [[kind, champion, side, order], ...]
+    keys = Column(JSON, nullable=False)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class DraftStat(Base):
+    """Per-team draft counter: how often a champion was picked/banned, on which side, in which order"""
+    __tablename__ = "draft_stats"
+    __table_args__ = (UniqueConstraint("team_id", "kind", "champion", "side", "order"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    team_id = Column(String, ForeignKey("teams.id"), nullable=False, index=True)
+
+    kind = Column(String, nullable=False)  # 'pick', 'ban' (by the team), 'enemy_pick', 'enemy_ban'
+    champion = Column(String, nullable=False)
+    side = Column(String, nullable=False)  # team's side in the draft: 'blue' or 'red'
+    order = Column(Integer, nullable=False)  # 1-5 within the side's picks (or bans)
+
+    games = Column(Integer, default=0)  # Drafts counted
+    wins = Column(Integer, default=0)  # ... whose linked game was won
+    losses = Column(Integer, default=0)  # ... whose linked game was lost
+
+
+class StoredBlob(Base):
+    """A file (or directory) on disk tracked by the storage manager, with its reference count"""
+    __tablename__ = "stored_blobs"
+
+    # "<kind>:<name>": upload:<file>, match:<store key>, charts:<analysis id>, export:<path>
+    id = Column(String, primary_key=True)
+    kind = Column(String, nullable=False)
+
+    size_bytes = Column(Integer, default=0)
+    ref_count = Column(Integer, default=0, index=True)
+
+    # Owner for usage reports (uploads and their charts)
+    user_id = Column(String, nullable=True, index=True)
+    team_id = Column(String, nullable=True, index=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # When ref_count last dropped to 0 (creation for blobs never referenced)
+    unreferenced_since = Column(DateTime, nullable=True, index=True)
+
+
+class StoredBlobRef(Base):
+    """One reference to a blob: from a saved analysis, a team, or another blob (upload -> matches, charts)"""
+    __tablename__ = "stored_blob_refs"
+
+    holder_kind = Column(String, primary_key=True)  # 'user_analytics', 'team_analytics', 'blob'
+    holder_id = Column(String, primary_key=True)
+    blob_id = Column(String, ForeignKey("stored_blobs.id"), primary_key=True, index=True)
+
+
+class PercentileMatch(Base):
+    """A stored match already counted in the platform percentiles (each match counts once)"""
+    __tablename__ = "percentile_matches"
+
+    match_key = Column(String, primary_key=True)  # match store key
+    counted_at = Column(DateTime, default=datetime.utcnow)
+
+
+class PercentilePlayer(Base):
+    """Platform-wide totals of one player in one position, over every counted match"""
+    __tablename__ = "percentile_players"
+
+    player_key = Column(String, primary_key=True)  # PUUID (Riot ID for payloads without one)
+    position = Column(String, primary_key=True)  # TOP, JUNGLE, MIDDLE, BOTTOM, UTILITY
+
+    games = Column(Integer, default=0, index=True)
+    kills = Column(Integer, default=0)
+    deaths = Column(Integer, default=0)
+    assists = Column(Integer, default=0)
+    damage = Column(Integer, default=0)
+    gold = Column(Integer, default=0)
+    cs = Column(Integer, default=0)
+    minutes = Column(Float, default=0.0)
+    team_kills = Column(Integer, default=0)
+
+
+class SchemaMigration(Base):
+    """A versioned migration (migrations/NNNN_*.py) applied to this database"""
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+
 # Database initialization
 def init_db():
-    """Create all tables"""
+    """Create all tables, then apply pending versioned migrations"""
     Base.metadata.create_all(bind=engine)
 
+    from schema_migrations import apply_migrations
+    apply_migrations(engine)
+
 def get_db():
     """Dependency to get DB session"""
     db = SessionLocal()
@@ -542,3 +855,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """Dependency to get an async DB session"""
+    async with AsyncSessionLocal() as db:
+        yield db
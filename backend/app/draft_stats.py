@@ -0,0 +1,222 @@
+"""
+Draft statistics index - per-team pick / ban counters joined with game results
+
+Every team draft contributes one count per picked / banned champion, keyed by
+(kind, champion, team side, order), plus a win or loss once it is linked to a
+ScrimGame with a result. DraftIndexEntry remembers what each draft added, so
+creating, editing, linking or deleting a draft only moves its own counters.
+Draft analytics read DraftStat rows and never deserialize the drafts.
+"""
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+
+from database import (
+    Draft as DBDraft, DraftIndexEntry as DBDraftIndexEntry, DraftStat as DBDraftStat,
+    Scrim as DBScrim, ScrimGame as DBScrimGame, Team as DBTeam
+)
+
+SIDES = ("blue", "red")
+
+# Counter kind -> (whose slots, slot list)
+DRAFT_KINDS = {
+    "pick": ("team", "picks"),
+    "ban": ("team", "bans"),
+    "enemy_pick": ("enemy", "picks"),
+    "enemy_ban": ("enemy", "bans"),
+}
+
+
+# ==================== DRAFT DECODING ====================
+
+def _same_name(a: Optional[str], b: Optional[str]) -> bool:
+    return bool(a and b) and a.strip().casefold() == b.strip().casefold()
+
+
+def draft_team_side(draft: DBDraft, team: Optional[DBTeam], scrim: Optional[DBScrim]) -> str:
+    """
+    Side the team played in a draft: the side named after the team (name or
+    tag), else the side opposite the scrim opponent, else blue (the draft
+    tool's default side for the team).
+    """
+    if team:
+        for side, name in (("blue", draft.blue_team_name), ("red", draft.red_team_name)):
+            if _same_name(name, team.name) or _same_name(name, team.tag):
+                return side
+    if scrim:
+        if _same_name(draft.red_team_name, scrim.opponent_name):
+            return "blue"
+        if _same_name(draft.blue_team_name, scrim.opponent_name):
+            return "red"
+    return "blue"
+
+
+def draft_keys(draft_data: Dict[str, Any], side: str) -> List[List[Any]]:
+    """Counter keys [kind, champion, side, order] of a draft played on `side`"""
+    enemy = "red" if side == "blue" else "blue"
+    keys = []
+    for kind, (whose, slots) in DRAFT_KINDS.items():
+        slot_side = side if whose == "team" else enemy
+        for order, slot in enumerate((draft_data or {}).get(f"{slot_side}_{slots}") or [], start=1):
+            champion = (slot or {}).get("champion_name") or (slot or {}).get("champion_id")
+            if champion:
+                keys.append([kind, str(champion), side, order])
+    return keys
+
+
+# ==================== INDEX MAINTENANCE ====================
+
+def _draft_team(db: Session, draft: DBDraft) -> Tuple[Optional[DBTeam], Optional[DBScrim]]:
+    scrim = db.query(DBScrim).filter(DBScrim.id == draft.scrim_id).first() if draft.scrim_id else None
+    team_id = draft.team_id or (scrim.team_id if scrim else None)
+    team = db.query(DBTeam).filter(DBTeam.id == team_id).first() if team_id else None
+    return team, scrim
+
+
+def _apply(db: Session, team_id: str, keys: List[List[Any]], result: Optional[str], sign: int,
+           stats: Dict[tuple, DBDraftStat]):
+    for kind, champion, side, order in keys:
+        key = (kind, champion, side, order)
+        stat = stats.get(key)
+        if stat is None:
+            if sign < 0:
+                continue
+            stat = DBDraftStat(team_id=team_id, kind=kind, champion=champion, side=side, order=order,
+                               games=0, wins=0, losses=0)
+            db.add(stat)
+            stats[key] = stat
+        stat.games += sign
+        if result == "win":
+            stat.wins += sign
+        elif result == "lose":
+            stat.losses += sign
+
+
+def _load_stats(db: Session, team_id: str, keys: List[List[Any]]) -> Dict[tuple, DBDraftStat]:
+    champions = {key[1] for key in keys}
+    if not champions:
+        return {}
+    rows = db.query(DBDraftStat).filter(
+        DBDraftStat.team_id == team_id,
+        DBDraftStat.champion.in_(champions)
+    ).all()
+    return {(s.kind, s.champion, s.side, s.order): s for s in rows}
+
+
+def _remove_entry(db: Session, entry: DBDraftIndexEntry):
+    stats = _load_stats(db, entry.team_id, entry.keys)
+    _apply(db, entry.team_id, entry.keys, entry.result, -1, stats)
+    for stat in stats.values():
+        if stat.games <= 0:
+            db.delete(stat)
+    db.delete(entry)
+
+
+def index_draft(db: Session, draft: DBDraft):
+    """
+    (Re)compute a draft's contribution to its team's counters. Call it after
+    any change to the draft, its team / scrim, or the ScrimGame it is linked
+    to; the caller commits.
+    """
+    db.flush()
+    entry = db.query(DBDraftIndexEntry).filter(DBDraftIndexEntry.draft_id == draft.id).first()
+    if entry:
+        _remove_entry(db, entry)
+        db.flush()
+
+    team, scrim = _draft_team(db, draft)
+    if not team:
+        return  # Personal draft: not part of any team's statistics
+
+    side = draft_team_side(draft, team, scrim)
+    keys = draft_keys(draft.draft_data, side)
+    game = db.query(DBScrimGame).filter(DBScrimGame.draft_id == draft.id).first()
+    result = game.result if game else None
+
+    _apply(db, team.id, keys, result, 1, _load_stats(db, team.id, keys))
+    db.add(DBDraftIndexEntry(draft_id=draft.id, team_id=team.id, side=side, result=result, keys=keys))
+
+
+def index_draft_by_id(db: Session, draft_id: Optional[str]):
+    """index_draft() for a draft ID (no-op if it is empty or unknown)"""
+    if not draft_id:
+        return
+    draft = db.query(DBDraft).filter(DBDraft.id == draft_id).first()
+    if draft:
+        index_draft(db, draft)
+
+
+def unindex_draft(db: Session, draft_id: str):
+    """Remove a draft's contribution (before deleting it); the caller commits"""
+    entry = db.query(DBDraftIndexEntry).filter(DBDraftIndexEntry.draft_id == draft_id).first()
+    if entry:
+        _remove_entry(db, entry)
+
+
+def ensure_team_indexed(db: Session, team_id: str) -> int:
+    """Index the team's drafts that predate the index. Returns how many were added."""
+    scrim_ids = db.query(DBScrim.id).filter(DBScrim.team_id == team_id)
+    indexed = db.query(DBDraftIndexEntry.draft_id)
+    missing = db.query(DBDraft).filter(
+        (DBDraft.team_id == team_id) | (DBDraft.team_id.is_(None) & DBDraft.scrim_id.in_(scrim_ids)),
+        DBDraft.id.notin_(indexed)
+    ).all()
+    for draft in missing:
+        index_draft(db, draft)
+    if missing:
+        db.commit()
+    return len(missing)
+
+
+# ==================== QUERIES ====================
+
+def team_draft_stats(db: Session, team_id: str, min_games: int = 1) -> Dict[str, Any]:
+    """Draft analytics of a team, read from the counters"""
+    def record(games, wins, losses, **fields):
+        decided = wins + losses
+        fields.update(games=games, wins=wins, losses=losses,
+                      winrate=round(wins / decided * 100, 1) if decided else None)
+        return fields
+
+    by_champion = defaultdict(lambda: [0, 0, 0])
+    first_picks = defaultdict(lambda: [0, 0, 0])
+    for stat in db.query(DBDraftStat).filter(DBDraftStat.team_id == team_id).all():
+        targets = [by_champion[(stat.kind, stat.champion)]]
+        if stat.kind == "pick" and stat.order == 1:
+            targets.append(first_picks[(stat.side, stat.champion)])
+        for counters in targets:
+            counters[0] += stat.games
+            counters[1] += stat.wins
+            counters[2] += stat.losses
+
+    def most_played(records):
+        return sorted(records, key=lambda r: r["games"], reverse=True)
+
+    def kind_table(kind):
+        return most_played(
+            record(*c, champion=champion) for (k, champion), c in by_champion.items()
+            if k == kind and c[0] >= min_games
+        )
+
+    sides = {side: [0, 0, 0] for side in SIDES}
+    for entry in db.query(DBDraftIndexEntry.side, DBDraftIndexEntry.result).filter(
+        DBDraftIndexEntry.team_id == team_id
+    ).all():
+        counters = sides[entry.side]
+        counters[0] += 1
+        counters[1] += entry.result == "win"
+        counters[2] += entry.result == "lose"
+
+    return {
+        "team_id": team_id,
+        "drafts": sum(c[0] for c in sides.values()),
+        "sides": {side: record(*c) for side, c in sides.items()},
+        "picks": kind_table("pick"),
+        "bans": kind_table("ban"),
+        "enemy_picks": kind_table("enemy_pick"),
+        "bans_against": kind_table("enemy_ban"),
+        "first_picks": most_played(
+            record(*c, side=side, champion=champion) for (side, champion), c in first_picks.items()
+            if c[0] >= min_games
+        ),
+    }
@@ -0,0 +1,518 @@
+"""
+Streaming scrim upload ingestion
+
+Uploads are read in chunks and optionally gunzipped while a small incremental
+parser walks the top-level `matches` (and optional `timelines`) arrays. Each
+match is validated, scanned
+for team members, put in the global match store (once per matchId, see
+match_store.py), appended to the columnar match table and dropped as soon as
+it is decoded, so memory stays at roughly one chunk + one match (+ the compact
+table) whatever the file size, and the event loop only awaits reads and
+worker-thread steps. The upload itself is saved as a manifest of match
+references, with the table next to it so analyses never parse JSON again.
+"""
+import asyncio
+import codecs
+import hashlib
+import json
+import logging
+import os
+import re
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from analysis_cache import remember_file_digest
+from match_store import match_store, write_manifest
+from percentiles import percentile_distributions
+from services.riot_api import riot_id_key
+
+logger = logging.getLogger(__name__)
+
+# Size limits (compressed upload / decompressed JSON)
+UPLOAD_MAX_MB = int(os.getenv("UPLOAD_MAX_MB", "100"))
+UPLOAD_MAX_DECOMPRESSED_MB = int(os.getenv("UPLOAD_MAX_DECOMPRESSED_MB", "500"))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Request bodies are cut off a little above the file limit (multipart headers and boundaries)
+REQUEST_MAX_BYTES = (UPLOAD_MAX_MB + 1) * 1024 * 1024
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Top-level arrays whose elements are streamed one by one (any other value is skipped)
+STREAMED_ARRAYS = ("matches", "timelines")
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# Text a decode error can point at when the buffer merely ends too early: an
+# unterminated string, a \uXXXX escape, the start of a literal or the end of a
+# number (1. / 1e-). Any other error is invalid JSON, whatever comes next.
+_INCOMPLETE_TAIL = re.compile(
+    r'"(?:[^"\\]|\\.)*\\?'
+    r"|u[0-9a-fA-F]{0,4}"
+    r"|-?(?:I(?:n(?:f(?:i(?:n(?:i(?:t)?)?)?)?)?)?)?"
+    r"|N(?:a)?|t(?:r(?:u)?)?|f(?:a(?:l(?:s)?)?)?|n(?:u(?:l)?)?"
+    r"|\.|[eE][-+]?"
+)
+# What can follow a number that is only partly received
+_NUMBER_END = re.compile(r"(?:\.|[eE][-+]?)?")
+
+
+class UploadRejected(Exception):
+    """The upload is invalid or too large (maps to an HTTP error)"""
+
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+def _number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value == value
+
+
+def _game_date(info: Dict[str, Any]) -> Optional[datetime]:
+    """Date of a match from its gameCreation (ms since epoch), None if absent; UploadRejected if invalid"""
+    if not _number(info.get("gameDuration", 0)):
+        raise UploadRejected("Invalid JSON format: gameDuration must be a number")
+    game_creation = info.get("gameCreation")
+    if game_creation is None:
+        return None
+    if not _number(game_creation):
+        raise UploadRejected("Invalid JSON format: gameCreation must be a timestamp in milliseconds")
+    try:
+        if game_creation < 0:
+            raise ValueError(game_creation)
+        return datetime.fromtimestamp(game_creation / 1000)
+    except (OverflowError, OSError, ValueError):
+        raise UploadRejected("Invalid JSON format: gameCreation is out of range")
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware: answers 413 to request bodies over REQUEST_MAX_BYTES before
+    they are spooled (UploadFile is fully received before the handler runs).
+    Declared sizes are checked on Content-Length; chunked bodies are counted
+    as they stream and cut off as soon as they go over.
+    """
+
+    def __init__(self, app, max_bytes: int = REQUEST_MAX_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": f"File too large (max {UPLOAD_MAX_MB} MB)"}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+        rejected = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    rejected = True
+                    if not response_started:
+                        await self._reject(send)
+                    # The app sees a disconnected client and stops reading
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            # ClientDisconnect raised while reading the cut-off body: the 413 is already sent
+            if not rejected:
+                raise
+
+
+class MatchStreamParser:
+    """
+    Incremental parser for `{..., "matches": [match, ...], "timelines": [timeline, ...], ...}`.
+
+    Text is fed in arbitrary pieces; every complete element of the top-level
+    STREAMED_ARRAYS is returned as soon as it has been received, as
+    (array name, element). Other top-level values are parsed and discarded.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._state = "start"
+        self._key = None
+        self._array = None
+        # Don't retry an incomplete value until its pending text has doubled (keeps decoding O(n))
+        self._retry_at = 0
+        self.found_matches = False
+
+    def feed(self, text: str) -> Iterator[Any]:
+        """Add text and yield the (array, element) pairs it completes (one at a time, to keep memory flat)"""
+        if self._pos:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        self._buf += text
+        if len(self._buf) >= self._retry_at:
+            yield from self._parse(final=False)
+
+    def close(self) -> Iterator[Any]:
+        """Yield whatever is left; raises UploadRejected if the document is incomplete"""
+        yield from self._parse(final=True)
+        if self._state != "done":
+            raise UploadRejected("Invalid JSON format")
+        if self._buf[self._skip_ws():].strip():
+            raise UploadRejected("Invalid JSON format")
+
+    def _skip_ws(self) -> int:
+        self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+        return self._pos
+
+    def _decode_value(self, final: bool):
+        """Decode one JSON value at the cursor. Returns (True, value) or (False, None) if incomplete."""
+        try:
+            value, end = self._decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError as e:
+            # Only an error at the end of the text received so far can be fixed by more text
+            if final or not _INCOMPLETE_TAIL.fullmatch(self._buf, e.pos):
+                raise UploadRejected("Invalid JSON format")
+            self._retry_at = 2 * (len(self._buf) - self._pos)
+            return False, None
+        # A number at the very end of the buffer may still be missing digits (1 / 1. / 1e-)
+        if not final and not isinstance(value, (dict, list, str)) and _NUMBER_END.fullmatch(self._buf, end):
+            return False, None
+        self._pos = end
+        self._retry_at = 0
+        return True, value
+
+    def _parse(self, final: bool) -> Iterator[Any]:
+        buf = self._buf
+
+        while True:
+            pos = self._skip_ws()
+            if pos >= len(buf):
+                return
+            char = buf[pos]
+
+            if self._state == "start":
+                if char != "{":
+                    raise UploadRejected("Invalid JSON format: file must contain a 'matches' array")
+                self._pos += 1
+                self._state = "first_key"
+
+            elif self._state in ("first_key", "key", "next_key"):
+                if char == "}" and self._state != "key":
+                    self._pos += 1
+                    self._state = "done"
+                elif self._state == "next_key" and char == ",":
+                    self._pos += 1
+                    self._state = "key"
+                elif char == '"':
+                    complete, self._key = self._decode_value(final)
+                    if not complete:
+                        return
+                    self._state = "colon"
+                else:
+                    raise UploadRejected("Invalid JSON format")
+
+            elif self._state == "colon":
+                if char != ":":
+                    raise UploadRejected("Invalid JSON format")
+                self._pos += 1
+                self._state = "value"
+
+            elif self._state == "value":
+                if self._key in STREAMED_ARRAYS:
+                    if char != "[":
+                        raise UploadRejected(f"Invalid JSON format: '{self._key}' must be an array")
+                    self._pos += 1
+                    self._array = self._key
+                    if self._key == "matches":
+                        self.found_matches = True
+                    self._state = "first_item"
+                else:
+                    complete, _ = self._decode_value(final)
+                    if not complete:
+                        return
+                    self._state = "next_key"
+
+            elif self._state in ("first_item", "item", "next_item"):
+                if char == "]" and self._state != "item":
+                    self._pos += 1
+                    self._state = "next_key"
+                elif self._state == "next_item" and char == ",":
+                    self._pos += 1
+                    self._state = "item"
+                elif self._state != "next_item":
+                    complete, value = self._decode_value(final)
+                    if not complete:
+                        return
+                    self._state = "next_item"
+                    yield self._array, value
+                else:
+                    raise UploadRejected("Invalid JSON format")
+
+            else:  # done
+                raise UploadRejected("Invalid JSON format")
+
+
+class ScrimIngestor:
+    """
+    Consumes raw upload bytes: decompresses, stores the matches (and timelines)
+    and scans them for team members on the fly. `dest_path` receives the
+    upload manifest.
+
+    `team_indexes` are Riot-ID indexes of the user's teams
+    (teams.get_team_riot_id_index): riot_id_key -> member entry with
+    "riot_id" and "team_id".
+    """
+
+    def __init__(self, dest_path: Path, team_indexes: List[Dict[str, Dict[str, Any]]]):
+        self.dest_path = Path(dest_path)
+        self._text = codecs.getincrementaldecoder("utf-8-sig")()
+        self._parser = MatchStreamParser()
+        self._inflater = None
+        self._started = False
+        self.bytes_received = 0
+        self.bytes_written = 0
+
+        self._team_indexes = team_indexes
+        # (team_id, riot_id_key) of the members already found
+        self._found = set()
+
+        self.matches_count = 0
+        self.match_date: Optional[datetime] = None
+        self.found_players: List[Dict[str, Any]] = []
+        self.team_id_found = None
+        self.digest: Optional[str] = None
+        # Store keys of the uploaded matches, in order, without duplicates
+        self.match_refs: List[str] = []
+        self._seen_refs = set()
+        self.new_matches = 0
+        # (key, rows) of the uploaded matches: they join the percentile
+        # distributions only once the upload is accepted (commit)
+        self._pending_rows: List[Tuple[str, Dict]] = []
+        self.timeline_refs: List[str] = []
+        self._seen_timelines = set()
+        # Store keys this upload wrote first (matches or timelines), released if it is rejected
+        self.created_refs: List[str] = []
+        from match_table import MatchTableBuilder  # NumPy: loaded on first upload, not at startup
+        self._table = MatchTableBuilder()
+
+    def feed(self, chunk: bytes):
+        """Process one chunk of the upload (blocking: run it in a worker thread)"""
+        self.bytes_received += len(chunk)
+        if self.bytes_received > UPLOAD_MAX_MB * 1024 * 1024:
+            raise UploadRejected(f"File too large (max {UPLOAD_MAX_MB} MB)", status_code=413)
+
+        if not self._started:
+            self._started = True
+            if chunk[:2] == GZIP_MAGIC:
+                self._inflater = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+
+        if self._inflater is None:
+            self._consume(chunk)
+            return
+
+        # Inflate in bounded steps so a compression bomb never materializes in memory
+        data = chunk
+        while data:
+            try:
+                out = self._inflater.decompress(data, UPLOAD_CHUNK_SIZE)
+            except zlib.error:
+                raise UploadRejected("Invalid gzip data")
+            self._consume(out)
+            data = self._inflater.unconsumed_tail
+
+    def _consume(self, data: bytes):
+        if not data:
+            return
+        self.bytes_written += len(data)
+        if self.bytes_written > UPLOAD_MAX_DECOMPRESSED_MB * 1024 * 1024:
+            raise UploadRejected(
+                f"File too large once decompressed (max {UPLOAD_MAX_DECOMPRESSED_MB} MB)", status_code=413
+            )
+
+        try:
+            text = self._text.decode(data)
+        except UnicodeDecodeError:
+            raise UploadRejected("Invalid JSON format")
+        for array, value in self._parser.feed(text):
+            self._scan(array, value)
+
+    def _scan(self, array: str, value: Any):
+        if array == "timelines":
+            self._scan_timeline(value)
+        else:
+            self._scan_match(value)
+
+    def _scan_timeline(self, timeline: Any):
+        if not isinstance(timeline, dict):
+            raise UploadRejected("Invalid JSON format: every timeline must be an object")
+        from timeline import InvalidTimeline
+
+        # Only the per-minute arrays are kept, the raw frames are dropped here
+        try:
+            key, created = match_store.put_timeline(timeline)
+        except InvalidTimeline as e:
+            raise UploadRejected(f"Invalid timeline: {e}")
+        if created:
+            self.created_refs.append(key)
+        if key is not None and key not in self._seen_timelines:
+            self._seen_timelines.add(key)
+            self.timeline_refs.append(key)
+
+    def _scan_match(self, match: Any):
+        self.matches_count += 1
+        if not isinstance(match, dict):
+            raise UploadRejected("Invalid JSON format: every match must be an object")
+
+        info = match.get("info")
+        if not isinstance(info, dict) or "participants" not in info:
+            return
+        # Checked before the store derives its rows from them
+        match_date = _game_date(info)
+
+        key, rows, created = match_store.put(match)
+        if created:
+            self.new_matches += 1
+            self.created_refs.append(key)
+        if key not in self._seen_refs:
+            self._seen_refs.add(key)
+            self.match_refs.append(key)
+            if rows is not None:
+                self._table.add_rows(rows)
+                self._pending_rows.append((key, rows))
+
+        # Get match date from first match
+        if not self.match_date:
+            self.match_date = match_date
+
+        for participant in info["participants"]:
+            riot_game_name = participant.get("riotIdGameName", "")
+            riot_tagline = participant.get("riotIdTagline", "")
+            if not (riot_game_name and riot_tagline):
+                continue
+
+            key = riot_id_key(riot_game_name, riot_tagline)
+            for index in self._team_indexes:
+                member_info = index.get(key)
+                if member_info is None or (member_info["team_id"], key) in self._found:
+                    continue
+                self._found.add((member_info["team_id"], key))
+                # Report the Riot ID as spelled in the matches: the analyses filter on it
+                self.found_players.append({**member_info, "riot_id": f"{riot_game_name}#{riot_tagline}"})
+                self.team_id_found = member_info["team_id"]
+                break
+
+    def finish(self) -> str:
+        """Flush everything, validate the document and write the manifest. Returns the content digest."""
+        if self._inflater is not None:
+            if not self._inflater.eof:
+                raise UploadRejected("Invalid gzip data: truncated file")
+            self._consume(self._inflater.flush())
+        try:
+            text = self._text.decode(b"", final=True)
+        except UnicodeDecodeError:
+            raise UploadRejected("Invalid JSON format")
+        for array, value in self._parser.feed(text):
+            self._scan(array, value)
+        for array, value in self._parser.close():
+            self._scan(array, value)
+
+        if not self._parser.found_matches:
+            raise UploadRejected("Invalid JSON format: file must contain a 'matches' array")
+        if not self.matches_count:
+            raise UploadRejected("No matches found in file")
+
+        # Same matches = same manifest = same digest, whatever file they came in
+        self.digest = hashlib.sha256(write_manifest(self.dest_path, self.match_refs, self.timeline_refs)).hexdigest()
+
+        # Columnar artifact for the analyses (they fall back to the store without it)
+        from match_table import save_artifact
+        try:
+            save_artifact(self._table.build(), self.dest_path)
+        except (OSError, TypeError, ValueError):
+            pass
+
+        return self.digest
+
+    def commit(self):
+        """The upload was accepted: its matches join the percentile distributions (those not counted yet)"""
+        pending, self._pending_rows = self._pending_rows, []
+        try:
+            percentile_distributions.add_matches(pending)
+        except SQLAlchemyError as e:
+            # The upload stands; rebuild_percentiles.py recounts the store
+            logger.warning(f"Percentiles not updated for {self.dest_path.name}: {e}")
+
+    def abort(self) -> List[str]:
+        """
+        Discard the manifest and the pending percentile rows. Returns the store
+        keys this upload wrote first, for storage.release_store_keys (the GC
+        deletes them unless another upload references them by then).
+        """
+        self._pending_rows = []
+        self.dest_path.unlink(missing_ok=True)
+        from match_table import remove_artifact
+        remove_artifact(self.dest_path)
+        return list(dict.fromkeys(self.created_refs))
+
+
+async def ingest_upload(upload, dest_path: Path, team_indexes: List[Dict[str, Dict[str, Any]]],
+                        on_abort: Optional[Callable[[List[str]], None]] = None) -> ScrimIngestor:
+    """
+    Stream an UploadFile through a ScrimIngestor without blocking the event loop.
+    The partial file is removed if the upload is rejected, and `on_abort`
+    receives the store keys it wrote first (see ScrimIngestor.abort).
+    """
+    if upload.size and upload.size > UPLOAD_MAX_MB * 1024 * 1024:
+        raise UploadRejected(f"File too large (max {UPLOAD_MAX_MB} MB)", status_code=413)
+
+    ingestor = await asyncio.to_thread(ScrimIngestor, dest_path, team_indexes)
+    try:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            await asyncio.to_thread(ingestor.feed, chunk)
+        await asyncio.to_thread(ingestor.finish)
+    except BaseException:
+        created_refs = ingestor.abort()
+        if on_abort is not None:
+            on_abort(created_refs)
+        raise
+
+    # The analysis endpoints won't need to hash the file again
+    remember_file_digest(dest_path, ingestor.digest)
+    return ingestor
@@ -22,6 +22,7 @@ load_dotenv()
 
 # Import database initialization
 from database import init_db
+from ingest import UploadSizeLimitMiddleware
 
 # Import routers
 from routes.health import router as health_router
@@ -56,6 +57,10 @@ app = FastAPI(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+# Oversized request bodies are refused while they stream, not once spooled
+# (added before CORS so the 413 still carries the CORS headers)
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # CORS configuration
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:5173,http://localhost:3000,http://localhost").split(",")
 
@@ -145,24 +150,48 @@ from fastapi.responses import JSONResponse, FileResponse
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from typing import Optional
+import asyncio
+from functools import partial
 import json
 import shutil
 import sys
+import uuid
 
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent))
 
-from analytics import ScrimAnalytics
+# The analytics stack (NumPy, matplotlib) is only imported by the analytics
+# workers and on first upload, never at startup
+from ingest import ingest_upload, UploadRejected
+from percentiles import percentile_distributions, annotate_analysis, POSITIONS
+from analysis_cache import (
+    ANALYTICS_VERSION, analysis_cache, analysis_key, file_digest,
+    CHART_NAMES, chart_path as analysis_chart_path, is_analysis_id, read_chart_manifest
+)
+from services.analytics_pool import (
+    run_analytics_job, run_analysis, run_players_overview, run_render_chart, run_append_team_matches,
+    run_team_synergy,
+    AnalyticsJobTimeout, AnalyticsPoolUnavailable
+)
 from database import (
-    get_db, User as DBUser, Scrim as DBScrim, Team as DBTeam,
+    get_db, get_async_db, User as DBUser, Scrim as DBScrim, Team as DBTeam,
     TeamInvite as DBInvite, UserAnalytics as DBUserAnalytics,
     TeamAnalytics as DBTeamAnalytics, team_members as team_members_table,
-    BugTicket as DBBugTicket, Notification as DBNotification
+    BugTicket as DBBugTicket, Notification as DBNotification, engine_stats
+)
+from auth import get_current_user, get_current_user_async, ACCESS_TOKEN_EXPIRE_MINUTES
+from teams import (
+    get_team_by_id, get_user_teams,
+    get_team_riot_id_index, get_team_riot_ids, invalidate_team_cache
 )
-from auth import get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
-from teams import get_team_by_id, get_team_members_with_roles, get_user_teams
+from storage import (
+    register_upload, release_store_keys, register_analytics, release_analytics, register_charts, attach_results,
+    refresh_blob_size, storage_usage, collect_garbage
+)
+from results_store import load_analysis_results
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, update
 from fastapi import Depends, HTTPException
 
 # Copy all analytics endpoints from main_old.py starting at line 817
@@ -170,6 +199,11 @@ from fastapi import Depends, HTTPException
 
 # ==================== ANALYTICS ENDPOINTS ====================
 
+def new_upload_path() -> Path:
+    """Unique path for an upload: ingestion writes to it (and its artifact) for several seconds"""
+    return UPLOAD_DIR / f"analytics_data_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{uuid.uuid4().hex[:8]}.json"
+
+
 @app.post("/api/upload-scrim-data")
 async def upload_scrim_data(
     file: UploadFile = File(...),
@@ -189,28 +223,9 @@ async def upload_scrim_data(
                 detail="You must be part of a team to analyze scrim data"
             )
 
-        # Check if any team member has a RIOT ID
-        has_riot_id = False
-        team_members_riot_ids = []
-        selected_team = None
-
-        for team in user_teams:
-            members = get_team_members_with_roles(db, team.id)
-            for member in members:
-                # member dict has "id", not "user_id"
-                riot_game_name = member.get("riot_game_name")
-                riot_tag_line = member.get("riot_tag_line")
-
-                if riot_game_name and riot_tag_line:
-                    riot_id = f"{riot_game_name}#{riot_tag_line}"
-                    team_members_riot_ids.append({
-                        "riot_id": riot_id,
-                        "game_name": riot_game_name,
-                        "tag_line": riot_tag_line,
-                        "team_id": team.id,
-                        "team_name": team.name
-                    })
-                    has_riot_id = True
+        # Prebuilt Riot-ID index of each team (cached, refreshed on roster changes)
+        team_indexes = [get_team_riot_id_index(db, team) for team in user_teams]
+        has_riot_id = any(team_indexes)
 
         if not has_riot_id:
             raise HTTPException(
@@ -218,68 +233,34 @@ async def upload_scrim_data(
                 detail="No team member has configured their Riot ID. Please add your Riot ID in your profile settings."
             )
 
-        # Validate file type
-        if not file.filename.endswith('.json'):
+        # Validate file type (gzip-compressed JSON is accepted too)
+        if not file.filename.lower().endswith(('.json', '.json.gz')):
             raise HTTPException(status_code=400, detail="File must be in JSON format")
 
-        # Save uploaded file
-        file_path = UPLOAD_DIR / f"analytics_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        # Validate JSON structure
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        # Validate format: must have "matches" array (Riot API format)
-        if "matches" not in data:
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid JSON format: file must contain a 'matches' array"
-            )
-
-        matches = data.get("matches", [])
-        if not matches:
-            raise HTTPException(status_code=400, detail="No matches found in file")
-
-        # Find which team members are in the matches
-        found_players = []
-        team_id_found = None
-        match_date = None
-
-        for match in matches:
-            if "info" not in match or "participants" not in match["info"]:
-                continue
-
-            # Get match date from first match
-            if not match_date and "gameCreation" in match["info"]:
-                match_date = datetime.fromtimestamp(match["info"]["gameCreation"] / 1000)
-
-            participants = match["info"]["participants"]
-
-            for participant in participants:
-                summoner_name = participant.get("summonerName", "")
-                riot_game_name = participant.get("riotIdGameName", "")
-                riot_tagline = participant.get("riotIdTagline", "")
-
-                # Check if this participant matches any team member
-                for member_info in team_members_riot_ids:
-                    if (riot_game_name and riot_tagline and
-                        riot_game_name.lower() == member_info["game_name"].lower() and
-                        riot_tagline.lower() == member_info["tag_line"].lower()):
+        # Stream, validate and scan the upload while saving it
+        file_path = new_upload_path()
+        try:
+            ingest = await ingest_upload(file, file_path, team_indexes, partial(release_store_keys, db))
+        except UploadRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-                        if member_info not in found_players:
-                            found_players.append(member_info)
-                            team_id_found = member_info["team_id"]
-                        break
+        found_players = ingest.found_players
+        team_id_found = ingest.team_id_found
+        match_date = ingest.match_date
 
         if not found_players:
+            release_store_keys(db, ingest.abort())
             raise HTTPException(
                 status_code=400,
                 detail="No team members were found in the matches. Please verify that Riot IDs are correct."
             )
 
+        # Accepted: unsaved uploads are collected after the retention period
+        register_upload(db, file_path, current_user.id, ingest.match_refs + ingest.timeline_refs)
+        db.commit()
+        # Its matches join the percentile distributions
+        await asyncio.to_thread(ingest.commit)
+
         # Determine analysis name based on filename
         filename_lower = file.filename.lower()
         if "scrim" in filename_lower:
@@ -297,14 +278,13 @@ async def upload_scrim_data(
             "message": "File uploaded successfully",
             "file_path": str(file_path),
             "analysis_name": analysis_name,
-            "matches_count": len(matches),
+            "matches_count": ingest.matches_count,
+            "timelines_count": len(ingest.timeline_refs),
             "found_players": [p["riot_id"] for p in found_players],
             "team_id": team_id_found,
             "uploaded_at": datetime.now().isoformat()
         }
 
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Invalid JSON format")
     except HTTPException:
         raise
     except Exception as e:
@@ -313,6 +293,7 @@ async def upload_scrim_data(
 class AnalyzeRequest(BaseModel):
     file_path: str
     team_riot_ids: list[str] = []  # RIOT IDs of team members to analyze
+    chart_mode: str = "png"  # "png" (chart image URLs) or "data" (series to plot client-side)
 
 @app.post("/api/analyze-scrim")
 async def analyze_scrim(
@@ -328,15 +309,35 @@ async def analyze_scrim(
         path = Path(request.file_path)
         if not path.exists():
             raise HTTPException(status_code=404, detail="File not found")
+        if request.chart_mode not in ("png", "data"):
+            raise HTTPException(status_code=400, detail="chart_mode must be 'png' or 'data'")
+
+        # Same upload + same team filter = same result
+        digest = await asyncio.to_thread(file_digest, path)
+        analysis_id = analysis_key(digest, request.team_riot_ids)
+        cache_key = analysis_key(digest, request.team_riot_ids, "analyze", request.chart_mode)
+        cached = analysis_cache.get(cache_key)
+        if cached is not None:
+            return JSONResponse(content=await asyncio.to_thread(annotate_analysis, cached))
+
+        # Process data in the analytics worker pool (keeps the event loop free)
+        result = await run_analytics_job(
+            run_analysis, str(path), request.team_riot_ids, analysis_id, request.chart_mode
+        )
+        if result.get("success"):
+            analysis_cache.put(cache_key, result)
+            register_charts(db, analysis_id, path)
+            db.commit()
 
-        # Initialize analytics processor with team filter
-        analytics = ScrimAnalytics(path, team_riot_ids=request.team_riot_ids)
-
-        # Process data
-        result = analytics.process()
-
-        return JSONResponse(content=result)
+        # Platform-wide percentiles are looked up per request (they move as matches are ingested)
+        return JSONResponse(content=await asyncio.to_thread(annotate_analysis, result))
 
+    except HTTPException:
+        raise
+    except AnalyticsJobTimeout as e:
+        raise HTTPException(status_code=504, detail=f"Analysis timed out: {str(e)}")
+    except AnalyticsPoolUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
@@ -356,17 +357,71 @@ async def get_players_stats(
                 raise HTTPException(status_code=404, detail="No data files found")
             path = files[0]
 
-        analytics = ScrimAnalytics(path)
-        players_data = analytics.get_players_overview()
+        digest = await asyncio.to_thread(file_digest, path)
+        cache_key = analysis_key(digest, [], "players-stats")
+        players_data = analysis_cache.get(cache_key)
+        if players_data is None:
+            players_data = await run_analytics_job(run_players_overview, str(path))
+            analysis_cache.put(cache_key, players_data)
 
-        return JSONResponse(content=players_data)
+        return JSONResponse(content=await asyncio.to_thread(annotate_analysis, players_data))
 
+    except HTTPException:
+        raise
+    except AnalyticsJobTimeout as e:
+        raise HTTPException(status_code=504, detail=f"Failed to get player stats: {str(e)}")
+    except AnalyticsPoolUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get player stats: {str(e)}")
 
+# (analysis_id, chart_name) -> in-flight render, so concurrent requests share one render
+_chart_renders: dict = {}
+
+async def _render_chart_once(analysis_id: str, chart_name: str, manifest: dict):
+    """Render a chart in the worker pool, deduplicating concurrent requests"""
+    key = (analysis_id, chart_name)
+    task = _chart_renders.get(key)
+    if task is None:
+        task = asyncio.ensure_future(run_analytics_job(
+            run_render_chart, manifest["data_file"], manifest["team_riot_ids"], analysis_id, chart_name
+        ))
+        _chart_renders[key] = task
+        task.add_done_callback(lambda _: _chart_renders.pop(key, None))
+    await asyncio.shield(task)
+
+@app.get("/api/charts/{analysis_id}/{chart_name}")
+async def get_analysis_chart(analysis_id: str, chart_name: str, db: Session = Depends(get_db)):
+    """Serve a chart of one analysis, rendering it on first request (content-addressed, cacheable forever)"""
+    if not is_analysis_id(analysis_id) or chart_name not in CHART_NAMES:
+        raise HTTPException(status_code=404, detail="Chart not found")
+
+    chart_path = analysis_chart_path(analysis_id, chart_name)
+    if not chart_path.exists():
+        manifest = read_chart_manifest(analysis_id)
+        if manifest is None or not Path(manifest["data_file"]).exists():
+            raise HTTPException(status_code=404, detail="Chart not found")
+
+        try:
+            await _render_chart_once(analysis_id, chart_name, manifest)
+        except AnalyticsJobTimeout as e:
+            raise HTTPException(status_code=504, detail=f"Chart rendering timed out: {str(e)}")
+        except AnalyticsPoolUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Chart rendering failed: {str(e)}")
+        refresh_blob_size(db, f"charts:{analysis_id}")
+        db.commit()
+
+    return FileResponse(
+        chart_path,
+        media_type="image/png",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
 @app.get("/api/charts/{chart_name}")
 async def get_chart(chart_name: str):
-    """Serve generated chart images"""
+    """Serve generated chart images (legacy fixed filenames)"""
     chart_path = EXPORT_DIR / "charts" / f"{chart_name}.png"
 
     if not chart_path.exists():
@@ -473,10 +528,14 @@ async def save_analytics(
                 name=request.name,
                 file_name=file_path.name,
                 players_count=str(len(request.analysis_results.get("players", []))),
-                data_path=request.file_path,
-                analysis_results=request.analysis_results
+                data_path=request.file_path
             )
             db.add(team_analytics)
+            db.flush()
+            register_analytics(db, "team_analytics", team_analytics.id, [request.file_path],
+                               user_id=current_user.id, team_id=request.team_id)
+            attach_results(db, "team_analytics", team_analytics, request.analysis_results,
+                           user_id=current_user.id, team_id=request.team_id)
             db.commit()
             db.refresh(team_analytics)
 
@@ -506,10 +565,14 @@ async def save_analytics(
                 name=request.name,
                 file_name=file_path.name,
                 players_count=str(len(request.analysis_results.get("players", []))),
-                data_path=request.file_path,
-                analysis_results=request.analysis_results
+                data_path=request.file_path
             )
             db.add(user_analytics)
+            db.flush()
+            register_analytics(db, "user_analytics", user_analytics.id, [request.file_path],
+                               user_id=current_user.id)
+            attach_results(db, "user_analytics", user_analytics, request.analysis_results,
+                           user_id=current_user.id)
             db.commit()
             db.refresh(user_analytics)
 
@@ -527,30 +590,34 @@ async def save_analytics(
         raise HTTPException(status_code=500, detail=f"Failed to save analytics: {str(e)}")
 
 
+def _analytics_summary(analytics, created_by: Optional[str] = None) -> dict:
+    """List entry of a saved analysis (analysis_results is deferred and never loaded here)"""
+    summary = {
+        "id": analytics.id,
+        "name": analytics.name,
+        "file_name": analytics.file_name,
+        "players_count": analytics.players_count,
+        "uploaded_at": analytics.uploaded_at.isoformat(),
+        "data_path": analytics.data_path
+    }
+    if created_by is not None:
+        summary["created_by"] = created_by
+    return summary
+
+
 @app.get("/api/analytics/personal")
 async def get_personal_analytics(
     current_user: DBUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get user's saved personal analytics"""
+    """Get user's saved personal analytics (summaries, see /api/analytics/detail/personal/{id})"""
     try:
         analytics = db.query(DBUserAnalytics).filter(
             DBUserAnalytics.user_id == current_user.id
         ).order_by(DBUserAnalytics.uploaded_at.desc()).all()
 
         return {
-            "analytics": [
-                {
-                    "id": a.id,
-                    "name": a.name,
-                    "file_name": a.file_name,
-                    "players_count": a.players_count,
-                    "uploaded_at": a.uploaded_at.isoformat(),
-                    "data_path": a.data_path,
-                    "analysis_results": a.analysis_results
-                }
-                for a in analytics
-            ],
+            "analytics": [_analytics_summary(a) for a in analytics],
             "count": len(analytics),
             "limit": MAX_PERSONAL_ANALYTICS
         }
@@ -564,7 +631,7 @@ async def get_team_analytics(
     current_user: DBUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get team's saved analytics"""
+    """Get team's saved analytics (summaries, see /api/analytics/detail/team/{id})"""
     try:
         # Verify user is member of team
         team = get_team_by_id(db, team_id)
@@ -577,22 +644,10 @@ async def get_team_analytics(
 
         # Get creator names
         creator_ids = [a.created_by_id for a in analytics]
-        creators = {u.id: u.username for u in db.query(DBUser).filter(DBUser.id.in_(creator_ids)).all()}
+        creators = dict(db.query(DBUser.id, DBUser.username).filter(DBUser.id.in_(creator_ids)).all())
 
         return {
-            "analytics": [
-                {
-                    "id": a.id,
-                    "name": a.name,
-                    "file_name": a.file_name,
-                    "players_count": a.players_count,
-                    "uploaded_at": a.uploaded_at.isoformat(),
-                    "created_by": creators.get(a.created_by_id, "Unknown"),
-                    "data_path": a.data_path,
-                    "analysis_results": a.analysis_results
-                }
-                for a in analytics
-            ],
+            "analytics": [_analytics_summary(a, creators.get(a.created_by_id, "Unknown")) for a in analytics],
             "count": len(analytics),
             "limit": MAX_TEAM_ANALYTICS
         }
@@ -602,6 +657,61 @@ async def get_team_analytics(
         raise HTTPException(status_code=500, detail=f"Failed to get team analytics: {str(e)}")
 
 
+@app.get("/api/analytics/detail/personal/{analytics_id}")
+async def get_personal_analytics_detail(
+    analytics_id: str,
+    current_user: DBUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get one saved personal analysis with its full results"""
+    try:
+        analytics = db.query(DBUserAnalytics).filter(
+            DBUserAnalytics.id == analytics_id,
+            DBUserAnalytics.user_id == current_user.id
+        ).first()
+
+        if not analytics:
+            raise HTTPException(status_code=404, detail="Analytics not found")
+
+        analysis_results = await asyncio.to_thread(annotate_analysis, load_analysis_results(analytics))
+        return {**_analytics_summary(analytics), "analysis_results": analysis_results}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get analytics: {str(e)}")
+
+
+@app.get("/api/analytics/detail/team/{analytics_id}")
+async def get_team_analytics_detail(
+    analytics_id: str,
+    current_user: DBUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get one saved team analysis with its full results (team members only)"""
+    try:
+        analytics = db.query(DBTeamAnalytics).filter(
+            DBTeamAnalytics.id == analytics_id
+        ).first()
+
+        if not analytics:
+            raise HTTPException(status_code=404, detail="Analytics not found")
+
+        team = get_team_by_id(db, analytics.team_id)
+        if not team or current_user not in team.members:
+            raise HTTPException(status_code=403, detail="Not a team member")
+
+        creator = db.query(DBUser.username).filter(DBUser.id == analytics.created_by_id).scalar()
+        analysis_results = await asyncio.to_thread(annotate_analysis, load_analysis_results(analytics))
+        return {
+            **_analytics_summary(analytics, creator or "Unknown"),
+            "analysis_results": analysis_results
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get analytics: {str(e)}")
+
+
 @app.delete("/api/analytics/personal/{analytics_id}")
 async def delete_personal_analytics(
     analytics_id: str,
@@ -618,6 +728,7 @@ async def delete_personal_analytics(
         if not analytics:
             raise HTTPException(status_code=404, detail="Analytics not found")
 
+        release_analytics(db, "user_analytics", analytics.id)
         db.delete(analytics)
         db.commit()
 
@@ -652,6 +763,7 @@ async def delete_team_analytics(
         if analytics.created_by_id != current_user.id and team.owner_id != current_user.id:
             raise HTTPException(status_code=403, detail="Only the creator or team owner can delete this")
 
+        release_analytics(db, "team_analytics", analytics.id)
         db.delete(analytics)
         db.commit()
 
@@ -663,6 +775,171 @@ async def delete_team_analytics(
         raise HTTPException(status_code=500, detail=f"Failed to delete analytics: {str(e)}")
 
 
+@app.post("/api/analytics/team/{analytics_id}/append")
+async def append_team_analytics(
+    analytics_id: str,
+    file: UploadFile = File(...),
+    current_user: DBUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Add new matches to a saved team analysis (matches already included are skipped)"""
+    try:
+        analytics = db.query(DBTeamAnalytics).filter(
+            DBTeamAnalytics.id == analytics_id
+        ).first()
+
+        if not analytics:
+            raise HTTPException(status_code=404, detail="Analytics not found")
+
+        # Verify user is member of team
+        team = get_team_by_id(db, analytics.team_id)
+        if not team or current_user not in team.members:
+            raise HTTPException(status_code=403, detail="Not a team member")
+
+        if not file.filename.lower().endswith(('.json', '.json.gz')):
+            raise HTTPException(status_code=400, detail="File must be in JSON format")
+
+        # Team filter: the one the aggregates were built with, else the team's Riot IDs
+        team_index = get_team_riot_id_index(db, team)
+        aggregates = analytics.aggregates
+        if aggregates and aggregates.get("team_riot_ids"):
+            team_riot_ids = aggregates["team_riot_ids"]
+        else:
+            team_riot_ids = [member["riot_id"] for member in team_index.values()]
+
+        # Stream the new matches to disk (validated + columnar artifact)
+        file_path = new_upload_path()
+        try:
+            ingest = await ingest_upload(file, file_path, [team_index], partial(release_store_keys, db))
+        except UploadRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+        # Until the analysis references it, a failure discards the upload (and releases what it stored)
+        try:
+            sources = (aggregates or {}).get("sources") or [analytics.data_path]
+            missing = [source for source in sources if not Path(source).exists()]
+            if missing and (not aggregates or aggregates.get("version") != ANALYTICS_VERSION):
+                raise HTTPException(
+                    status_code=409,
+                    detail="The original data of this analysis is no longer available, it cannot be extended"
+                )
+
+            result = await run_analytics_job(
+                run_append_team_matches, aggregates, sources, str(file_path), team_riot_ids
+            )
+
+            analytics.aggregates = result["aggregates"]
+            attach_results(db, "team_analytics", analytics, result["analysis_results"],
+                           user_id=analytics.created_by_id, team_id=analytics.team_id)
+            analytics.players_count = str(len(result["analysis_results"].get("players", [])))
+            if result["added_matches"]:
+                register_upload(db, file_path, current_user.id, ingest.match_refs + ingest.timeline_refs)
+                register_analytics(db, "team_analytics", analytics.id, [str(file_path)],
+                                   user_id=current_user.id, team_id=analytics.team_id)
+            db.commit()
+        except BaseException:
+            db.rollback()
+            release_store_keys(db, ingest.abort())
+            raise
+
+        if result["added_matches"]:
+            await asyncio.to_thread(ingest.commit)
+        else:
+            release_store_keys(db, ingest.abort())
+
+        return {
+            "success": True,
+            "id": analytics.id,
+            "added_matches": result["added_matches"],
+            "skipped_matches": result["skipped_matches"],
+            "total_matches": len(result["aggregates"]["match_ids"]),
+            "analysis_results": await asyncio.to_thread(annotate_analysis, result["analysis_results"])
+        }
+
+    except HTTPException:
+        raise
+    except AnalyticsJobTimeout as e:
+        db.rollback()
+        raise HTTPException(status_code=504, detail=f"Failed to append matches: {str(e)}")
+    except AnalyticsPoolUnavailable as e:
+        db.rollback()
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to append matches: {str(e)}")
+
+
+@app.get("/api/analytics/team/{team_id}/synergy")
+async def get_team_synergy(
+    team_id: str,
+    min_games: int = 1,
+    current_user: DBUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Champion pair synergies, lane matchups and compositions over all saved analyses of a team"""
+    try:
+        team = get_team_by_id(db, team_id)
+        if not team or current_user not in team.members:
+            raise HTTPException(status_code=403, detail="Not a team member")
+
+        team_riot_ids = get_team_riot_ids(db, team)
+        if not team_riot_ids:
+            raise HTTPException(status_code=400, detail="No team member has configured their Riot ID")
+
+        # Upload files of every saved analysis (appended analyses keep theirs in the aggregates)
+        sources = []
+        for analytics in db.query(DBTeamAnalytics.data_path, DBTeamAnalytics.aggregates).filter(
+            DBTeamAnalytics.team_id == team_id
+        ).order_by(DBTeamAnalytics.uploaded_at).all():
+            for source in (analytics.aggregates or {}).get("sources") or [analytics.data_path]:
+                if source and source not in sources:
+                    sources.append(source)
+
+        return await run_analytics_job(run_team_synergy, team_id, sources, team_riot_ids, max(min_games, 1))
+
+    except HTTPException:
+        raise
+    except AnalyticsJobTimeout as e:
+        raise HTTPException(status_code=504, detail=f"Failed to get team synergy: {str(e)}")
+    except AnalyticsPoolUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get team synergy: {str(e)}")
+
+
+# ==================== PERCENTILES ENDPOINTS ====================
+
+@app.get("/api/percentiles")
+async def get_percentile_distributions(current_user: DBUser = Depends(get_current_user)):
+    """Sample sizes and quartiles of the per-position metric distributions"""
+    try:
+        return await asyncio.to_thread(percentile_distributions.summary)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get percentiles: {str(e)}")
+
+
+@app.get("/api/percentiles/{position}")
+async def get_player_percentiles(
+    position: str,
+    kda: Optional[float] = None,
+    dpm: Optional[float] = None,
+    gpm: Optional[float] = None,
+    csm: Optional[float] = None,
+    kp: Optional[float] = None,
+    games: Optional[int] = None,
+    current_user: DBUser = Depends(get_current_user)
+):
+    """Percentiles of a player's average metric values among all players of a position"""
+    position = position.upper()
+    if position not in POSITIONS:
+        raise HTTPException(status_code=400, detail=f"position must be one of {', '.join(POSITIONS)}")
+    values = {"kda": kda, "dpm": dpm, "gpm": gpm, "csm": csm, "kp": kp}
+    return {
+        "position": position,
+        "percentiles": await asyncio.to_thread(percentile_distributions.player_percentiles, position, values, games)
+    }
+
+
 # ==================== ADMIN ENDPOINTS ====================
 
 def get_admin_user(current_user: DBUser = Depends(get_current_user)):
@@ -730,6 +1007,41 @@ async def get_admin_stats(
         raise HTTPException(status_code=500, detail=f"Failed to get stats: {str(e)}")
 
 
+@app.get("/api/admin/storage")
+async def get_storage_usage(
+    limit: int = 50,
+    admin: DBUser = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Disk usage of uploads, stored matches and charts, per user and per team (admin only)"""
+    try:
+        return storage_usage(db, limit=limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get storage usage: {str(e)}")
+
+
+@app.post("/api/admin/storage/collect")
+async def collect_storage_garbage(
+    admin: DBUser = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Run one garbage collection pass now instead of waiting for the scheduler (admin only)"""
+    try:
+        return collect_garbage(db)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Storage collection failed: {str(e)}")
+
+
+@app.get("/api/admin/db")
+async def get_database_stats(admin: DBUser = Depends(get_admin_user)):
+    """Database engine profile and connection pool statistics (admin only)"""
+    try:
+        return engine_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get database stats: {str(e)}")
+
+
 @app.get("/api/admin/users")
 async def get_all_users(
     admin: DBUser = Depends(get_admin_user),
@@ -827,9 +1139,13 @@ async def delete_user(
         raise HTTPException(status_code=404, detail="User not found")
 
     try:
+        team_ids = [team.id for team in user.teams]
+
         # Delete user (cascades will handle related data)
         db.delete(user)
         db.commit()
+        for team_id in team_ids:
+            invalidate_team_cache(team_id)
         return {"message": f"User {user.username} deleted successfully"}
     except Exception as e:
         db.rollback()
@@ -913,6 +1229,7 @@ async def admin_delete_team(
 
         db.delete(team)
         db.commit()
+        invalidate_team_cache(team_id)
 
         return {"message": f"Team {team.name} deleted successfully"}
     except Exception as e:
@@ -1139,18 +1456,27 @@ async def get_ticket_stats(
 
 @app.get("/api/notifications")
 async def get_my_notifications(
-    current_user: DBUser = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: DBUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
     unread_only: bool = False
 ):
     """Get current user's notifications"""
     try:
-        query = db.query(DBNotification).filter(DBNotification.user_id == current_user.id)
+        query = select(DBNotification).where(DBNotification.user_id == current_user.id)
 
         if unread_only:
-            query = query.filter(DBNotification.is_read == False)
+            query = query.where(DBNotification.is_read == False)
+
+        notifications = (await db.execute(
+            query.order_by(DBNotification.created_at.desc()).limit(50)
+        )).scalars().all()
 
-        notifications = query.order_by(DBNotification.created_at.desc()).limit(50).all()
+        unread_count = (await db.execute(
+            select(func.count(DBNotification.id)).where(
+                DBNotification.user_id == current_user.id,
+                DBNotification.is_read == False
+            )
+        )).scalar()
 
         return {
             "notifications": [
@@ -1166,66 +1492,65 @@ async def get_my_notifications(
                 }
                 for n in notifications
             ],
-            "unread_count": db.query(func.count(DBNotification.id)).filter(
-                DBNotification.user_id == current_user.id,
-                DBNotification.is_read == False
-            ).scalar()
+            "unread_count": unread_count
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get notifications: {str(e)}")
 
 
+async def _get_own_notification(db: AsyncSession, notification_id: str, user_id: str) -> DBNotification:
+    """A notification of the user, or 404"""
+    notification = (await db.execute(
+        select(DBNotification).where(
+            DBNotification.id == notification_id,
+            DBNotification.user_id == user_id
+        )
+    )).scalar_one_or_none()
+
+    if not notification:
+        raise HTTPException(status_code=404, detail="Notification not found")
+    return notification
+
+
 @app.patch("/api/notifications/{notification_id}/read")
 async def mark_notification_read(
     notification_id: str,
-    current_user: DBUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: DBUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Mark a notification as read"""
-    notification = db.query(DBNotification).filter(
-        DBNotification.id == notification_id,
-        DBNotification.user_id == current_user.id
-    ).first()
-
-    if not notification:
-        raise HTTPException(status_code=404, detail="Notification not found")
-
+    notification = await _get_own_notification(db, notification_id, current_user.id)
     notification.is_read = True
-    db.commit()
+    await db.commit()
     return {"message": "Notification marked as read"}
 
 
 @app.patch("/api/notifications/read-all")
 async def mark_all_notifications_read(
-    current_user: DBUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: DBUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Mark all notifications as read"""
-    db.query(DBNotification).filter(
-        DBNotification.user_id == current_user.id,
-        DBNotification.is_read == False
-    ).update({"is_read": True})
-    db.commit()
+    await db.execute(
+        update(DBNotification).where(
+            DBNotification.user_id == current_user.id,
+            DBNotification.is_read == False
+        ).values(is_read=True)
+    )
+    await db.commit()
     return {"message": "All notifications marked as read"}
 
 
 @app.delete("/api/notifications/{notification_id}")
 async def delete_notification(
     notification_id: str,
-    current_user: DBUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: DBUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a notification"""
-    notification = db.query(DBNotification).filter(
-        DBNotification.id == notification_id,
-        DBNotification.user_id == current_user.id
-    ).first()
-
-    if not notification:
-        raise HTTPException(status_code=404, detail="Notification not found")
-
-    db.delete(notification)
-    db.commit()
+    notification = await _get_own_notification(db, notification_id, current_user.id)
+    await db.delete(notification)
+    await db.commit()
     return {"message": "Notification deleted"}
 
 
@@ -1235,6 +1560,12 @@ async def shutdown_event():
     from services.scheduler import shutdown_scheduler
     shutdown_scheduler()
 
+    from services.analytics_pool import shutdown_pool
+    shutdown_pool()
+
+    from database import dispose_async_engine
+    await dispose_async_engine()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,491 @@
+"""
+Global match store - every match is saved once, keyed by its matchId
+
+    uploads/matches/<shard>/<key>.json.zst   raw match-v5 payload (zstd, trained dictionary)
+    uploads/matches/<shard>/<key>.sha256     content digest of the payload (match_digest)
+    uploads/matches/<shard>/<key>.rows.json  derived participant rows (MatchTableBuilder.match_rows)
+    uploads/matches/<shard>/<key>.timeline.npz  timeline frames as per-minute arrays (timeline.py)
+    uploads/matches/dictionaries/<dict id>.zdict  zstd dictionaries trained on stored matches
+
+The same scrim games are uploaded again and again (per-scrim files, season
+files, by several team members). Uploads are stored as small manifests that
+reference matches in the store instead of copying them, and the derived rows
+of a match are computed once and reused by every analysis that includes it.
+The matchId is supplied by the uploader: a payload that differs from the one
+stored under its matchId is stored next to it (matchId + digest), so it never
+replaces another team's copy nor picks up its rows.
+
+Match-v5 payloads share most of their keys and many values, so a dictionary
+trained on stored matches (train_match_dictionary.py) compresses each one
+several times better than zstd alone. Frames record the ID of their
+dictionary, so older matches stay readable after retraining; matches stored
+as plain .json (before compression) are read as well.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+MATCH_STORE_DIR = Path(os.getenv("MATCH_STORE_DIR", str(Path(__file__).parent.parent / "uploads" / "matches")))
+
+# Uploads written by the ingestion are manifests of match references
+MANIFEST_FORMAT = "openrift.match_refs"
+MANIFEST_VERSION = 1
+_MANIFEST_PREFIX = b'{"format":"' + MANIFEST_FORMAT.encode() + b'"'
+
+_SAFE_KEY = re.compile(r"^[A-Za-z0-9_\-]{1,64}$")
+
+# zstd level of stored matches (written once at upload, read by every analysis)
+MATCH_COMPRESSION_LEVEL = int(os.getenv("MATCH_COMPRESSION_LEVEL", "9"))
+
+# Size of trained dictionaries (zstd's default)
+MATCH_DICT_SIZE = 112640
+
+_ZSTD_FRAME_HEADER_MAX = 18
+
+
+def match_digest(match: Dict[str, Any]) -> str:
+    """SHA-256 of a match payload, whatever its key order and whitespace"""
+    canonical = json.dumps(match, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def match_key(match: Dict[str, Any], digest: Optional[str] = None) -> str:
+    """
+    Preferred store key of a match: its matchId (Riot or ROFL-derived), or a
+    content hash for matches without a usable one. MatchStore.put falls back
+    to a digest-qualified key when another payload already holds it.
+    """
+    match_id = str((match.get("metadata") or {}).get("matchId") or "")
+    if _SAFE_KEY.match(match_id):
+        return match_id
+    return "content_" + (digest or match_digest(match))[:40]
+
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+# ==================== COMPRESSION ====================
+
+class MatchCodec:
+    """zstd compression of match payloads with the latest trained dictionary"""
+
+    def __init__(self, dict_dir: Path, level: int = MATCH_COMPRESSION_LEVEL):
+        self.dict_dir = Path(dict_dir)
+        self.level = level
+        self._lock = threading.Lock()
+        self._dicts = {}  # dict id -> ZstdCompressionDict
+        self._current_id = None  # latest dictionary (0: none trained yet)
+        self._dir_mtime_ns = None  # dictionary directory as of _current_id
+        self._local = threading.local()  # per-thread compressor (they are not thread-safe)
+
+    def _load_dict(self, dict_id: int):
+        import zstandard
+
+        with self._lock:
+            if dict_id not in self._dicts:
+                with open(self.dict_dir / f"{dict_id}.zdict", "rb") as f:
+                    self._dicts[dict_id] = zstandard.ZstdCompressionDict(f.read())
+            return self._dicts[dict_id]
+
+    def current_dict_id(self) -> int:
+        """
+        ID of the dictionary new matches are compressed with (0: no dictionary).
+        Looked up again when the directory changes, so a dictionary trained by
+        train_match_dictionary.py is used without restarting the server.
+        """
+        try:
+            mtime_ns = self.dict_dir.stat().st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        if self._current_id is None or mtime_ns != self._dir_mtime_ns:
+            dictionaries = sorted(self.dict_dir.glob("*.zdict"), key=lambda p: p.stat().st_mtime)
+            self._current_id = int(dictionaries[-1].stem) if dictionaries else 0
+            self._dir_mtime_ns = mtime_ns
+        return self._current_id
+
+    def add_dictionary(self, data: bytes) -> int:
+        """Save a trained dictionary and use it for new matches. Returns its ID."""
+        import zstandard
+
+        dict_id = zstandard.ZstdCompressionDict(data).dict_id()
+        _write_atomic(self.dict_dir / f"{dict_id}.zdict", data)
+        with self._lock:
+            self._dicts.pop(dict_id, None)
+            self._current_id = dict_id
+        return dict_id
+
+    def compress(self, data: bytes) -> bytes:
+        import zstandard
+
+        dict_id = self.current_dict_id()
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None or self._local.dict_id != dict_id:
+            dictionary = self._load_dict(dict_id) if dict_id else None
+            compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+            self._local.compressor, self._local.dict_id = compressor, dict_id
+        return compressor.compress(data)
+
+    def reader(self, f):
+        """Decompressing reader over a file object positioned at a zstd frame"""
+        import zstandard
+
+        header = f.read(_ZSTD_FRAME_HEADER_MAX)
+        f.seek(0)
+        dict_id = zstandard.get_frame_parameters(header).dict_id
+        dictionary = self._load_dict(dict_id) if dict_id else None
+        return zstandard.ZstdDecompressor(dict_data=dictionary).stream_reader(f)
+
+    @staticmethod
+    def train(samples: List[bytes], size: int = MATCH_DICT_SIZE) -> bytes:
+        """Train a dictionary on serialized matches"""
+        import zstandard
+        return zstandard.train_dictionary(size, samples).as_bytes()
+
+
+class MatchStore:
+    """Content store of matches and their derived rows"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.codec = MatchCodec(self.root / "dictionaries")
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        shard = hashlib.sha1(key.encode("utf-8")).hexdigest()[:2]
+        directory = self.root / shard
+        return directory / f"{key}.json.zst", directory / f"{key}.rows.json"
+
+    def _raw_path(self, key: str) -> Optional[Path]:
+        """Stored payload of a match: compressed, else plain JSON (stored before compression)"""
+        raw_path, _ = self._paths(key)
+        if raw_path.exists():
+            return raw_path
+        plain_path = raw_path.with_name(f"{key}.json")
+        return plain_path if plain_path.exists() else None
+
+    def contains(self, key: str) -> bool:
+        return self._raw_path(key) is not None
+
+    def keys(self) -> Iterator[str]:
+        """Keys of every stored match"""
+        for raw_path in self.root.glob("*/*.json*"):
+            name = raw_path.name
+            if name.endswith(".json.zst"):
+                yield name[:-len(".json.zst")]
+            elif name.endswith(".json") and not name.endswith(".rows.json"):
+                # Plain payload: listed unless a compressed copy exists
+                if not raw_path.with_name(f"{name}.zst").exists():
+                    yield name[:-len(".json")]
+
+    def _digest_path(self, key: str) -> Path:
+        _, rows_path = self._paths(key)
+        return rows_path.with_name(f"{key}.sha256")
+
+    def _claim(self, key: str, digest: str) -> bool:
+        """Record the digest of a new key unless another payload claimed it first"""
+        path = self._digest_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            f.write(digest)
+        return True
+
+    def stored_digest(self, key: str) -> Optional[str]:
+        """match_digest of the payload stored (or being stored) under a key, or None"""
+        try:
+            return self._digest_path(key).read_text().strip() or None
+        except OSError:
+            pass
+        if self._raw_path(key) is None:
+            return None
+        # Stored before digests were recorded: computed once
+        digest = match_digest(self.get(key))
+        _write_atomic(self._digest_path(key), digest.encode("ascii"))
+        return digest
+
+    def put(self, match: Dict[str, Any]) -> Tuple[str, Optional[Dict], bool]:
+        """
+        Store a match unless the same payload is already there. A payload that
+        differs from the one stored under its matchId gets its own key
+        (matchId_<digest>), so an upload never gets another upload's rows.
+        Returns (key, derived rows, created). Rows are None for matches without participants.
+        """
+        digest = match_digest(match)
+        preferred = match_key(match, digest)
+        candidates = [preferred, f"{preferred}_{digest[:16]}", f"content_{digest[:40]}"]
+        for key in dict.fromkeys(candidates):
+            existing = self._raw_path(key)
+            if existing is not None or self._digest_path(key).exists():
+                if self.stored_digest(key) != digest:
+                    continue
+                if existing is not None:
+                    # Mark it as in use: the storage GC leaves recently touched matches alone
+                    os.utime(existing)
+                    return key, self.rows(key), False
+                # Claimed by an upload of the same payload that didn't finish writing it
+            elif not self._claim(key, digest) and self.stored_digest(key) != digest:
+                continue
+            return key, self._write(key, match), True
+        # Only reachable with a SHA-256 collision on the content key
+        raise ValueError("Match payload conflicts with every store key")
+
+    def _write(self, key: str, match: Dict[str, Any]) -> Optional[Dict]:
+        from match_table import MatchTableBuilder
+
+        raw_path, rows_path = self._paths(key)
+        rows = MatchTableBuilder.match_rows(match)
+        if rows is not None:
+            _write_atomic(rows_path, self._encode_rows(rows))
+        _write_atomic(raw_path, self.codec.compress(json.dumps(match, separators=(",", ":")).encode("utf-8")))
+        return rows
+
+    def recompress(self, key: str) -> int:
+        """
+        Rewrite a stored match with the current dictionary (plain payloads are
+        compressed and removed). Returns the change in bytes on disk.
+        """
+        path = self._raw_path(key)
+        if path is None:
+            return 0
+        before = path.stat().st_size
+        raw_path, _ = self._paths(key)
+        _write_atomic(raw_path, self.codec.compress(self.get_bytes(key)))
+        if path != raw_path:
+            path.unlink()
+        return raw_path.stat().st_size - before
+
+    def files(self, key: str) -> List[Path]:
+        """Every file stored for a key (payload, digest, derived rows, timeline) that exists"""
+        raw_path, rows_path = self._paths(key)
+        candidates = (
+            raw_path, raw_path.with_name(f"{key}.json"), self._digest_path(key), rows_path, self._timeline_path(key)
+        )
+        return [path for path in candidates if path.exists()]
+
+    def size(self, key: str) -> int:
+        """Bytes on disk used by a key"""
+        return sum(path.stat().st_size for path in self.files(key))
+
+    def delete(self, key: str) -> int:
+        """Remove everything stored for a key. Returns the bytes freed."""
+        freed = 0
+        for path in self.files(key):
+            freed += path.stat().st_size
+            path.unlink(missing_ok=True)
+        return freed
+
+    def _timeline_path(self, key: str) -> Path:
+        _, rows_path = self._paths(key)
+        return rows_path.with_name(f"{key}.timeline.npz")
+
+    def put_timeline(self, timeline: Dict[str, Any]) -> Tuple[Optional[str], bool]:
+        """
+        Store the compact arrays of a timeline payload (the raw JSON is not kept).
+        Returns (key, created); key is None if the timeline has no usable matchId or frames.
+        """
+        from timeline import encode_timeline, timeline_arrays, timeline_match_id
+
+        key = timeline_match_id(timeline)
+        if not _SAFE_KEY.match(key):
+            return None, False
+        path = self._timeline_path(key)
+        if path.exists():
+            os.utime(path)
+            return key, False
+
+        arrays = timeline_arrays(timeline)
+        if arrays is None:
+            return None, False
+        _write_atomic(path, encode_timeline(*arrays))
+        return key, True
+
+    def timeline(self, key: str):
+        """(frames, puuids) of a stored timeline, or None"""
+        from timeline import decode_timeline
+
+        try:
+            with open(self._timeline_path(key), "rb") as f:
+                return decode_timeline(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def get_bytes(self, key: str) -> bytes:
+        """Serialized match payload (decompressed)"""
+        path = self._raw_path(key)
+        if path is None:
+            raise FileNotFoundError(f"Match {key} is not in the store")
+        with open(path, "rb") as f:
+            if path.suffix != ".zst":
+                return f.read()
+            with self.codec.reader(f) as reader:
+                return reader.read()
+
+    def get(self, key: str) -> Dict[str, Any]:
+        """Raw match payload"""
+        path = self._raw_path(key)
+        if path is None:
+            raise FileNotFoundError(f"Match {key} is not in the store")
+        with open(path, "rb") as f:
+            if path.suffix != ".zst":
+                return json.load(f)
+            # Decoded straight from the decompressing stream
+            with self.codec.reader(f) as reader:
+                return json.load(reader)
+
+    def rows(self, key: str) -> Optional[Dict]:
+        """Derived rows of a match (recomputed from the raw match if missing or stale)"""
+        from match_table import ARTIFACT_VERSION, MatchTableBuilder
+
+        _, rows_path = self._paths(key)
+        try:
+            with open(rows_path, "rb") as f:
+                stored = json.loads(f.read())
+            if stored.get("version") == ARTIFACT_VERSION:
+                return stored["rows"]
+        except (OSError, ValueError):
+            pass
+
+        rows = MatchTableBuilder.match_rows(self.get(key))
+        if rows is not None:
+            _write_atomic(rows_path, self._encode_rows(rows))
+        return rows
+
+    @staticmethod
+    def _encode_rows(rows: Dict) -> bytes:
+        from match_table import ARTIFACT_VERSION
+        return json.dumps({"version": ARTIFACT_VERSION, "rows": rows}, separators=(",", ":")).encode("utf-8")
+
+
+# Global store instance
+match_store = MatchStore(MATCH_STORE_DIR)
+
+
+# ==================== UPLOAD MANIFESTS ====================
+
+def write_manifest(path: Path, match_refs: List[str], timeline_refs: Optional[List[str]] = None) -> bytes:
+    """Write an upload as a list of match (and timeline) references. Returns the bytes written."""
+    manifest = {"format": MANIFEST_FORMAT, "version": MANIFEST_VERSION, "match_refs": list(match_refs)}
+    if timeline_refs:
+        manifest["timeline_refs"] = list(timeline_refs)
+    data = json.dumps(manifest, separators=(",", ":")).encode("utf-8")
+    _write_atomic(Path(path), data)
+    return data
+
+
+def read_manifest(path: Path, refs: str = "match_refs") -> Optional[List[str]]:
+    """Match (or timeline) references of an upload, or None if it is a plain JSON file"""
+    with open(path, "rb") as f:
+        if f.read(len(_MANIFEST_PREFIX)) != _MANIFEST_PREFIX:
+            return None
+        f.seek(0)
+        return json.loads(f.read()).get(refs, [])
+
+
+def _artifact_timelines_path(path: Path) -> Path:
+    from match_table import artifact_dir
+    return artifact_dir(path) / "timelines.npz"
+
+
+def _save_artifact_timelines(path: Path, timelines: Dict[str, Any]):
+    """Keep the timelines of a plain JSON upload next to its table, so analyses never parse it again"""
+    from timeline import encode_timelines
+    _write_atomic(_artifact_timelines_path(path), encode_timelines(timelines))
+
+
+def _load_artifact_timelines(path: Path) -> Optional[Dict[str, Any]]:
+    """Timelines saved by _save_artifact_timelines, or None if missing or older than the upload"""
+    from timeline import decode_timelines
+
+    stored_path = _artifact_timelines_path(path)
+    try:
+        if stored_path.stat().st_mtime_ns < Path(path).stat().st_mtime_ns:
+            return None
+        with open(stored_path, "rb") as f:
+            return decode_timelines(f.read())
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def load_timelines(path: Path) -> Dict[str, Any]:
+    """matchId -> (frames, puuids) of the timelines of an upload (manifest or plain JSON file)"""
+    refs = read_manifest(path, "timeline_refs")
+    if refs is not None:
+        timelines = {}
+        for key in refs:
+            stored = match_store.timeline(key)
+            if stored is not None:
+                timelines[key] = stored
+        return timelines
+
+    # Plain JSON: extracted with the table (load_match_table), parsed here only for older artifacts
+    timelines = _load_artifact_timelines(path)
+    if timelines is not None:
+        return timelines
+
+    from timeline import timelines_by_match
+    with open(path, "r", encoding="utf-8") as f:
+        timelines = timelines_by_match(json.load(f).get("timelines"))
+    try:
+        _save_artifact_timelines(path, timelines)
+    except OSError:
+        pass
+    return timelines
+
+
+def load_matches(path: Path) -> List[Dict[str, Any]]:
+    """Raw matches of an upload, whether it is a manifest or a plain Riot matches file"""
+    refs = read_manifest(path)
+    if refs is not None:
+        return [match_store.get(key) for key in refs]
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("matches", [])
+
+
+def load_match_table(path: Path):
+    """
+    Columnar table of an upload: its artifact if it has one, else built from
+    the store's derived rows (manifests) or the JSON (plain files, whose
+    timelines are kept with it), and persisted as an artifact for next time.
+    """
+    from match_table import MatchTable, MatchTableBuilder, load_artifact, save_artifact
+
+    path = Path(path)
+    table = load_artifact(path)
+    if table is not None:
+        return table
+
+    refs = read_manifest(path)
+    timelines = None
+    if refs is not None:
+        builder = MatchTableBuilder()
+        for key in refs:
+            rows = match_store.rows(key)
+            if rows is not None:
+                builder.add_rows(rows)
+        table = builder.build()
+    else:
+        # One parse for the matches and the timelines of a plain JSON file
+        from timeline import timelines_by_match
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        table = MatchTable.from_matches(data.get("matches", []))
+        timelines = timelines_by_match(data.get("timelines"))
+
+    try:
+        save_artifact(table, path)
+        if timelines is not None:
+            _save_artifact_timelines(path, timelines)
+    except OSError:
+        pass
+    return table
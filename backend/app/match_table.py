@@ -0,0 +1,491 @@
+"""
+Columnar participant table - Riot match-v5 data loaded once into NumPy arrays
+
+One row per participant-game. Numeric stats are stored as one array per stat,
+strings (Riot IDs, champions, positions...) are dictionary-encoded as integer
+codes + a vocabulary. Per-player, per-champion and per-team aggregates are
+computed as grouped reductions over those arrays instead of nested loops.
+"""
+import copy
+import json
+import os
+import shutil
+import numpy as np
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Iterable, Optional
+
+# Output stat name -> participant fields summed into it
+STAT_FIELDS = OrderedDict([
+    ("kills", ("kills",)),
+    ("deaths", ("deaths",)),
+    ("assists", ("assists",)),
+    ("damage", ("totalDamageDealtToChampions",)),
+    ("gold", ("goldEarned",)),
+    ("cs", ("totalMinionsKilled", "neutralMinionsKilled")),
+    ("vision_score", ("visionScore",)),
+    ("wards_placed", ("wardsPlaced",)),
+    ("wards_destroyed", ("wardsKilled",)),
+    ("damage_to_objectives", ("damageDealtToObjectives",)),
+    ("damage_to_buildings", ("damageDealtToBuildings",)),
+])
+
+# Every raw participant field read while loading
+RAW_FIELDS = tuple(dict.fromkeys(f for fields in STAT_FIELDS.values() for f in fields))
+
+# Per-champion stats kept for each player
+CHAMPION_STATS = ("kills", "deaths", "assists", "damage")
+
+# Dictionary-encoded string columns
+STRING_COLUMNS = ("riot_id", "puuid", "summoner_name", "position", "champion")
+
+
+def riot_id_match_key(riot_id: str) -> str:
+    """riot_id_key() of a "name#tag" string: the spelling in the matches may differ from the profile's"""
+    from services.riot_api import riot_id_key
+    game_name, _, tag_line = riot_id.partition("#")
+    return riot_id_key(game_name, tag_line)
+
+# Positions with a lane opponent on the other team
+LANE_POSITIONS = ("TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY")
+
+# Bump whenever the on-disk layout or the columns change (stale artifacts are rebuilt)
+ARTIFACT_VERSION = 1
+
+
+class MatchTableBuilder:
+    """Accumulates participant rows match by match, then freezes them into a MatchTable"""
+
+    def __init__(self):
+        # String column -> {value: code}; dicts keep insertion order so codes index the keys
+        self.vocabs = {name: {} for name in STRING_COLUMNS}
+        self.string_codes = {name: [] for name in STRING_COLUMNS}
+        self.raw_stats = []
+        self.match_index = []
+        self.team_id = []
+        self.win = []
+        self.match_ids = []
+        self.game_creation = []
+        self.game_duration = []
+
+    @staticmethod
+    def match_rows(match: Dict) -> Optional[Dict]:
+        """
+        Everything the table keeps of one match, as compact JSON-compatible
+        data (per participant: riot_id, puuid, summoner_name, position,
+        champion, team_id, win, raw stats). None if the match has no participants.
+        """
+        info = match.get("info") if isinstance(match, dict) else None
+        if not info or "participants" not in info:
+            return None
+
+        participants = []
+        for participant in info["participants"]:
+            get = participant.get
+            riot_game_name = get("riotIdGameName", "")
+            riot_tagline = get("riotIdTagline", "")
+            participants.append([
+                f"{riot_game_name}#{riot_tagline}" if riot_game_name and riot_tagline else "",
+                get("puuid", ""),
+                get("summonerName", riot_game_name or "Unknown"),
+                get("teamPosition", get("individualPosition", "UNKNOWN")),
+                get("championName", "Unknown"),
+                int(get("teamId", 0) or 0),
+                bool(get("win", False)),
+                [get(f, 0) or 0 for f in RAW_FIELDS],
+            ])
+
+        return {
+            "match_id": str(match.get("metadata", {}).get("matchId", "")),
+            "game_creation": int(info.get("gameCreation", 0) or 0),
+            "game_duration": float(info.get("gameDuration", 0) or 0),
+            "participants": participants,
+        }
+
+    def add_rows(self, rows: Dict):
+        """Append one match given as match_rows() output"""
+        index = len(self.match_ids)
+        self.match_ids.append(rows["match_id"])
+        self.game_creation.append(rows["game_creation"])
+        self.game_duration.append(rows["game_duration"])
+
+        riot_ids, riot_codes = self.vocabs["riot_id"], self.string_codes["riot_id"]
+        puuids, puuid_codes = self.vocabs["puuid"], self.string_codes["puuid"]
+        names, name_codes = self.vocabs["summoner_name"], self.string_codes["summoner_name"]
+        positions, position_codes = self.vocabs["position"], self.string_codes["position"]
+        champions, champion_codes = self.vocabs["champion"], self.string_codes["champion"]
+
+        for riot_id, puuid, name, position, champion, team_id, win, raw_stats in rows["participants"]:
+            riot_codes.append(riot_ids.setdefault(riot_id, len(riot_ids)))
+            puuid_codes.append(puuids.setdefault(puuid, len(puuids)))
+            name_codes.append(names.setdefault(name, len(names)))
+            position_codes.append(positions.setdefault(position, len(positions)))
+            champion_codes.append(champions.setdefault(champion, len(champions)))
+
+            self.raw_stats.append(raw_stats)
+            self.match_index.append(index)
+            self.team_id.append(team_id)
+            self.win.append(win)
+
+    def add_match(self, match: Dict) -> bool:
+        """Append all participants of one match. Returns False if the match has no participants."""
+        rows = self.match_rows(match)
+        if rows is None:
+            return False
+        self.add_rows(rows)
+        return True
+
+    def build(self) -> "MatchTable":
+        columns = {
+            "match_index": np.asarray(self.match_index, dtype=np.int32),
+            "team_id": np.asarray(self.team_id, dtype=np.int32),
+            "win": np.asarray(self.win, dtype=bool),
+        }
+        raw = np.asarray(self.raw_stats, dtype=np.int64).reshape(-1, len(RAW_FIELDS))
+        for stat_name, fields in STAT_FIELDS.items():
+            columns[stat_name] = raw[:, [RAW_FIELDS.index(f) for f in fields]].sum(axis=1)
+        for name, values in self.string_codes.items():
+            columns[name] = np.asarray(values, dtype=np.int32)
+
+        matches = {
+            "match_id": list(self.match_ids),
+            "game_creation": np.asarray(self.game_creation, dtype=np.int64),
+            "game_duration": np.asarray(self.game_duration, dtype=np.float64),
+        }
+        vocabs = {name: list(vocab) for name, vocab in self.vocabs.items()}
+        return MatchTable(columns, vocabs, matches)
+
+
+class MatchTable:
+    """Participant-game rows as NumPy columns"""
+
+    def __init__(self, columns: Dict[str, np.ndarray], vocabs: Dict[str, List[str]], matches: Dict):
+        self.columns = columns
+        self.vocabs = vocabs
+        self.matches = matches
+
+    @classmethod
+    def from_matches(cls, matches: Iterable[Dict]) -> "MatchTable":
+        builder = MatchTableBuilder()
+        for match in matches:
+            builder.add_match(match)
+        return builder.build()
+
+    def __len__(self) -> int:
+        return len(self.columns["match_index"])
+
+    @property
+    def match_count(self) -> int:
+        return len(self.matches["match_id"])
+
+    # ==================== ON-DISK ARTIFACT ====================
+
+    def save(self, directory: Path, source: Optional[Path] = None):
+        """
+        Write the table as one .npy file per column plus meta.json.
+
+        The directory is written under a temporary name and renamed into
+        place, so readers never see a partial artifact.
+        """
+        directory = Path(directory)
+        tmp_dir = directory.with_name(f"{directory.name}.tmp-{os.getpid()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        try:
+            for name, values in self.columns.items():
+                np.save(tmp_dir / f"{name}.npy", np.ascontiguousarray(values))
+            np.save(tmp_dir / "game_creation.npy", self.matches["game_creation"])
+            np.save(tmp_dir / "game_duration.npy", self.matches["game_duration"])
+
+            meta = {
+                "version": ARTIFACT_VERSION,
+                "rows": len(self),
+                "columns": list(self.columns),
+                "vocabs": self.vocabs,
+                "match_ids": list(self.matches["match_id"]),
+            }
+            if source is not None:
+                stat = Path(source).stat()
+                meta["source_size"] = stat.st_size
+                meta["source_mtime_ns"] = stat.st_mtime_ns
+            with open(tmp_dir / "meta.json", "w", encoding="utf-8") as f:
+                json.dump(meta, f, separators=(",", ":"))
+
+            shutil.rmtree(directory, ignore_errors=True)
+            os.rename(tmp_dir, directory)
+        except OSError:
+            # Another process may have won the race; its artifact is just as good
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not (directory / "meta.json").exists():
+                raise
+
+    @classmethod
+    def load(cls, directory: Path, source: Optional[Path] = None) -> Optional["MatchTable"]:
+        """
+        Memory-map an artifact written by save(). Returns None if it is missing,
+        from another ARTIFACT_VERSION or older than `source`.
+        """
+        directory = Path(directory)
+        try:
+            with open(directory / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if meta.get("version") != ARTIFACT_VERSION:
+            return None
+        if source is not None:
+            stat = Path(source).stat()
+            if (meta.get("source_size"), meta.get("source_mtime_ns")) != (stat.st_size, stat.st_mtime_ns):
+                return None
+
+        try:
+            columns = {name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in meta["columns"]}
+            matches = {
+                "match_id": meta["match_ids"],
+                "game_creation": np.load(directory / "game_creation.npy", mmap_mode="r"),
+                "game_duration": np.load(directory / "game_duration.npy", mmap_mode="r"),
+            }
+        except (OSError, ValueError):
+            return None
+        return cls(columns, meta["vocabs"], matches)
+
+    def take_matches(self, keep: np.ndarray) -> "MatchTable":
+        """Sub-table with only the matches where `keep` (one bool per match) is set"""
+        keep = np.asarray(keep, dtype=bool)
+        new_index = np.cumsum(keep) - 1
+        rows = keep[self.columns["match_index"]]
+
+        columns = {name: np.asarray(values)[rows] for name, values in self.columns.items()}
+        columns["match_index"] = new_index[columns["match_index"]].astype(np.int32)
+        matches = {
+            "match_id": [m for m, k in zip(self.matches["match_id"], keep.tolist()) if k],
+            "game_creation": np.asarray(self.matches["game_creation"])[keep],
+            "game_duration": np.asarray(self.matches["game_duration"])[keep],
+        }
+        return MatchTable(columns, self.vocabs, matches)
+
+    def strings(self, name: str) -> np.ndarray:
+        """Vocabulary of a string column as an object array (index with the column codes)"""
+        return np.asarray(self.vocabs[name], dtype=object)
+
+    # ==================== GROUPED REDUCTIONS ====================
+
+    def team_kills(self) -> np.ndarray:
+        """Kills of each row's team in that game (per-team aggregate broadcast back to rows)"""
+        side_key = (self.columns["match_index"].astype(np.int64) << 32) | (
+            self.columns["team_id"].astype(np.int64) & 0xFFFFFFFF)
+        _, side_groups = np.unique(side_key, return_inverse=True)
+        kills_per_side = np.bincount(side_groups, weights=self.columns["kills"])
+        return kills_per_side[side_groups].astype(np.int64)
+
+    def game_minutes(self) -> np.ndarray:
+        """Game duration in minutes for each row"""
+        return (self.matches["game_duration"] / 60.0)[self.columns["match_index"]]
+
+    def lane_opponents(self) -> np.ndarray:
+        """Row of each row's lane opponent (same game and position, other team), -1 if none"""
+        positions = self.strings("position")
+        lane = np.fromiter((p in LANE_POSITIONS for p in positions), dtype=bool, count=len(positions))
+        position_codes = np.asarray(self.columns["position"])
+        match_index = np.asarray(self.columns["match_index"]).astype(np.int64)
+        team_id = np.asarray(self.columns["team_id"])
+
+        opponent = np.full(len(self), -1, dtype=np.int64)
+        rows = np.flatnonzero(lane[position_codes])
+        if len(rows) < 2:
+            return opponent
+
+        # Sorted by (game, position, team): opponents are adjacent pairs with different teams
+        order = rows[np.lexsort((team_id[rows], position_codes[rows], match_index[rows]))]
+        a, b = order[:-1], order[1:]
+        paired = (match_index[a] == match_index[b]) & (position_codes[a] == position_codes[b]) & (team_id[a] != team_id[b])
+        # Exactly two players in the lane (ignore duplicate positions)
+        lane_key = match_index[order] * len(positions) + position_codes[order]
+        _, lane_size = np.unique(lane_key, return_counts=True)
+        sizes = np.repeat(lane_size, lane_size)
+        paired &= (sizes[:-1] == 2)
+        opponent[a[paired]] = b[paired]
+        opponent[b[paired]] = a[paired]
+        return opponent
+
+    def player_groups(self, team_riot_ids: Optional[List[str]] = None):
+        """
+        Assign every row to a player group.
+
+        Team members are keyed by riot_id_key of their RIOT ID (matched
+        case-insensitively, like uploads are), opponents by PUUID. Rows
+        without a usable key are dropped.
+
+        Returns (rows, groups, keys, is_team) where `rows` are the kept row
+        indices, `groups` the group of each kept row (groups numbered by first
+        appearance), `keys` the player key of each group and `is_team` the
+        per-row team flag.
+        """
+        riot_vocab = self.strings("riot_id")
+        puuid_vocab = self.strings("puuid")
+        riot_codes = self.columns["riot_id"]
+        puuid_codes = self.columns["puuid"]
+
+        vocab_keys = [riot_id_match_key(r) if r else "" for r in riot_vocab]
+        if team_riot_ids:
+            wanted = {riot_id_match_key(r) for r in team_riot_ids if r}
+            team_vocab = np.fromiter((k in wanted for k in vocab_keys), dtype=bool, count=len(riot_vocab))
+        else:
+            team_vocab = np.ones(len(riot_vocab), dtype=bool)
+        is_team = team_vocab[riot_codes]
+        # Spellings of one Riot ID are one player: code of its first spelling
+        first_spelling = {}
+        canonical = np.fromiter(
+            (first_spelling.setdefault(k, i) for i, k in enumerate(vocab_keys)), dtype=np.int64, count=len(riot_vocab)
+        )
+
+        riot_empty = np.fromiter((not r for r in riot_vocab), dtype=bool, count=len(riot_vocab))
+        puuid_empty = np.fromiter((not p for p in puuid_vocab), dtype=bool, count=len(puuid_vocab))
+        valid = np.where(is_team, ~riot_empty[riot_codes], ~puuid_empty[puuid_codes])
+
+        key_codes = np.where(is_team, canonical[riot_codes], len(riot_vocab) + puuid_codes.astype(np.int64))
+        rows = np.flatnonzero(valid)
+        unique_keys, groups = np.unique(key_codes[rows], return_inverse=True)
+
+        # Renumber groups by first appearance so output order matches input order
+        first_seen = np.full(len(unique_keys), len(self), dtype=np.int64)
+        np.minimum.at(first_seen, groups, rows)
+        order = np.argsort(first_seen, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        groups = rank[groups]
+        unique_keys = unique_keys[order]
+
+        keys = [
+            vocab_keys[k] if k < len(riot_vocab) else puuid_vocab[k - len(riot_vocab)]
+            for k in unique_keys.tolist()
+        ]
+        return rows, groups, keys, is_team
+
+    def player_state(self, team_riot_ids: Optional[List[str]] = None) -> "OrderedDict[str, Dict]":
+        """
+        Per-player running aggregates (games, totals, per-champion stats...)
+        keyed by player key, in first-appearance order.
+
+        The state is plain JSON-compatible data so it can be stored and merged
+        with the state of newer matches.
+        """
+        rows, groups, keys, is_team = self.player_groups(team_riot_ids)
+        n_groups = len(keys)
+        state = OrderedDict()
+        if n_groups == 0:
+            return state
+
+        def group_sum(values):
+            return np.bincount(groups, weights=values[rows], minlength=n_groups)
+
+        win = self.columns["win"].astype(np.int64)
+        games = np.bincount(groups, minlength=n_groups)
+        wins = group_sum(win).astype(np.int64)
+        totals = {name: group_sum(self.columns[name]).astype(np.int64) for name in STAT_FIELDS}
+        team_kills = group_sum(self.team_kills()).astype(np.int64)
+        game_time = group_sum(self.game_minutes())
+
+        # Most recent row of each player provides the display info
+        last_row = np.full(n_groups, -1, dtype=np.int64)
+        np.maximum.at(last_row, groups, rows)
+
+        riot_vocab = self.strings("riot_id")
+        name_vocab = self.strings("summoner_name")
+        position_vocab = self.strings("position")
+        champion_vocab = self.strings("champion")
+
+        # Per (player, champion) reductions
+        champ_codes = self.columns["champion"][rows].astype(np.int64)
+        pair_key = groups.astype(np.int64) * max(len(champion_vocab), 1) + champ_codes
+        unique_pairs, pair_groups = np.unique(pair_key, return_inverse=True)
+        n_pairs = len(unique_pairs)
+        pair_first = np.full(n_pairs, len(self), dtype=np.int64)
+        np.minimum.at(pair_first, pair_groups, rows)
+        pair_games = np.bincount(pair_groups, minlength=n_pairs)
+        pair_stats = {"wins": np.bincount(pair_groups, weights=win[rows], minlength=n_pairs).astype(np.int64)}
+        for name in CHAMPION_STATS:
+            pair_stats[name] = np.bincount(
+                pair_groups, weights=self.columns[name][rows], minlength=n_pairs).astype(np.int64)
+        pair_player = unique_pairs // max(len(champion_vocab), 1)
+        pair_champion = unique_pairs % max(len(champion_vocab), 1)
+        # Champions in first-played order within each player
+        pair_order = np.lexsort((pair_first, pair_player))
+
+        for g, key in enumerate(keys):
+            last = last_row[g]
+            state[key] = {
+                "games": int(games[g]),
+                "wins": int(wins[g]),
+                "losses": int(games[g] - wins[g]),
+                "totals": {name: int(totals[name][g]) for name in STAT_FIELDS},
+                "champions": OrderedDict(),
+                "summoner_name": name_vocab[self.columns["summoner_name"][last]],
+                "riot_id": riot_vocab[self.columns["riot_id"][last]],
+                "position": position_vocab[self.columns["position"][last]],
+                "total_game_time": float(game_time[g]),
+                "total_team_kills": int(team_kills[g]),
+                "is_team_member": bool(is_team[last]),
+            }
+
+        for p in pair_order.tolist():
+            champions = state[keys[pair_player[p]]]["champions"]
+            champ = {"games": int(pair_games[p])}
+            champ.update({name: int(values[p]) for name, values in pair_stats.items()})
+            champions[champion_vocab[pair_champion[p]]] = champ
+
+        return state
+
+
+def merge_player_state(base: Dict[str, Dict], newer: Dict[str, Dict]) -> "OrderedDict[str, Dict]":
+    """
+    Combine two player states as if their matches had been loaded in one
+    table, `newer` after `base`. Neither input is modified.
+    """
+    merged = OrderedDict((key, copy.deepcopy(player)) for key, player in base.items())
+
+    for key, player in newer.items():
+        current = merged.get(key)
+        if current is None:
+            merged[key] = copy.deepcopy(player)
+            continue
+
+        for field in ("games", "wins", "losses", "total_game_time", "total_team_kills"):
+            current[field] += player[field]
+        for name, value in player["totals"].items():
+            current["totals"][name] = current["totals"].get(name, 0) + value
+        for champion, stats in player["champions"].items():
+            champ = current["champions"].setdefault(champion, {})
+            for name, value in stats.items():
+                champ[name] = champ.get(name, 0) + value
+
+        # Display info comes from the most recent game
+        for field in ("summoner_name", "riot_id", "position", "is_team_member"):
+            current[field] = player[field]
+
+    return merged
+
+
+# ==================== UPLOAD ARTIFACTS ====================
+
+def artifact_dir(data_file: Path) -> Path:
+    """Columnar artifact stored next to an upload: <file>.cols/"""
+    data_file = Path(data_file)
+    return data_file.with_name(data_file.name + ".cols")
+
+
+def save_artifact(table: MatchTable, data_file: Path):
+    """Persist the table of an upload next to it"""
+    table.save(artifact_dir(data_file), source=data_file)
+
+
+def load_artifact(data_file: Path) -> Optional[MatchTable]:
+    """Columnar table of an upload, or None if it has not been converted (or is stale)"""
+    return MatchTable.load(artifact_dir(data_file), source=data_file)
+
+
+def remove_artifact(data_file: Path):
+    """Delete the artifact of an upload (when the upload itself is deleted)"""
+    shutil.rmtree(artifact_dir(data_file), ignore_errors=True)
@@ -0,0 +1,404 @@
+"""
+Role-aware percentiles - where a player stands among every player on the platform
+
+The analyses report per-player figures over several games (KDA, DPM, GPM,
+CSM and KP are ratios of the player's totals), so the distributions are
+made of the same unit: for each position (TOP / JUNGLE / MIDDLE / BOTTOM /
+UTILITY) the database keeps every player's totals over all counted matches
+(PercentilePlayer), and each radar metric gets a fixed-bin histogram of the
+players with at least PERCENTILE_MIN_GAMES games there.
+
+The matches of an upload are counted once it is accepted, each match once
+(PercentileMatch), in one transaction, so every server process and
+rebuild_percentiles.py add to the same totals. Histograms are rebuilt from
+them at most every PERCENTILE_REFRESH_SECONDS per process, so a percentile
+lookup is one bin index + one prefix-sum read.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, PercentileMatch as DBPercentileMatch, PercentilePlayer as DBPercentilePlayer
+
+POSITIONS = ("TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY")
+
+# Metric -> (histogram range, overview row field)
+PERCENTILE_METRICS = OrderedDict([
+    ("kda", ((0.0, 20.0), "kda")),
+    ("dpm", ((0.0, 2000.0), "per_min_damage")),
+    ("gpm", ((0.0, 1000.0), "per_min_gold")),
+    ("csm", ((0.0, 15.0), "per_min_cs")),
+    ("kp", ((0.0, 100.0), "avg_kill_participation")),
+])
+
+HISTOGRAM_BINS = 400
+
+# Players need this many games in a position to enter its distribution (and to be ranked)
+PERCENTILE_MIN_GAMES = int(os.getenv("PERCENTILE_MIN_GAMES", "5"))
+# Below this many players in a position, percentiles are not reported
+PERCENTILE_MIN_SAMPLES = int(os.getenv("PERCENTILE_MIN_SAMPLES", "100"))
+# How long a process serves its histograms before reloading them from the database
+PERCENTILE_REFRESH_SECONDS = float(os.getenv("PERCENTILE_REFRESH_SECONDS", "60"))
+
+# Totals kept per player and position (PercentilePlayer columns)
+TOTAL_FIELDS = ("kills", "deaths", "assists", "damage", "gold", "cs", "minutes", "team_kills")
+
+_COMMIT_ATTEMPTS = 3
+
+
+def player_metrics(kills: int, deaths: int, assists: int, damage: int, gold: int, cs: int,
+                   minutes: float, team_kills: int, games: int = 1) -> Dict[str, float]:
+    """Radar metrics of a player's totals (same formulas as the analytics overview)"""
+    minutes = minutes if minutes > 0 else float(games)
+    return {
+        "kda": (kills + assists) / deaths if deaths > 0 else float(kills + assists),
+        "dpm": damage / minutes,
+        "gpm": gold / minutes,
+        "csm": cs / minutes,
+        "kp": (kills + assists) / team_kills * 100 if team_kills > 0 else 0.0,
+    }
+
+
+def match_totals(rows: Dict) -> Dict[Tuple[str, str], List[float]]:
+    """(player key, position) -> TOTAL_FIELDS of one match given as MatchTableBuilder.match_rows() output"""
+    from match_table import RAW_FIELDS
+
+    field = {name: RAW_FIELDS.index(name) for name in (
+        "kills", "deaths", "assists", "totalDamageDealtToChampions", "goldEarned",
+        "totalMinionsKilled", "neutralMinionsKilled")}
+    minutes = rows["game_duration"] / 60.0
+
+    team_kills: Dict[int, int] = {}
+    for participant in rows["participants"]:
+        team_id, stats = participant[5], participant[7]
+        team_kills[team_id] = team_kills.get(team_id, 0) + stats[field["kills"]]
+
+    totals = {}
+    for riot_id, puuid, _, position, _, team_id, _, stats in rows["participants"]:
+        player_key = puuid or riot_id
+        if position not in POSITIONS or not player_key:
+            continue
+        totals[(player_key, position)] = [
+            stats[field["kills"]], stats[field["deaths"]], stats[field["assists"]],
+            stats[field["totalDamageDealtToChampions"]], stats[field["goldEarned"]],
+            stats[field["totalMinionsKilled"]] + stats[field["neutralMinionsKilled"]],
+            minutes, team_kills[team_id],
+        ]
+    return totals
+
+
+def _accumulate(rows: Dict, totals: Dict[Tuple[str, str], List[float]], games: Dict[Tuple[str, str], int]):
+    """Add the players of one match (match_rows() output) to running totals and game counts"""
+    for player, values in match_totals(rows).items():
+        games[player] = games.get(player, 0) + 1
+        current = totals.setdefault(player, [0] * len(TOTAL_FIELDS))
+        for i, value in enumerate(values):
+            current[i] += value
+
+
+def _bin(metric: str, value: float) -> int:
+    (low, high), _ = PERCENTILE_METRICS[metric]
+    index = int((value - low) / (high - low) * HISTOGRAM_BINS)
+    return min(max(index, 0), HISTOGRAM_BINS - 1)
+
+
+class PercentileDistributions:
+    """Per-position histograms of player metrics, built from the totals in the database"""
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self._loaded_at: Optional[float] = None
+        self.players = 0
+        self.counts: Dict[str, Dict[str, List[int]]] = {}
+        # position -> metric -> cumulative counts (rebuilt lazily after a reload)
+        self._cumulative: Dict[str, Dict[str, List[int]]] = {}
+
+    def _empty(self):
+        self.players = 0
+        self.counts = {
+            position: {metric: [0] * HISTOGRAM_BINS for metric in PERCENTILE_METRICS}
+            for position in POSITIONS
+        }
+        self._cumulative = {}
+
+    def invalidate(self):
+        """Reload the histograms on next use (after this process counted new matches)"""
+        with self._lock:
+            self._loaded_at = None
+
+    def _ensure_loaded(self):
+        """Build the histograms from the database, again once they are older than PERCENTILE_REFRESH_SECONDS"""
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < PERCENTILE_REFRESH_SECONDS:
+            return
+
+        self._empty()
+        db = self.session_factory()
+        try:
+            players = db.query(
+                DBPercentilePlayer.position, DBPercentilePlayer.games,
+                *(getattr(DBPercentilePlayer, name) for name in TOTAL_FIELDS)
+            ).filter(DBPercentilePlayer.games >= PERCENTILE_MIN_GAMES).all()
+        finally:
+            db.close()
+
+        for position, games, *totals in players:
+            if position not in self.counts:
+                continue
+            for metric, value in player_metrics(*totals, games=games).items():
+                self.counts[position][metric][_bin(metric, value)] += 1
+            self.players += 1
+        self._loaded_at = now
+
+    # ==================== UPDATES ====================
+
+    def _add_matches(self, db: Session, matches: Dict[str, Dict]) -> int:
+        keys = list(matches)
+        counted = set()
+        for start in range(0, len(keys), 500):
+            counted.update(key for (key,) in db.query(DBPercentileMatch.match_key).filter(
+                DBPercentileMatch.match_key.in_(keys[start:start + 500])
+            ).all())
+
+        totals: Dict[Tuple[str, str], List[float]] = {}
+        games: Dict[Tuple[str, str], int] = {}
+        added = 0
+        for key, rows in matches.items():
+            if key in counted:
+                continue
+            db.add(DBPercentileMatch(match_key=key))
+            added += 1
+            _accumulate(rows, totals, games)
+        # Another process counting the same match fails here, before any total moves
+        db.flush()
+
+        for (player_key, position), values in totals.items():
+            # Increments in SQL: concurrent uploads never overwrite each other's totals
+            increments = {
+                getattr(DBPercentilePlayer, name): getattr(DBPercentilePlayer, name) + value
+                for name, value in zip(TOTAL_FIELDS, values)
+            }
+            increments[DBPercentilePlayer.games] = DBPercentilePlayer.games + games[(player_key, position)]
+            updated = db.query(DBPercentilePlayer).filter(
+                DBPercentilePlayer.player_key == player_key,
+                DBPercentilePlayer.position == position
+            ).update(increments, synchronize_session=False)
+            if not updated:
+                db.add(DBPercentilePlayer(
+                    player_key=player_key, position=position, games=games[(player_key, position)],
+                    **dict(zip(TOTAL_FIELDS, values))
+                ))
+        db.commit()
+        return added
+
+    def add_matches(self, matches: Iterable[Tuple[str, Dict]]) -> int:
+        """
+        Count matches given as (store key, MatchTableBuilder.match_rows() output),
+        skipping those already counted, in one transaction. Returns how many were added.
+        """
+        matches = dict(matches)
+        if not matches:
+            return 0
+        db = self.session_factory()
+        try:
+            for attempt in range(_COMMIT_ATTEMPTS):
+                try:
+                    added = self._add_matches(db, matches)
+                    break
+                except (IntegrityError, OperationalError):
+                    # A concurrent upload counted one of these matches (or created a player)
+                    # first, or a rebuild held the database
+                    db.rollback()
+                    if attempt == _COMMIT_ATTEMPTS - 1:
+                        raise
+        finally:
+            db.close()
+        if added:
+            self.invalidate()
+        return added
+
+    def rebuild(self, store) -> int:
+        """
+        Recount everything from the match store. Returns the number of matches.
+
+        The totals are computed in memory, then swapped in with one short
+        transaction: servers keep serving the previous distributions until
+        then, and matches uploads counted meanwhile are merged in (once).
+        """
+        totals: Dict[Tuple[str, str], List[float]] = {}
+        games: Dict[Tuple[str, str], int] = {}
+        counted = set()
+
+        def count(key: str):
+            try:
+                rows = store.rows(key)
+            except (OSError, ValueError):
+                # Collected by the storage GC meanwhile
+                return
+            if rows is not None:
+                counted.add(key)
+                _accumulate(rows, totals, games)
+
+        for key in store.keys():
+            count(key)
+
+        db = self.session_factory()
+        try:
+            # Hold off uploads until the swap is committed: none counts a match between the merge and the swap
+            if db.get_bind().dialect.name == "postgresql":
+                db.execute(text("LOCK TABLE percentile_matches, percentile_players IN EXCLUSIVE MODE"))
+            db.query(DBPercentilePlayer).delete()
+            for (key,) in db.query(DBPercentileMatch.match_key).all():
+                if key not in counted:
+                    # Stored and counted by an upload after the recount listed the store
+                    count(key)
+            db.query(DBPercentileMatch).delete()
+
+            keys = list(counted)
+            for start in range(0, len(keys), 500):
+                db.execute(insert(DBPercentileMatch), [{"match_key": key} for key in keys[start:start + 500]])
+            players = [
+                {"player_key": player_key, "position": position, "games": games[(player_key, position)],
+                 **dict(zip(TOTAL_FIELDS, values))}
+                for (player_key, position), values in totals.items()
+            ]
+            for start in range(0, len(players), 500):
+                db.execute(insert(DBPercentilePlayer), players[start:start + 500])
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        self.invalidate()
+        return len(counted)
+
+    # ==================== LOOKUPS ====================
+
+    def _cumulative_counts(self, position: str, metric: str) -> List[int]:
+        by_metric = self._cumulative.setdefault(position, {})
+        cumulative = by_metric.get(metric)
+        if cumulative is None:
+            cumulative, total = [], 0
+            for count in self.counts[position][metric]:
+                total += count
+                cumulative.append(total)
+            by_metric[metric] = cumulative
+        return cumulative
+
+    def percentile(self, position: str, metric: str, value: Optional[float]) -> Optional[float]:
+        """Share of players in `position` with a lower `metric` (0-100), None without enough data"""
+        if value is None or position not in POSITIONS or metric not in PERCENTILE_METRICS:
+            return None
+        with self._lock:
+            self._ensure_loaded()
+            cumulative = self._cumulative_counts(position, metric)
+        total = cumulative[-1]
+        if total < PERCENTILE_MIN_SAMPLES:
+            return None
+        index = _bin(metric, float(value))
+        below = cumulative[index - 1] if index else 0
+        return round((below + (cumulative[index] - below) / 2) / total * 100, 1)
+
+    def player_percentiles(self, position: str, values: Dict[str, Optional[float]],
+                           games: Optional[int] = None) -> Dict[str, Optional[float]]:
+        """
+        Percentile of every radar metric for one player's averages. None for
+        players with fewer than PERCENTILE_MIN_GAMES games (when known).
+        """
+        if games is not None and games < PERCENTILE_MIN_GAMES:
+            return {metric: None for metric in PERCENTILE_METRICS}
+        return {metric: self.percentile(position, metric, values.get(metric)) for metric in PERCENTILE_METRICS}
+
+    def summary(self) -> Dict[str, Any]:
+        """Sample sizes and quartiles of every distribution"""
+        db = self.session_factory()
+        try:
+            matches = db.query(func.count(DBPercentileMatch.match_key)).scalar() or 0
+        finally:
+            db.close()
+
+        with self._lock:
+            self._ensure_loaded()
+            result = {
+                "matches": matches,
+                "players": self.players,
+                "min_games": PERCENTILE_MIN_GAMES,
+                "min_samples": PERCENTILE_MIN_SAMPLES,
+                "positions": {},
+            }
+            for position in POSITIONS:
+                metrics = {}
+                for metric, ((low, high), _) in PERCENTILE_METRICS.items():
+                    cumulative = self._cumulative_counts(position, metric)
+                    total = cumulative[-1]
+                    quantiles = {}
+                    for q in (10, 25, 50, 75, 90):
+                        if not total:
+                            quantiles[f"p{q}"] = None
+                            continue
+                        index = next(i for i, c in enumerate(cumulative) if c * 100 >= total * q)
+                        quantiles[f"p{q}"] = round(low + (index + 0.5) * (high - low) / HISTOGRAM_BINS, 2)
+                    metrics[metric] = {"samples": total, **quantiles}
+                result["positions"][position] = metrics
+        return result
+
+
+# Global distributions instance
+percentile_distributions = PercentileDistributions()
+
+
+# ==================== ANNOTATIONS ====================
+# Results are never annotated in place: they can be cached (analysis cache,
+# results store), and percentiles move as matches are ingested. Only the
+# containers on the way to the annotated rows are copied. Lookups may reload
+# the histograms from the database: async routes call these in a thread.
+
+def annotate_players(players: Optional[List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+    """Copies of overview player rows with a `percentiles` dict"""
+    if not isinstance(players, list):
+        return players
+    annotated = []
+    for player in players:
+        values = {metric: player.get(field) for metric, (_, field) in PERCENTILE_METRICS.items()}
+        percentiles = percentile_distributions.player_percentiles(
+            player.get("position"), values, player.get("games_played")
+        )
+        annotated.append({**player, "percentiles": percentiles})
+    return annotated
+
+
+def annotate_radar(radar: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of radar series with per-player `percentiles` (aligned with `metrics`)"""
+    players = []
+    for player in radar.get("players", ()):
+        values = dict(zip(PERCENTILE_METRICS, player.get("raw", ())))
+        percentiles = percentile_distributions.player_percentiles(
+            player.get("position"), values, player.get("games")
+        )
+        players.append({**player, "percentiles": list(percentiles.values())})
+    return {**radar, "players": players}
+
+
+def annotate_analysis(result: Any) -> Any:
+    """Copy of a players overview, or of an analysis result (overview in `data` + chart series), with percentiles"""
+    if not isinstance(result, dict):
+        return result
+    nested = isinstance(result.get("data"), dict)
+    overview = dict(result["data"] if nested else result)
+    for key in ("players", "all_players"):
+        if key in overview:
+            overview[key] = annotate_players(overview[key])
+    annotated = {**result, "data": overview} if nested else overview
+    charts = result.get("charts")
+    if isinstance(charts, dict) and isinstance(charts.get("radar"), dict):
+        annotated["charts"] = {**charts, "radar": annotate_radar(charts["radar"])}
+    return annotated
@@ -0,0 +1,89 @@
+"""
+Analysis results store - saved analysis payloads as compressed blobs
+
+Saved analyses (UserAnalytics / TeamAnalytics) keep their results out of the
+database: the JSON is written compact and zstd-compressed under its SHA-256,
+and the row only stores results_blob_id. Identical payloads (the same
+analysis saved personally and for the team) share one blob. Rows saved
+before the store still have analysis_results in the database and are read
+from there until migrations/0003_move_analysis_results_to_blob_store.py
+moves them (at startup).
+"""
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+RESULTS_STORE_DIR = Path(os.getenv(
+    "RESULTS_STORE_DIR", str(Path(__file__).parent.parent / "data" / "results")
+))
+RESULTS_COMPRESSION_LEVEL = int(os.getenv("RESULTS_COMPRESSION_LEVEL", "10"))
+
+_RESULTS_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_results_id(value: str) -> bool:
+    return bool(value) and bool(_RESULTS_ID_RE.match(value))
+
+
+def results_path(results_id: str) -> Path:
+    """<store>/<first 2 hex>/<id>.json.zst"""
+    return RESULTS_STORE_DIR / results_id[:2] / f"{results_id}.json.zst"
+
+
+def store_results(results: Dict[str, Any]) -> Tuple[str, bool]:
+    """Store an analysis payload unless it is already stored. Returns (ID, created)."""
+    import zstandard
+
+    data = json.dumps(results, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+    results_id = hashlib.sha256(data).hexdigest()
+    path = results_path(results_id)
+    if path.exists():
+        # Mark it as in use: the storage GC leaves recently touched blobs alone
+        os.utime(path)
+        return results_id, False
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(zstandard.ZstdCompressor(level=RESULTS_COMPRESSION_LEVEL).compress(data))
+    os.replace(tmp_path, path)
+    return results_id, True
+
+
+def put_results(results: Dict[str, Any]) -> str:
+    """Store an analysis payload (no-op if it is already stored). Returns its ID."""
+    return store_results(results)[0]
+
+
+def get_results(results_id: str) -> Optional[Dict[str, Any]]:
+    """A stored analysis payload, or None if it is missing"""
+    import zstandard
+
+    if not is_results_id(results_id):
+        return None
+    try:
+        with open(results_path(results_id), "rb") as f:
+            with zstandard.ZstdDecompressor().stream_reader(f) as reader:
+                return json.load(reader)
+    except FileNotFoundError:
+        return None
+
+
+def decode_results(value: Any) -> Optional[Dict[str, Any]]:
+    """Payload of a legacy analysis_results column (JSON-encoded strings are decoded)"""
+    while isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return None
+    return value
+
+
+def load_analysis_results(analytics) -> Optional[Dict[str, Any]]:
+    """Results of a saved analysis row, from the store or the legacy column"""
+    if analytics.results_blob_id:
+        return get_results(analytics.results_blob_id)
+    return decode_results(analytics.analysis_results)
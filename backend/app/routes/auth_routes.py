@@ -11,6 +11,7 @@ from slowapi import Limiter
 from slowapi.util import get_remote_address
 
 from database import get_db, User as DBUser
+from teams import invalidate_team_cache, invalidate_user_team_caches
 from auth import (
     UserCreate, UserResponse, Token,
     create_user, authenticate_user, create_access_token,
@@ -110,6 +111,7 @@ async def update_me(
     # Discord is managed via OAuth - use /api/discord endpoints
 
     db.commit()
+    invalidate_user_team_caches(current_user)
     db.refresh(current_user)
 
     return current_user
@@ -156,6 +158,7 @@ async def update_profile(
         current_user.email = data.email
 
     db.commit()
+    invalidate_user_team_caches(current_user)
     db.refresh(current_user)
     return current_user
 
@@ -236,6 +239,7 @@ async def delete_account(
 
         # Check if user owns any teams - if so, delete them (kicks all members)
         owned_teams = db.query(DBTeam).filter(DBTeam.owner_id == current_user.id).all()
+        team_ids = {team.id for team in owned_teams + list(current_user.teams)}
         for team in owned_teams:
             db.delete(team)
 
@@ -247,6 +251,8 @@ async def delete_account(
         # Delete user (cascades will handle related data like summoner_data, etc.)
         db.delete(current_user)
         db.commit()
+        for team_id in team_ids:
+            invalidate_team_cache(team_id)
         return {"message": "Account deleted successfully"}
     except Exception as e:
         db.rollback()
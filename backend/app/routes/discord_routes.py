@@ -10,6 +10,7 @@ import random
 from database import get_db, User, DiscordOAuth
 from auth import get_current_user, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
 from services.discord_auth import discord_auth_service
+from teams import invalidate_user_team_caches
 
 
 router = APIRouter(prefix="/api/discord", tags=["discord"])
@@ -94,6 +95,7 @@ async def discord_oauth_callback(
         current_user.discord_verified = True
 
         db.commit()
+        invalidate_user_team_caches(current_user)
 
         return {
             "success": True,
@@ -137,6 +139,7 @@ async def unlink_discord(
         current_user.discord_verified = False
 
         db.commit()
+        invalidate_user_team_caches(current_user)
 
         return {
             "success": True,
@@ -251,6 +254,7 @@ async def discord_login_callback(
             # Update last login
             user.last_login = datetime.utcnow()
             db.commit()
+            invalidate_user_team_caches(user)
 
             # Create access token
             access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -306,6 +310,7 @@ async def discord_login_callback(
                 # Update last login
                 user.last_login = datetime.utcnow()
                 db.commit()
+                invalidate_user_team_caches(user)
 
                 # Create access token
                 access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -13,6 +13,7 @@ sys.path.append(str(Path(__file__).parent.parent))
 
 from database import get_db, Draft as DBDraft, User as DBUser, Team as DBTeam, Scrim as DBScrim
 from auth import get_current_user
+from draft_stats import index_draft, unindex_draft, ensure_team_indexed, team_draft_stats
 
 router = APIRouter(prefix="/api/drafts", tags=["drafts"])
 
@@ -96,6 +97,8 @@ async def create_draft(
         )
 
         db.add(draft)
+        db.flush()
+        index_draft(db, draft)
         db.commit()
         db.refresh(draft)
 
@@ -189,6 +192,28 @@ async def get_team_drafts(
         raise HTTPException(status_code=500, detail=f"Failed to get team drafts: {str(e)}")
 
 
+@router.get("/team/{team_id}/stats")
+async def get_team_draft_stats(
+    team_id: str,
+    min_games: int = 1,
+    current_user: DBUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get a team's pick / ban statistics (first picks, bans per side, win rates)"""
+    try:
+        team = db.query(DBTeam).filter(DBTeam.id == team_id).first()
+        if not team or current_user not in team.members:
+            raise HTTPException(status_code=403, detail="Not a team member")
+
+        ensure_team_indexed(db, team_id)
+        return team_draft_stats(db, team_id, min_games=max(min_games, 1))
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to get draft stats: {str(e)}")
+
+
 @router.get("/{draft_id}")
 async def get_draft(
     draft_id: str,
@@ -291,6 +316,7 @@ async def update_draft(
             }
 
         draft.updated_at = datetime.utcnow()
+        index_draft(db, draft)
         db.commit()
 
         return {"success": True, "message": "Draft updated successfully"}
@@ -323,6 +349,7 @@ async def delete_draft(
         if not can_delete:
             raise HTTPException(status_code=403, detail="Permission denied")
 
+        unindex_draft(db, draft.id)
         db.delete(draft)
         db.commit()
 
@@ -11,6 +11,7 @@ from database import get_db, User, RiotOAuth, SummonerData
 from auth import get_current_user, create_access_token, get_password_hash, ACCESS_TOKEN_EXPIRE_MINUTES
 from services.riot_auth import riot_auth_service
 from services.riot_api import riot_api_service
+from teams import invalidate_user_team_caches
 import uuid
 
 
@@ -88,6 +89,7 @@ async def riot_oauth_callback(
         current_user.riot_verified = True
 
         db.commit()
+        invalidate_user_team_caches(current_user)
 
         # Step 5: Fetch and store summoner data
         await sync_summoner_data(current_user.id, db)
@@ -197,6 +199,7 @@ async def verify_riot_account(
             db.add(new_summoner)
 
         db.commit()
+        invalidate_user_team_caches(current_user)
         db.refresh(current_user)
 
         return {
@@ -245,6 +248,7 @@ async def sync_riot_data(
             current_user.riot_game_name = account["gameName"]
             current_user.riot_tag_line = account["tagLine"]
             db.commit()
+            invalidate_user_team_caches(current_user)
 
         # Case 2: No Riot account linked at all
         if not current_user.riot_puuid:
@@ -338,6 +342,7 @@ async def update_preferred_lane(
     summoner.updated_at = datetime.utcnow()
 
     db.commit()
+    invalidate_user_team_caches(current_user)
 
     return {
         "success": True,
@@ -504,3 +509,4 @@ async def sync_summoner_data(user_id: str, db: Session):
         db.add(new_summoner)
 
     db.commit()
+    invalidate_user_team_caches(user)
@@ -1,8 +1,13 @@
 """
 Scrim Hub routes - Centralized scrim management
+
+Async database access (get_async_db): queries don't block the event loop.
+Sync helpers (draft statistics index, results store) run through run_sync().
 """
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
@@ -11,8 +16,13 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from database import get_db, Scrim, ScrimGame, Draft, TeamAnalytics, User as DBUser, Team as DBTeam
-from auth import get_current_user
+from database import (
+    get_async_db, Scrim, ScrimGame, Draft, TeamAnalytics, User as DBUser, Team as DBTeam,
+    team_members as team_members_table
+)
+from auth import get_current_user_async
+from draft_stats import index_draft, index_draft_by_id
+from storage import attach_results
 
 router = APIRouter(prefix="/api/scrim-hub", tags=["scrim-hub"])
 
@@ -43,38 +53,64 @@ class ScrimGameUpdate(BaseModel):
     draft_id: Optional[str] = None
 
 
-def get_user_team(user: DBUser, db: Session) -> DBTeam:
+async def get_user_team(user: DBUser, db: AsyncSession) -> DBTeam:
     """Get user's team or raise 403"""
-    # Refresh user to ensure teams relationship is loaded
-    db.refresh(user)
-    if not user.teams:
+    team = (await db.execute(
+        select(DBTeam)
+        .join(team_members_table, team_members_table.c.team_id == DBTeam.id)
+        .where(team_members_table.c.user_id == user.id)
+        .limit(1)
+    )).scalars().first()
+    if not team:
         raise HTTPException(status_code=403, detail="You must be part of a team to access scrims")
-    return user.teams[0]
+    return team
 
 
-def verify_team_member(user: DBUser, team_id: str, db: Session) -> DBTeam:
+async def verify_team_member(user: DBUser, team_id: str, db: AsyncSession) -> DBTeam:
     """Verify user is member of the specified team"""
-    team = db.query(DBTeam).filter(DBTeam.id == team_id).first()
+    team = await db.get(DBTeam, team_id)
     if not team:
         raise HTTPException(status_code=404, detail="Team not found")
-    # Refresh to ensure members relationship is loaded
-    db.refresh(team)
-    if user not in team.members:
+    membership = (await db.execute(
+        select(team_members_table.c.user_id).where(
+            team_members_table.c.team_id == team_id,
+            team_members_table.c.user_id == user.id
+        )
+    )).first()
+    if not membership:
         raise HTTPException(status_code=403, detail="Not a team member")
     return team
 
 
+async def get_scrim_or_404(scrim_id: str, db: AsyncSession, *options) -> Scrim:
+    """Get a scrim or raise 404"""
+    scrim = (await db.execute(select(Scrim).options(*options).where(Scrim.id == scrim_id))).scalar_one_or_none()
+    if not scrim:
+        raise HTTPException(status_code=404, detail="Scrim not found")
+    return scrim
+
+
+async def get_game_or_404(game_id: str, db: AsyncSession) -> ScrimGame:
+    """Get a scrim game (with its scrim) or raise 404"""
+    game = (await db.execute(
+        select(ScrimGame).options(selectinload(ScrimGame.scrim)).where(ScrimGame.id == game_id)
+    )).scalar_one_or_none()
+    if not game:
+        raise HTTPException(status_code=404, detail="Game not found")
+    return game
+
+
 # ==================== SCRIM ENDPOINTS ====================
 
 @router.post("/scrims")
 async def create_scrim(
     request: ScrimCreate,
-    current_user: DBUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: DBUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new scrim for the user's team"""
     try:
-        team = get_user_team(current_user, db)
+        team = await get_user_team(current_user, db)
 
         scrim = Scrim(
             team_id=team.id,
@@ -89,8 +125,8 @@ async def create_scrim(
         )
 
         db.add(scrim)
-        db.commit()
-        db.refresh(scrim)
+        await db.commit()
+        await db.refresh(scrim)
 
         return {
             "success": True,
@@ -100,7 +136,7 @@ async def create_scrim(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to create scrim: {str(e)}")
 
 
@@ -108,19 +144,19 @@ async def create_scrim(
 async def get_team_scrims(
     team_id: str,
     status: Optional[str] = None,
-    current_user: DBUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: DBUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all scrims for a team"""
     try:
-        verify_team_member(current_user, team_id, db)
+        await verify_team_member(current_user, team_id, db)
 
-        query = db.query(Scrim).filter(Scrim.team_id == team_id)
+        query = select(Scrim).where(Scrim.team_id == team_id)
 
         if status:
-            query = query.filter(Scrim.status == status)
+            query = query.where(Scrim.status == status)
 
-        scrims = query.order_by(Scrim.scheduled_at.desc()).all()
+        scrims = (await db.execute(query.order_by(Scrim.scheduled_at.desc()))).scalars().all()
 
         return {
             "scrims": [
@@ -149,16 +185,13 @@ async def get_team_scrims(
 @router.get("/scrims/{scrim_id}")
 async def get_scrim(
     scrim_id: str,
-    current_user: DBUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: DBUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a scrim with all its games"""
     try:
-        scrim = db.query(Scrim).filter(Scrim.id == scrim_id).first()
-        if not scrim:
-            raise HTTPException(status_code=404, detail="Scrim not found")
-
-        verify_team_member(current_user, scrim.team_id, db)
+        scrim = await get_scrim_or_404(scrim_id, db, selectinload(Scrim.games).selectinload(ScrimGame.draft))
+        await verify_team_member(current_user, scrim.team_id, db)
 
         # Get games with draft info
         games_data = []
@@ -210,16 +243,13 @@ async def get_scrim(
 async def update_scrim(
     scrim_id: str,
     request: ScrimUpdate,
-    current_user: DBUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: DBUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a scrim"""
     try:
-        scrim = db.query(Scrim).filter(Scrim.id == scrim_id).first()
-        if not scrim:
-            raise HTTPException(status_code=404, detail="Scrim not found")
-
-        verify_team_member(current_user, scrim.team_id, db)
+        scrim = await get_scrim_or_404(scrim_id, db)
+        await verify_team_member(current_user, scrim.team_id, db)
 
         if request.opponent_name is not None:
             scrim.opponent_name = request.opponent_name
@@ -232,38 +262,53 @@ async def update_scrim(
         if request.status is not None:
             scrim.status = request.status
 
-        db.commit()
+        if request.opponent_name is not None:
+            for draft in (await db.execute(select(Draft).where(Draft.scrim_id == scrim.id))).scalars().all():
+                await db.run_sync(index_draft, draft)
+
+        await db.commit()
 
         return {"success": True, "message": "Scrim updated successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to update scrim: {str(e)}")
 
 
 @router.delete("/scrims/{scrim_id}")
 async def delete_scrim(
     scrim_id: str,
-    current_user: DBUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: DBUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a scrim and all its games"""
     try:
-        scrim = db.query(Scrim).filter(Scrim.id == scrim_id).first()
-        if not scrim:
-            raise HTTPException(status_code=404, detail="Scrim not found")
+        scrim = await get_scrim_or_404(scrim_id, db)
+        await verify_team_member(current_user, scrim.team_id, db)
 
-        verify_team_member(current_user, scrim.team_id, db)
+        linked_drafts = (await db.execute(select(Draft).where(
+            (Draft.scrim_id == scrim.id) | Draft.id.in_(
+                select(ScrimGame.draft_id).where(ScrimGame.scrim_id == scrim.id)
+            )
+        ))).scalars().all()
 
-        db.delete(scrim)
-        db.commit()
+        await db.delete(scrim)
+        await db.flush()
+
+        # Linked drafts lose their game result (and their team, if it came from the scrim)
+        for draft in linked_drafts:
+            if draft.scrim_id == scrim_id:
+                draft.scrim_id = None
+            await db.run_sync(index_draft, draft)
+
+        await db.commit()
 
         return {"success": True, "message": "Scrim deleted successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete scrim: {str(e)}")
 
 
@@ -273,26 +318,26 @@ async def delete_scrim(
 async def add_game(
     scrim_id: str,
     request: ScrimGameCreate,
-    current_user: DBUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: DBUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Add a game to a scrim (max 5 games)"""
     try:
-        scrim = db.query(Scrim).filter(Scrim.id == scrim_id).first()
-        if not scrim:
-            raise HTTPException(status_code=404, detail="Scrim not found")
-
-        verify_team_member(current_user, scrim.team_id, db)
+        scrim = await get_scrim_or_404(scrim_id, db)
+        await verify_team_member(current_user, scrim.team_id, db)
 
         # Check max 5 games
-        if len(scrim.games) >= 5:
+        games_count = (await db.execute(
+            select(func.count(ScrimGame.id)).where(ScrimGame.scrim_id == scrim_id)
+        )).scalar()
+        if games_count >= 5:
             raise HTTPException(status_code=400, detail="Maximum 5 games per scrim (Bo5)")
 
         # Check game number doesn't exist
-        existing = db.query(ScrimGame).filter(
+        existing = (await db.execute(select(ScrimGame).where(
             ScrimGame.scrim_id == scrim_id,
             ScrimGame.game_number == request.game_number
-        ).first()
+        ))).scalars().first()
         if existing:
             raise HTTPException(status_code=400, detail=f"Game {request.game_number} already exists")
 
@@ -313,8 +358,10 @@ async def add_game(
         elif request.result == 'lose':
             scrim.losses += 1
 
-        db.commit()
-        db.refresh(game)
+        await db.run_sync(index_draft_by_id, request.draft_id)
+
+        await db.commit()
+        await db.refresh(game)
 
         return {
             "success": True,
@@ -324,7 +371,7 @@ async def add_game(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to add game: {str(e)}")
 
 
@@ -332,20 +379,18 @@ async def add_game(
 async def update_game(
     game_id: str,
     request: ScrimGameUpdate,
-    current_user: DBUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: DBUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a game (result, notes, draft link)"""
     try:
-        game = db.query(ScrimGame).filter(ScrimGame.id == game_id).first()
-        if not game:
-            raise HTTPException(status_code=404, detail="Game not found")
-
+        game = await get_game_or_404(game_id, db)
         scrim = game.scrim
-        verify_team_member(current_user, scrim.team_id, db)
+        await verify_team_member(current_user, scrim.team_id, db)
 
         # Track result changes for scrim totals
         old_result = game.result
+        old_draft_id = game.draft_id
 
         if request.result is not None:
             game.result = request.result
@@ -356,7 +401,7 @@ async def update_game(
         if request.draft_id is not None:
             # Verify draft exists and belongs to team
             if request.draft_id:
-                draft = db.query(Draft).filter(Draft.id == request.draft_id).first()
+                draft = await db.get(Draft, request.draft_id)
                 if not draft:
                     raise HTTPException(status_code=404, detail="Draft not found")
                 # Link draft to this scrim
@@ -379,30 +424,33 @@ async def update_game(
             elif request.result == 'lose':
                 scrim.losses += 1
 
-        db.commit()
+        # Draft statistics: the previously linked draft loses this game's result
+        if game.draft_id != old_draft_id:
+            await db.run_sync(index_draft_by_id, old_draft_id)
+        if game.draft_id and (game.draft_id != old_draft_id or game.result != old_result):
+            await db.run_sync(index_draft_by_id, game.draft_id)
+
+        await db.commit()
 
         return {"success": True, "message": "Game updated successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to update game: {str(e)}")
 
 
 @router.delete("/games/{game_id}")
 async def delete_game(
     game_id: str,
-    current_user: DBUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: DBUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a game from a scrim"""
     try:
-        game = db.query(ScrimGame).filter(ScrimGame.id == game_id).first()
-        if not game:
-            raise HTTPException(status_code=404, detail="Game not found")
-
+        game = await get_game_or_404(game_id, db)
         scrim = game.scrim
-        verify_team_member(current_user, scrim.team_id, db)
+        await verify_team_member(current_user, scrim.team_id, db)
 
         # Update scrim totals
         scrim.total_games = max(0, scrim.total_games - 1)
@@ -411,14 +459,17 @@ async def delete_game(
         elif game.result == 'lose':
             scrim.losses = max(0, scrim.losses - 1)
 
-        db.delete(game)
-        db.commit()
+        draft_id = game.draft_id
+        await db.delete(game)
+        await db.flush()
+        await db.run_sync(index_draft_by_id, draft_id)
+        await db.commit()
 
         return {"success": True, "message": "Game deleted successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete game: {str(e)}")
 
 
@@ -427,18 +478,15 @@ async def delete_game(
 @router.get("/scrims/{scrim_id}/drafts")
 async def get_scrim_drafts(
     scrim_id: str,
-    current_user: DBUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: DBUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all drafts associated with a scrim"""
     try:
-        scrim = db.query(Scrim).filter(Scrim.id == scrim_id).first()
-        if not scrim:
-            raise HTTPException(status_code=404, detail="Scrim not found")
-
-        verify_team_member(current_user, scrim.team_id, db)
+        scrim = await get_scrim_or_404(scrim_id, db)
+        await verify_team_member(current_user, scrim.team_id, db)
 
-        drafts = db.query(Draft).filter(Draft.scrim_id == scrim_id).all()
+        drafts = (await db.execute(select(Draft).where(Draft.scrim_id == scrim_id))).scalars().all()
 
         return {
             "drafts": [
@@ -468,50 +516,46 @@ class ScrimAnalyticsLink(BaseModel):
 async def link_analytics_to_scrim(
     scrim_id: str,
     request: ScrimAnalyticsLink,
-    current_user: DBUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: DBUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Link an analytics entry to a scrim"""
     try:
-        scrim = db.query(Scrim).filter(Scrim.id == scrim_id).first()
-        if not scrim:
-            raise HTTPException(status_code=404, detail="Scrim not found")
-
-        verify_team_member(current_user, scrim.team_id, db)
+        scrim = await get_scrim_or_404(scrim_id, db)
+        await verify_team_member(current_user, scrim.team_id, db)
 
         # Verify analytics exists
-        analytics = db.query(TeamAnalytics).filter(TeamAnalytics.id == request.analytics_id).first()
+        analytics = await db.get(TeamAnalytics, request.analytics_id)
         if not analytics:
             raise HTTPException(status_code=404, detail="Analytics not found")
 
         # Link analytics to scrim by storing scrim_id in analytics
         analytics.scrim_id = scrim_id
-        db.commit()
+        await db.commit()
 
         return {"success": True, "message": "Analytics linked to scrim successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to link analytics: {str(e)}")
 
 
 @router.get("/scrims/{scrim_id}/analytics")
 async def get_scrim_analytics(
     scrim_id: str,
-    current_user: DBUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: DBUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all analytics linked to a scrim"""
     try:
-        scrim = db.query(Scrim).filter(Scrim.id == scrim_id).first()
-        if not scrim:
-            raise HTTPException(status_code=404, detail="Scrim not found")
-
-        verify_team_member(current_user, scrim.team_id, db)
+        scrim = await get_scrim_or_404(scrim_id, db)
+        await verify_team_member(current_user, scrim.team_id, db)
 
         # Get analytics where scrim_id matches
-        analytics = db.query(TeamAnalytics).filter(TeamAnalytics.scrim_id == scrim_id).all()
+        analytics = (await db.execute(
+            select(TeamAnalytics).where(TeamAnalytics.scrim_id == scrim_id)
+        )).scalars().all()
 
         return {
             "analytics": [
@@ -540,16 +584,13 @@ import os
 async def upload_scrim_json(
     scrim_id: str,
     file: UploadFile = File(...),
-    current_user: DBUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: DBUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Upload a JSON file for scrim analytics"""
     try:
-        scrim = db.query(Scrim).filter(Scrim.id == scrim_id).first()
-        if not scrim:
-            raise HTTPException(status_code=404, detail="Scrim not found")
-
-        verify_team_member(current_user, scrim.team_id, db)
+        scrim = await get_scrim_or_404(scrim_id, db)
+        await verify_team_member(current_user, scrim.team_id, db)
 
         # Read and parse JSON
         content = await file.read()
@@ -558,20 +599,24 @@ async def upload_scrim_json(
         except json.JSONDecodeError:
             raise HTTPException(status_code=400, detail="Invalid JSON file")
 
-        # Create analytics entry linked to scrim
+        # Create analytics entry linked to scrim (the JSON is the analysis itself, no upload file)
         analytics = TeamAnalytics(
             team_id=scrim.team_id,
             created_by_id=current_user.id,
             name=f"{scrim.opponent_name} - Analytics",
             file_name=file.filename,
-            players_count=len(json_data.get('players', [])) if isinstance(json_data, dict) else 0,
-            analysis_results=json.dumps(json_data),
+            players_count=str(len(json_data.get('players', [])) if isinstance(json_data, dict) else 0),
+            data_path="",
             scrim_id=scrim_id
         )
 
         db.add(analytics)
-        db.commit()
-        db.refresh(analytics)
+        await db.flush()
+        await db.run_sync(
+            attach_results, "team_analytics", analytics, json_data,
+            user_id=current_user.id, team_id=scrim.team_id
+        )
+        await db.commit()
 
         return {
             "success": True,
@@ -581,5 +626,5 @@ async def upload_scrim_json(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to upload JSON: {str(e)}")
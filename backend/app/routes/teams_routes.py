@@ -2,19 +2,21 @@
 Team management endpoints
 """
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from database import (
-    get_db, User as DBUser, TeamInvite as DBInvite, Scrim as DBScrim,
+    get_db, get_async_db, User as DBUser, TeamInvite as DBInvite, Scrim as DBScrim,
     team_members as team_members_table
 )
-from auth import get_current_user
+from auth import get_current_user, get_current_user_async
 from teams import (
     TeamCreate, TeamUpdate, TeamResponse, InviteCreate, InviteResponse,
     JoinRequestCreate, JoinRequestResponse,
-    create_team, get_user_teams, get_team_by_id, get_team_members_with_roles,
+    create_team, get_user_teams, get_team_by_id, get_team_rosters, build_team_response, build_team_responses,
     create_team_invite, accept_team_invite, get_user_invites, update_team,
-    create_join_request, get_team_join_requests, accept_join_request, reject_join_request
+    create_join_request, get_team_join_requests, accept_join_request, reject_join_request,
+    invalidate_team_cache
 )
 
 router = APIRouter(prefix="/api/teams", tags=["teams"])
@@ -29,23 +31,7 @@ async def get_all_teams(
     try:
         from database import Team as DBTeam
         teams = db.query(DBTeam).filter(DBTeam.is_locked == False).all()
-        result = []
-        for team in teams:
-            members = get_team_members_with_roles(db, team.id)
-            result.append(TeamResponse(
-                id=team.id,
-                name=team.name,
-                tag=team.tag,
-                description=team.description,
-                owner_id=team.owner_id,
-                created_at=team.created_at,
-                team_color=team.team_color,
-                max_members=team.max_members,
-                member_count=len(members),
-                members=members,
-                is_locked=team.is_locked
-            ))
-        return result
+        return build_team_responses(db, teams)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get teams: {str(e)}")
 
@@ -59,51 +45,26 @@ async def create_team_endpoint(
     """Create a new team"""
     try:
         team = create_team(db, team_data, current_user.id)
-        members = get_team_members_with_roles(db, team.id)
-        return TeamResponse(
-            id=team.id,
-            name=team.name,
-            tag=team.tag,
-            description=team.description,
-            owner_id=team.owner_id,
-            created_at=team.created_at,
-            team_color=team.team_color,
-            max_members=team.max_members,
-            member_count=len(members),
-            members=members,
-            is_locked=team.is_locked
-        )
+        return build_team_response(db, team)
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create team: {str(e)}")
 
 
+def _my_teams(db: Session, user_id: str) -> list[TeamResponse]:
+    """Teams of a user with their members (sync, run through AsyncSession.run_sync)"""
+    return build_team_responses(db, get_user_teams(db, user_id))
+
+
 @router.get("/my-teams", response_model=list[TeamResponse])
 async def get_my_teams(
-    current_user: DBUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: DBUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all teams the current user is part of"""
     try:
-        teams = get_user_teams(db, current_user.id)
-        result = []
-        for team in teams:
-            members = get_team_members_with_roles(db, team.id)
-            result.append(TeamResponse(
-                id=team.id,
-                name=team.name,
-                tag=team.tag,
-                description=team.description,
-                owner_id=team.owner_id,
-                created_at=team.created_at,
-                team_color=team.team_color,
-                max_members=team.max_members,
-                member_count=len(members),
-                members=members,
-                is_locked=team.is_locked
-            ))
-        return result
+        return await db.run_sync(_my_teams, current_user.id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get teams: {str(e)}")
 
@@ -145,23 +106,12 @@ async def get_team(
     if not team:
         raise HTTPException(status_code=404, detail="Team not found")
 
-    if current_user not in team.members:
+    # Membership from the cached roster (no members query)
+    members = get_team_rosters(db, [team.id])[team.id]
+    if not any(member["id"] == current_user.id for member in members):
         raise HTTPException(status_code=403, detail="Not a team member")
 
-    members = get_team_members_with_roles(db, team.id)
-    return TeamResponse(
-        id=team.id,
-        name=team.name,
-        tag=team.tag,
-        description=team.description,
-        owner_id=team.owner_id,
-        created_at=team.created_at,
-        team_color=team.team_color,
-        max_members=team.max_members,
-        member_count=len(members),
-        members=members,
-        is_locked=team.is_locked
-    )
+    return build_team_response(db, team)
 
 
 @router.put("/{team_id}", response_model=TeamResponse)
@@ -181,19 +131,7 @@ async def update_team_endpoint(
 
     try:
         updated_team = update_team(db, team_id, team_data)
-        members = get_team_members_with_roles(db, updated_team.id)
-        return TeamResponse(
-            id=updated_team.id,
-            name=updated_team.name,
-            tag=updated_team.tag,
-            description=updated_team.description,
-            owner_id=updated_team.owner_id,
-            created_at=updated_team.created_at,
-            team_color=updated_team.team_color,
-            max_members=updated_team.max_members,
-            member_count=len(members),
-            members=members
-        )
+        return build_team_response(db, updated_team)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -220,6 +158,7 @@ async def delete_team(
         db.query(DBScrim).filter(DBScrim.team_id == team_id).delete()
         db.delete(team)
         db.commit()
+        invalidate_team_cache(team_id)
 
         return {"message": "Team deleted successfully"}
     except Exception as e:
@@ -250,6 +189,7 @@ async def leave_team(
             team_members_table.c.user_id == current_user.id
         ).delete()
         db.commit()
+        invalidate_team_cache(team_id)
 
         return {"message": "Successfully left the team"}
     except Exception as e:
@@ -288,6 +228,7 @@ async def kick_member(
             team_members_table.c.user_id == user_id
         ).delete()
         db.commit()
+        invalidate_team_cache(team_id)
 
         return {"message": f"{user_to_kick.username} has been kicked from the team"}
     except Exception as e:
@@ -323,6 +264,7 @@ async def promote_to_owner(
     try:
         team.owner_id = user_id
         db.commit()
+        invalidate_team_cache(team_id)
         db.refresh(team)
 
         return {"message": f"{user_to_promote.username} is now the team owner"}
@@ -373,20 +315,7 @@ async def accept_invite(
     """Accept a team invitation"""
     try:
         team = accept_team_invite(db, invite_id, current_user.id)
-        members = get_team_members_with_roles(db, team.id)
-        return TeamResponse(
-            id=team.id,
-            name=team.name,
-            tag=team.tag,
-            description=team.description,
-            owner_id=team.owner_id,
-            created_at=team.created_at,
-            team_color=team.team_color,
-            max_members=team.max_members,
-            member_count=len(members),
-            members=members,
-            is_locked=team.is_locked
-        )
+        return build_team_response(db, team)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -500,20 +429,7 @@ async def accept_join_request_endpoint(
     """Accept a join request (owner only)"""
     try:
         team = accept_join_request(db, request_id, current_user.id)
-        members = get_team_members_with_roles(db, team.id)
-        return TeamResponse(
-            id=team.id,
-            name=team.name,
-            tag=team.tag,
-            description=team.description,
-            owner_id=team.owner_id,
-            created_at=team.created_at,
-            team_color=team.team_color,
-            max_members=team.max_members,
-            member_count=len(members),
-            members=members,
-            is_locked=team.is_locked
-        )
+        return build_team_response(db, team)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -0,0 +1,69 @@
+"""
+Versioned schema migrations, applied at startup (init_db)
+
+Each migrations/NNNN_<name>.py defines upgrade(connection), run in its own
+transaction on a SQLAlchemy connection (SQLite and PostgreSQL alike). The
+schema_migrations table records what a database already has; migrations
+must be idempotent (IF NOT EXISTS), since fresh databases already get the
+current schema from create_all(). The older migrations/*.py scripts without
+a version number are one-off sqlite3 scripts, run by hand.
+"""
+import importlib.util
+import re
+from pathlib import Path
+from typing import List, Tuple
+
+from sqlalchemy import inspect, select, text
+from sqlalchemy.exc import IntegrityError
+
+from database import SchemaMigration
+
+MIGRATIONS_DIR = Path(__file__).parent.parent / "migrations"
+
+_VERSION_FILE_RE = re.compile(r"^(\d{4})_(\w+)\.py$")
+
+
+def versioned_migrations() -> List[Tuple[int, str, Path]]:
+    """(version, name, path) of the versioned migration files, in order"""
+    migrations = []
+    for path in MIGRATIONS_DIR.glob("*.py"):
+        match = _VERSION_FILE_RE.match(path.name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), path))
+    return sorted(migrations)
+
+
+def add_column_if_missing(connection, table: str, column: str, ddl_type: str) -> bool:
+    """ALTER TABLE ... ADD COLUMN unless the table already has it (create_all or an earlier run added it)"""
+    if column in {existing["name"] for existing in inspect(connection).get_columns(table)}:
+        return False
+    connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+    return True
+
+
+def _load_upgrade(path: Path):
+    spec = importlib.util.spec_from_file_location(f"migration_{path.stem}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.upgrade
+
+
+def apply_migrations(bind) -> List[str]:
+    """Apply the versioned migrations this database doesn't have yet. Returns their names."""
+    with bind.connect() as connection:
+        applied = set(connection.execute(select(SchemaMigration.version)).scalars())
+
+    newly_applied = []
+    for version, name, path in versioned_migrations():
+        if version in applied:
+            continue
+        try:
+            with bind.begin() as connection:
+                _load_upgrade(path)(connection)
+                connection.execute(SchemaMigration.__table__.insert().values(version=version, name=name))
+        except IntegrityError:
+            # Another worker applied it concurrently
+            continue
+        newly_applied.append(f"{version:04d}_{name}")
+        print(f"✅ Applied migration {version:04d}_{name}")
+    return newly_applied
@@ -0,0 +1,158 @@
+"""
+Analytics worker pool - runs ScrimAnalytics in separate processes
+
+Parsing, aggregation and chart rendering are CPU-bound and would freeze the
+event loop (and every other request on the worker). Jobs are sent to a
+bounded pool of worker processes; only the final result comes back.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration
+ANALYTICS_POOL_SIZE = int(os.getenv("ANALYTICS_POOL_SIZE", "2"))
+ANALYTICS_JOB_TIMEOUT = float(os.getenv("ANALYTICS_JOB_TIMEOUT", "120"))  # seconds
+ANALYTICS_MAX_TASKS_PER_CHILD = int(os.getenv("ANALYTICS_MAX_TASKS_PER_CHILD", "50"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+# Jobs still awaited on each pool, and pools retired after a timeout (killed once drained).
+# Only touched from the event loop.
+_in_flight: Dict[ProcessPoolExecutor, int] = {}
+_retired: Set[ProcessPoolExecutor] = set()
+
+
+class AnalyticsJobTimeout(Exception):
+    """An analytics job ran longer than ANALYTICS_JOB_TIMEOUT"""
+
+
+class AnalyticsPoolUnavailable(Exception):
+    """The worker pool was restarted while the job was queued or running"""
+
+
+# ==================== JOBS (run inside worker processes) ====================
+
+def run_analysis(data_file: str, team_riot_ids: List[str], analysis_id: Optional[str] = None,
+                 chart_mode: str = "png") -> Dict[str, Any]:
+    """Full analysis: stats + chart URLs (rendered lazily) or chart series"""
+    from analytics import ScrimAnalytics
+    analytics = ScrimAnalytics(Path(data_file), team_riot_ids=team_riot_ids, analysis_id=analysis_id)
+    return analytics.process(chart_mode=chart_mode)
+
+
+def run_render_chart(data_file: str, team_riot_ids: List[str], analysis_id: str, chart_name: str) -> str:
+    """Render a single chart of an analysis and return its path"""
+    from analytics import ScrimAnalytics
+    return ScrimAnalytics(Path(data_file), team_riot_ids=team_riot_ids, analysis_id=analysis_id).render_chart(chart_name)
+
+
+def run_append_team_matches(aggregates: Optional[Dict[str, Any]], sources: List[str], new_file: str,
+                            team_riot_ids: List[str]) -> Dict[str, Any]:
+    """Fold new matches into a saved team analysis"""
+    from analytics import append_team_matches
+    return append_team_matches(aggregates, sources, new_file, team_riot_ids)
+
+
+def run_team_synergy(team_id: str, sources: List[str], team_riot_ids: List[str], min_games: int = 1) -> Dict[str, Any]:
+    """Champion pair / matchup / composition tables of a team (cached, updated incrementally)"""
+    from synergy import team_synergy_report
+    return team_synergy_report(team_id, sources, team_riot_ids, min_games=min_games)
+
+
+def run_players_overview(data_file: str) -> Dict[str, Any]:
+    """Player statistics only (no charts)"""
+    from analytics import ScrimAnalytics
+    return ScrimAnalytics(Path(data_file)).get_players_overview()
+
+
+# ==================== POOL MANAGEMENT ====================
+
+def get_executor() -> ProcessPoolExecutor:
+    """Get (or lazily start) the worker pool"""
+    global _executor
+
+    if _executor is None:
+        # spawn: never fork the event loop, scheduler threads or open DB connections
+        _executor = ProcessPoolExecutor(
+            max_workers=ANALYTICS_POOL_SIZE,
+            mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=ANALYTICS_MAX_TASKS_PER_CHILD
+        )
+        logger.info(f"Analytics pool started with {ANALYTICS_POOL_SIZE} workers")
+
+    return _executor
+
+
+def _kill_executor(executor: ProcessPoolExecutor):
+    """Terminate a pool's processes (a stuck job cannot be cancelled otherwise)"""
+    global _executor
+
+    # Another job may already have replaced the broken pool
+    if _executor is executor:
+        _executor = None
+    _retired.discard(executor)
+
+    for process in list((getattr(executor, "_processes", None) or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+    logger.warning("Analytics pool terminated")
+
+
+def _retire_executor(executor: ProcessPoolExecutor):
+    """Send new jobs to a fresh pool; this one (with a stuck worker) is killed once its other jobs are done"""
+    global _executor
+
+    if _executor is executor:
+        _executor = None
+        logger.warning("Analytics job timed out, new jobs go to a fresh pool")
+    _retired.add(executor)
+
+
+async def run_analytics_job(fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+    """
+    Run `fn(*args)` in the worker pool without blocking the event loop.
+
+    Raises AnalyticsJobTimeout if the job exceeds the timeout (its pool is then
+    retired: the other jobs running there finish, then its processes are
+    terminated to reclaim the stuck worker) and AnalyticsPoolUnavailable if the
+    pool broke while the job was pending.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    future = loop.run_in_executor(executor, fn, *args)
+    _in_flight[executor] = _in_flight.get(executor, 0) + 1
+
+    timeout = timeout or ANALYTICS_JOB_TIMEOUT
+    try:
+        return await asyncio.wait_for(future, timeout=timeout)
+    except asyncio.TimeoutError:
+        _retire_executor(executor)
+        raise AnalyticsJobTimeout(f"Analytics job exceeded {timeout:g}s")
+    except BrokenProcessPool:
+        _kill_executor(executor)
+        raise AnalyticsPoolUnavailable("Analytics workers were restarted, please retry")
+    finally:
+        _in_flight[executor] -= 1
+        if not _in_flight[executor]:
+            del _in_flight[executor]
+            # Only abandoned jobs are left on a retired pool
+            if executor in _retired:
+                _kill_executor(executor)
+
+
+def shutdown_pool():
+    """Stop the worker pool (app shutdown)"""
+    global _executor
+
+    for executor in list(_retired):
+        _kill_executor(executor)
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        logger.info("Analytics pool shut down")
@@ -3,10 +3,34 @@ Riot Games API Service
 Handles requests to Riot's various APIs (Account, Summoner, League, etc.)
 """
 import os
+import re
+import unicodedata
 import httpx
 from typing import Optional, Dict, Any, List
 from fastapi import HTTPException
 
+# Zero-width and other invisible characters found in copy-pasted Riot IDs
+INVISIBLE_CHARS = re.compile('[\u200b\u200c\u200d\u2060\u2066\u2067\u2068\u2069\ufeff]')
+
+
+def clean_riot_id(text: str) -> str:
+    """
+    Clean Riot ID from invisible Unicode characters
+    Removes directional marks, zero-width characters, etc.
+    """
+    # Normalize Unicode (decompose then recompose)
+    text = unicodedata.normalize('NFKC', text)
+
+    # Remove directional marks and other format characters
+    text = ''.join(char for char in text if unicodedata.category(char) != 'Cf')
+
+    return INVISIBLE_CHARS.sub('', text).strip()
+
+
+def riot_id_key(game_name: str, tag_line: str) -> str:
+    """Matching key of a Riot ID: cleaned, then case- and Unicode-folded (Riot IDs are case-insensitive)"""
+    return f"{clean_riot_id(game_name or '')}#{clean_riot_id(tag_line or '')}".casefold()
+
 
 class RiotAPIService:
     """Riot Games API service for fetching player data"""
@@ -62,31 +86,7 @@ class RiotAPIService:
         Clean Riot ID from invisible Unicode characters
         Removes directional marks, zero-width characters, etc.
         """
-        import unicodedata
-        import re
-
-        # Normalize Unicode (decompose then recompose)
-        text = unicodedata.normalize('NFKC', text)
-
-        # Remove directional marks and other format characters
-        text = ''.join(char for char in text if unicodedata.category(char) != 'Cf')
-
-        # Remove zero-width and other invisible characters
-        invisible_chars = [
-            '\u200b',  # Zero-width space
-            '\u200c',  # Zero-width non-joiner
-            '\u200d',  # Zero-width joiner
-            '\u2060',  # Word joiner
-            '\u2066',  # Left-to-right isolate
-            '\u2067',  # Right-to-left isolate
-            '\u2068',  # First strong isolate
-            '\u2069',  # Pop directional isolate
-            '\ufeff',  # Zero-width no-break space (BOM)
-        ]
-        for char in invisible_chars:
-            text = text.replace(char, '')
-
-        return text.strip()
+        return clean_riot_id(text)
 
     async def get_account_by_riot_id(
         self,
@@ -6,13 +6,18 @@ from apscheduler.triggers.interval import IntervalTrigger
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from typing import Optional
+import asyncio
 import logging
+import os
 
 from app.database import User, SessionLocal
 from app.services.riot_api import riot_api_service
 
 logger = logging.getLogger(__name__)
 
+# Storage garbage collection: one batch every N minutes
+STORAGE_GC_INTERVAL_MINUTES = int(os.getenv("STORAGE_GC_INTERVAL_MINUTES", "15"))
+
 scheduler: Optional[AsyncIOScheduler] = None
 
 
@@ -121,6 +126,36 @@ async def auto_sync_stale_data():
         db.close()
 
 
+def _collect_storage_garbage_sync():
+    # Same modules as the API (reference hooks write through them)
+    from database import SessionLocal as AppSessionLocal
+    from storage import collect_garbage, reconcile_storage, storage_needs_reconcile
+
+    db: Session = AppSessionLocal()
+    try:
+        if storage_needs_reconcile(db):
+            logger.info(f"Storage: tracking existing files {reconcile_storage(db)}")
+        return collect_garbage(db)
+    finally:
+        db.close()
+
+
+async def collect_storage_garbage():
+    """
+    Delete a batch of unreferenced uploads, stored matches and charts
+    """
+    try:
+        result = await asyncio.to_thread(_collect_storage_garbage_sync)
+        if result["deleted"] or result["released_holders"]:
+            logger.info(
+                f"Storage GC: {result['deleted']} blobs deleted "
+                f"({result['freed_bytes'] / 1024 / 1024:.1f} MB), "
+                f"{result['released_holders']} deleted analyses released"
+            )
+    except Exception as e:
+        logger.error(f"Error in collect_storage_garbage: {str(e)}")
+
+
 def start_scheduler():
     """
     Start the background scheduler
@@ -142,6 +177,16 @@ def start_scheduler():
         replace_existing=True
     )
 
+    # Reclaim unreferenced storage incrementally (first run shortly after startup)
+    scheduler.add_job(
+        collect_storage_garbage,
+        trigger=IntervalTrigger(minutes=STORAGE_GC_INTERVAL_MINUTES),
+        id="collect_storage_garbage",
+        name="Collect unreferenced uploads, matches and charts",
+        next_run_time=datetime.now() + timedelta(minutes=1),
+        replace_existing=True
+    )
+
     scheduler.start()
     logger.info("Background scheduler started - auto-sync will run every 6 hours")
 
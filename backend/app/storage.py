@@ -0,0 +1,480 @@
+"""
+Storage manager - reference-counted uploads, stored matches and charts
+
+Every file the analytics write is a blob (StoredBlob) with a reference count:
+
+    upload:<file>          uploads/<file> + its columnar artifact   held by saved analyses
+    match:<key>            match store payload, rows and timeline   held by the uploads listing it
+    charts:<analysis id>   exports/charts/<analysis id>/            held by the upload it was computed from
+    results:<sha256>       data/results/ payload of a saved analysis held by the saved analyses
+    export:<path>          legacy exports/*.png and exports/charts/*.png (never held)
+
+References are added and dropped as analyses are uploaded, saved, extended
+and deleted. The scheduler collects unreferenced blobs a batch at a time:
+uploads once they have been unreferenced for the retention period (unsaved
+analyses), everything else after a grace period. Deleting a blob drops the
+references it holds, so matches only used by a collected upload follow on a
+later run. References held by analyses deleted without a hook (account and
+team deletions cascade) are found with an anti-join on the analytics tables,
+never with a directory scan.
+"""
+import os
+import shutil
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session, aliased
+
+from database import (
+    StoredBlob as DBStoredBlob, StoredBlobRef as DBStoredBlobRef,
+    Team as DBTeam, TeamAnalytics as DBTeamAnalytics,
+    User as DBUser, UserAnalytics as DBUserAnalytics
+)
+from analysis_cache import CHARTS_DIR, is_analysis_id
+from match_store import match_store, read_manifest
+from results_store import put_results, results_path
+
+BASE_DIR = Path(__file__).parent.parent
+UPLOAD_DIR = BASE_DIR / "uploads"
+EXPORT_DIR = BASE_DIR / "exports"
+
+# Unsaved uploads are kept this long (the analysis can still be saved meanwhile)
+STORAGE_UPLOAD_RETENTION_DAYS = int(os.getenv("STORAGE_UPLOAD_RETENTION_DAYS", "7"))
+# Other unreferenced blobs (matches, charts) are kept this long, so an upload
+# in progress can pick them up again before they are collected
+STORAGE_GC_GRACE_MINUTES = int(os.getenv("STORAGE_GC_GRACE_MINUTES", "60"))
+# Blobs deleted per GC run
+STORAGE_GC_BATCH = int(os.getenv("STORAGE_GC_BATCH", "200"))
+
+# Holders of references that are rows of a table
+_HOLDER_TABLES = {
+    "user_analytics": DBUserAnalytics,
+    "team_analytics": DBTeamAnalytics,
+}
+
+
+# ==================== BLOBS ====================
+
+def upload_blob_id(path) -> Optional[str]:
+    """Blob ID of an upload file, or None if the path is not in the uploads directory"""
+    path = Path(path)
+    if path.resolve().parent != UPLOAD_DIR.resolve():
+        return None
+    return f"upload:{path.name}"
+
+
+def _upload_path(blob_id: str) -> Path:
+    return UPLOAD_DIR / blob_id.split(":", 1)[1]
+
+
+def _artifact_dir(upload_path: Path) -> Path:
+    return upload_path.with_name(upload_path.name + ".cols")  # match_table.artifact_dir
+
+
+def _tree_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return 0
+
+
+def _tree_mtime(path: Path) -> Optional[datetime]:
+    try:
+        return datetime.fromtimestamp(path.stat().st_mtime)
+    except OSError:
+        return None
+
+
+def blob_size(blob_id: str) -> int:
+    """Bytes on disk of a blob"""
+    kind, name = blob_id.split(":", 1)
+    if kind == "upload":
+        path = _upload_path(blob_id)
+        return _tree_size(path) + _tree_size(_artifact_dir(path))
+    if kind == "match":
+        return match_store.size(name)
+    if kind == "charts":
+        return _tree_size(CHARTS_DIR / name)
+    if kind == "export":
+        return _tree_size(EXPORT_DIR / name)
+    if kind == "results":
+        return _tree_size(results_path(name))
+    return 0
+
+
+def _delete_blob_files(blob_id: str):
+    kind, name = blob_id.split(":", 1)
+    if kind == "upload":
+        path = _upload_path(blob_id)
+        path.unlink(missing_ok=True)
+        shutil.rmtree(_artifact_dir(path), ignore_errors=True)
+    elif kind == "match":
+        match_store.delete(name)
+    elif kind == "charts":
+        shutil.rmtree(CHARTS_DIR / name, ignore_errors=True)
+    elif kind == "export":
+        (EXPORT_DIR / name).unlink(missing_ok=True)
+    elif kind == "results":
+        results_path(name).unlink(missing_ok=True)
+
+
+def _blob_exists(blob_id: str) -> bool:
+    kind, name = blob_id.split(":", 1)
+    if kind == "upload":
+        return _upload_path(blob_id).exists()
+    if kind == "match":
+        return bool(match_store.files(name))
+    if kind == "charts":
+        return (CHARTS_DIR / name).exists()
+    if kind == "results":
+        return results_path(name).exists()
+    return (EXPORT_DIR / name).exists()
+
+
+def _last_touched(blob_id: str) -> Optional[datetime]:
+    kind, name = blob_id.split(":", 1)
+    if kind == "match":
+        times = [_tree_mtime(path) for path in match_store.files(name)]
+        return max((t for t in times if t), default=None)
+    if kind == "results":
+        return _tree_mtime(results_path(name))
+    return None
+
+
+def ensure_blob(db: Session, blob_id: str, user_id: Optional[str] = None, team_id: Optional[str] = None,
+                since: Optional[datetime] = None) -> DBStoredBlob:
+    """Tracked blob for an ID (created unreferenced and measured if new)"""
+    blob = db.query(DBStoredBlob).filter(DBStoredBlob.id == blob_id).first()
+    if blob is None:
+        blob = DBStoredBlob(
+            id=blob_id, kind=blob_id.split(":", 1)[0], size_bytes=blob_size(blob_id), ref_count=0,
+            user_id=user_id, team_id=team_id, unreferenced_since=since or datetime.utcnow()
+        )
+        db.add(blob)
+        db.flush()
+    return blob
+
+
+def refresh_blob_size(db: Session, blob_id: str):
+    """Re-measure a blob whose content grew (charts rendered on demand...)"""
+    blob = db.query(DBStoredBlob).filter(DBStoredBlob.id == blob_id).first()
+    if blob is not None:
+        blob.size_bytes = blob_size(blob_id)
+
+
+# ==================== REFERENCES ====================
+
+def add_ref(db: Session, holder_kind: str, holder_id: str, blob: DBStoredBlob):
+    """Reference a blob (no-op if the holder already does)"""
+    exists = db.query(DBStoredBlobRef).filter(
+        DBStoredBlobRef.holder_kind == holder_kind,
+        DBStoredBlobRef.holder_id == holder_id,
+        DBStoredBlobRef.blob_id == blob.id
+    ).first()
+    if exists:
+        return
+    db.add(DBStoredBlobRef(holder_kind=holder_kind, holder_id=holder_id, blob_id=blob.id))
+    blob.ref_count = (blob.ref_count or 0) + 1
+    blob.unreferenced_since = None
+
+
+def drop_refs(db: Session, holder_kind: str, holder_id: str, kind: Optional[str] = None):
+    """Drop every reference of a holder, or only those to blobs of one kind (they become collectable once unreferenced)"""
+    query = db.query(DBStoredBlobRef).filter(
+        DBStoredBlobRef.holder_kind == holder_kind,
+        DBStoredBlobRef.holder_id == holder_id
+    )
+    if kind:
+        query = query.filter(DBStoredBlobRef.blob_id.like(f"{kind}:%"))
+    refs = query.all()
+    if not refs:
+        return
+    now = datetime.utcnow()
+    blobs = db.query(DBStoredBlob).filter(DBStoredBlob.id.in_([ref.blob_id for ref in refs])).all()
+    for blob in blobs:
+        blob.ref_count = max((blob.ref_count or 0) - 1, 0)
+        if blob.ref_count == 0:
+            blob.unreferenced_since = now
+    for ref in refs:
+        db.delete(ref)
+
+
+def register_upload(db: Session, path, user_id: Optional[str], keys: Iterable[str],
+                    since: Optional[datetime] = None) -> Optional[DBStoredBlob]:
+    """Track a new upload and reference the store matches (and timelines) it lists"""
+    blob_id = upload_blob_id(path)
+    if blob_id is None:
+        return None
+    upload = ensure_blob(db, blob_id, user_id=user_id, since=since)
+
+    match_ids = [f"match:{key}" for key in dict.fromkeys(keys)]
+    existing = {
+        blob.id: blob for blob in db.query(DBStoredBlob).filter(DBStoredBlob.id.in_(match_ids)).all()
+    } if match_ids else {}
+    referenced = {
+        ref.blob_id for ref in db.query(DBStoredBlobRef).filter(
+            DBStoredBlobRef.holder_kind == "blob", DBStoredBlobRef.holder_id == blob_id
+        ).all()
+    }
+    now = datetime.utcnow()
+    for match_id in match_ids:
+        blob = existing.get(match_id)
+        if blob is None:
+            blob = DBStoredBlob(id=match_id, kind="match", ref_count=0, unreferenced_since=now)
+            db.add(blob)
+        # Sizes change when a timeline is added to a known match
+        blob.size_bytes = blob_size(match_id)
+        if match_id not in referenced:
+            db.add(DBStoredBlobRef(holder_kind="blob", holder_id=blob_id, blob_id=match_id))
+            blob.ref_count = (blob.ref_count or 0) + 1
+            blob.unreferenced_since = None
+    db.flush()
+    return upload
+
+
+def release_store_keys(db: Session, keys: Iterable[str]):
+    """Track the store matches (and timelines) a rejected upload wrote: collected after the grace period unless an upload references them"""
+    for key in dict.fromkeys(keys):
+        ensure_blob(db, f"match:{key}")
+    db.commit()
+
+
+def register_analytics(db: Session, holder_kind: str, holder_id: str, paths: Iterable[str],
+                       user_id: Optional[str] = None, team_id: Optional[str] = None):
+    """Reference the upload files of a saved analysis"""
+    for path in paths:
+        blob_id = upload_blob_id(path)
+        if blob_id is None or not Path(path).exists():
+            continue
+        blob = ensure_blob(db, blob_id, user_id=user_id)
+        if team_id:
+            # The upload and the charts computed from it now count for the team
+            blob.team_id = team_id
+            charts = db.query(DBStoredBlobRef.blob_id).filter(
+                DBStoredBlobRef.holder_kind == "blob", DBStoredBlobRef.holder_id == blob_id
+            )
+            db.query(DBStoredBlob).filter(
+                DBStoredBlob.kind == "charts", DBStoredBlob.id.in_(charts)
+            ).update({DBStoredBlob.team_id: team_id}, synchronize_session=False)
+        add_ref(db, holder_kind, holder_id, blob)
+
+
+def attach_results(db: Session, holder_kind: str, analytics, results: dict,
+                   user_id: Optional[str] = None, team_id: Optional[str] = None):
+    """Store the results of a saved analysis row in the results store (replacing its previous ones)"""
+    results_id = put_results(results)
+    if analytics.results_blob_id != results_id:
+        drop_refs(db, holder_kind, analytics.id, kind="results")
+    analytics.results_blob_id = results_id
+    analytics.analysis_results = None
+    add_ref(db, holder_kind, analytics.id, ensure_blob(db, f"results:{results_id}", user_id=user_id, team_id=team_id))
+
+
+def release_analytics(db: Session, holder_kind: str, holder_id: str):
+    """Drop the references of a deleted analysis"""
+    drop_refs(db, holder_kind, holder_id)
+
+
+def register_charts(db: Session, analysis_id: str, data_file):
+    """Track the chart directory of an analysis, held by its upload"""
+    upload_id = upload_blob_id(data_file)
+    if upload_id is None or not is_analysis_id(analysis_id) or not (CHARTS_DIR / analysis_id).exists():
+        return
+    upload = db.query(DBStoredBlob).filter(DBStoredBlob.id == upload_id).first()
+    if upload is None:
+        return
+    charts = ensure_blob(db, f"charts:{analysis_id}", user_id=upload.user_id, team_id=upload.team_id)
+    charts.size_bytes = blob_size(charts.id)
+    add_ref(db, "blob", upload_id, charts)
+
+
+# ==================== GARBAGE COLLECTION ====================
+
+def drop_orphan_refs(db: Session, batch: int = STORAGE_GC_BATCH) -> int:
+    """Drop references held by analyses that no longer exist. Returns the holders released."""
+    released = 0
+    for holder_kind, model in _HOLDER_TABLES.items():
+        orphans = db.query(DBStoredBlobRef.holder_id).filter(
+            DBStoredBlobRef.holder_kind == holder_kind,
+            ~db.query(model.id).filter(model.id == DBStoredBlobRef.holder_id).exists()
+        ).distinct().limit(batch).all()
+        for (holder_id,) in orphans:
+            drop_refs(db, holder_kind, holder_id)
+            released += 1
+    return released
+
+
+def collect_garbage(db: Session, batch: int = STORAGE_GC_BATCH, now: Optional[datetime] = None) -> Dict[str, int]:
+    """One incremental GC pass: delete up to `batch` expired unreferenced blobs"""
+    now = now or datetime.utcnow()
+    released = drop_orphan_refs(db, batch)
+    db.flush()
+
+    upload_cutoff = now - timedelta(days=STORAGE_UPLOAD_RETENTION_DAYS)
+    grace_cutoff = now - timedelta(minutes=STORAGE_GC_GRACE_MINUTES)
+    candidates = db.query(DBStoredBlob).filter(
+        DBStoredBlob.ref_count == 0,
+        or_(
+            and_(DBStoredBlob.kind == "upload", DBStoredBlob.unreferenced_since <= upload_cutoff),
+            and_(DBStoredBlob.kind != "upload", DBStoredBlob.unreferenced_since <= grace_cutoff)
+        )
+    ).order_by(DBStoredBlob.unreferenced_since).limit(batch).all()
+
+    deleted = freed = 0
+    for blob in candidates:
+        # Picked up again by an upload that is still being ingested
+        touched = _last_touched(blob.id)
+        if touched and touched > grace_cutoff:
+            blob.unreferenced_since = now
+            continue
+        freed += blob_size(blob.id)
+        _delete_blob_files(blob.id)
+        drop_refs(db, "blob", blob.id)
+        db.delete(blob)
+        deleted += 1
+
+    db.commit()
+    return {"released_holders": released, "deleted": deleted, "freed_bytes": freed}
+
+
+def reconcile_storage(db: Session) -> Dict[str, int]:
+    """
+    Full scan: track every file already on disk and every saved analysis
+    reference, and forget blobs whose files are gone. Only needed once (for
+    data written before the storage manager) or after manual changes.
+    """
+    known = {blob_id for (blob_id,) in db.query(DBStoredBlob.id).all()}
+    added = 0
+
+    # Uploads and the matches they list
+    for path in UPLOAD_DIR.glob("analytics_data_*.json"):
+        blob_id = upload_blob_id(path)
+        if blob_id in known:
+            continue
+        keys = list(dict.fromkeys((read_manifest(path) or []) + (read_manifest(path, "timeline_refs") or [])))
+        register_upload(db, path, None, keys, since=_tree_mtime(path))
+        known.add(blob_id)
+        known.update(f"match:{key}" for key in keys)
+        added += 1
+
+    # Stored matches no upload lists
+    for key in match_store.keys():
+        if f"match:{key}" not in known:
+            ensure_blob(db, f"match:{key}")
+            added += 1
+
+    # Chart directories (held by their upload) and legacy fixed-name charts
+    if CHARTS_DIR.exists():
+        for path in CHARTS_DIR.iterdir():
+            if path.is_dir() and is_analysis_id(path.name) and f"charts:{path.name}" not in known:
+                from analysis_cache import read_chart_manifest
+                manifest = read_chart_manifest(path.name) or {}
+                upload_id = upload_blob_id(manifest["data_file"]) if manifest.get("data_file") else None
+                if upload_id in known:
+                    register_charts(db, path.name, manifest["data_file"])
+                else:
+                    ensure_blob(db, f"charts:{path.name}", since=_tree_mtime(path))
+                added += 1
+    for path in list(EXPORT_DIR.glob("*.png")) + list(CHARTS_DIR.glob("*.png")):
+        blob_id = f"export:{path.relative_to(EXPORT_DIR).as_posix()}"
+        if blob_id not in known:
+            ensure_blob(db, blob_id, since=_tree_mtime(path))
+            added += 1
+
+    # Saved analyses
+    for analytics in db.query(
+        DBUserAnalytics.id, DBUserAnalytics.user_id, DBUserAnalytics.data_path, DBUserAnalytics.results_blob_id
+    ).all():
+        register_analytics(db, "user_analytics", analytics.id, [analytics.data_path], user_id=analytics.user_id)
+        if analytics.results_blob_id and results_path(analytics.results_blob_id).exists():
+            add_ref(db, "user_analytics", analytics.id,
+                    ensure_blob(db, f"results:{analytics.results_blob_id}", user_id=analytics.user_id))
+    for analytics in db.query(
+        DBTeamAnalytics.id, DBTeamAnalytics.team_id, DBTeamAnalytics.created_by_id,
+        DBTeamAnalytics.data_path, DBTeamAnalytics.aggregates, DBTeamAnalytics.results_blob_id
+    ).all():
+        sources = [analytics.data_path] + list((analytics.aggregates or {}).get("sources", []))
+        register_analytics(db, "team_analytics", analytics.id, dict.fromkeys(sources),
+                           user_id=analytics.created_by_id, team_id=analytics.team_id)
+        if analytics.results_blob_id and results_path(analytics.results_blob_id).exists():
+            add_ref(db, "team_analytics", analytics.id, ensure_blob(
+                db, f"results:{analytics.results_blob_id}",
+                user_id=analytics.created_by_id, team_id=analytics.team_id
+            ))
+
+    # Blobs whose files were removed by hand
+    forgotten = 0
+    for blob in db.query(DBStoredBlob).all():
+        if not _blob_exists(blob.id):
+            drop_refs(db, "blob", blob.id)
+            db.query(DBStoredBlobRef).filter(DBStoredBlobRef.blob_id == blob.id).delete()
+            db.delete(blob)
+            forgotten += 1
+
+    db.commit()
+    return {"added": added, "forgotten": forgotten}
+
+
+def storage_needs_reconcile(db: Session) -> bool:
+    """Whether nothing is tracked yet (first run after deploying the storage manager)"""
+    return db.query(DBStoredBlob.id).first() is None
+
+
+# ==================== USAGE ====================
+
+def storage_usage(db: Session, limit: int = 50) -> Dict[str, Any]:
+    """Disk usage by blob kind, and per user / per team (own files + fair share of shared matches)"""
+    kinds = {
+        kind: {"count": count, "bytes": int(size or 0)}
+        for kind, count, size in db.query(
+            DBStoredBlob.kind, func.count(DBStoredBlob.id), func.sum(DBStoredBlob.size_bytes)
+        ).group_by(DBStoredBlob.kind).all()
+    }
+    unreferenced = db.query(func.count(DBStoredBlob.id), func.sum(DBStoredBlob.size_bytes)).filter(
+        DBStoredBlob.ref_count == 0
+    ).first()
+
+    upload, match = aliased(DBStoredBlob), aliased(DBStoredBlob)
+
+    def owners(column_name: str) -> Dict[str, Dict[str, int]]:
+        own_column = getattr(DBStoredBlob, column_name)
+        usage: Dict[str, Dict[str, int]] = {}
+        for owner_id, size in db.query(own_column, func.sum(DBStoredBlob.size_bytes)).filter(
+            own_column.isnot(None)
+        ).group_by(own_column).all():
+            usage.setdefault(owner_id, {"own_bytes": 0, "shared_bytes": 0})["own_bytes"] = int(size or 0)
+        # Matches are shared by every upload listing them: each gets size / references
+        upload_owner = getattr(upload, column_name)
+        for owner_id, share in db.query(
+            upload_owner, func.sum(match.size_bytes * 1.0 / func.max(match.ref_count, 1))
+        ).join(
+            DBStoredBlobRef, and_(DBStoredBlobRef.holder_kind == "blob", DBStoredBlobRef.holder_id == upload.id)
+        ).join(
+            match, and_(match.id == DBStoredBlobRef.blob_id, match.kind == "match")
+        ).filter(upload_owner.isnot(None)).group_by(upload_owner).all():
+            usage.setdefault(owner_id, {"own_bytes": 0, "shared_bytes": 0})["shared_bytes"] = int(share or 0)
+        return usage
+
+    def ranked(usage: Dict[str, Dict[str, int]], names: Dict[str, str]) -> List[Dict[str, Any]]:
+        rows = [
+            {"id": owner_id, "name": names.get(owner_id), **counts,
+             "total_bytes": counts["own_bytes"] + counts["shared_bytes"]}
+            for owner_id, counts in usage.items()
+        ]
+        return sorted(rows, key=lambda r: r["total_bytes"], reverse=True)[:limit]
+
+    users = owners("user_id")
+    teams = owners("team_id")
+    user_names = dict(db.query(DBUser.id, DBUser.username).filter(DBUser.id.in_(list(users))).all()) if users else {}
+    team_names = dict(db.query(DBTeam.id, DBTeam.name).filter(DBTeam.id.in_(list(teams))).all()) if teams else {}
+
+    return {
+        "total_bytes": sum(k["bytes"] for k in kinds.values()),
+        "kinds": kinds,
+        "unreferenced": {"count": unreferenced[0] or 0, "bytes": int(unreferenced[1] or 0)},
+        "users": ranked(users, user_names),
+        "teams": ranked(teams, team_names),
+    }
@@ -0,0 +1,279 @@
+"""
+Champion synergy & matchup matrices ("Mode Équipe")
+
+From the participant rows of a MatchTable, for the team's side of each game:
+
+- ally pairs:   champion x champion games / wins played together
+                (one-hot champions per game X: games = X.T @ X)
+- matchups:     per lane, team champion x lane-opponent champion games / wins
+- compositions: full 5-champion lineups, games / wins
+
+Everything is computed in bulk with array operations. Results are cached per
+team on disk together with the matchIds and upload files already counted, so
+adding matches only processes the new ones.
+"""
+import io
+import os
+import numpy as np
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from match_table import LANE_POSITIONS, MatchTable
+from match_store import load_match_table
+
+SYNERGY_CACHE_DIR = Path(os.getenv(
+    "SYNERGY_CACHE_DIR", str(Path(__file__).parent.parent / "data" / "synergy")
+))
+
+# Bump whenever the matrices change meaning (stale caches are rebuilt)
+SYNERGY_VERSION = 2
+
+# Lineups of other sizes (remakes, incomplete data) are not counted as compositions
+COMPOSITION_SIZE = 5
+
+
+class SynergyMatrices:
+    """Co-occurrence / win counts indexed by a champion vocabulary"""
+
+    def __init__(self, champions: Optional[List[str]] = None):
+        self.champions: List[str] = list(champions or [])
+        n = len(self.champions)
+        self.ally_games = np.zeros((n, n), dtype=np.int64)
+        self.ally_wins = np.zeros((n, n), dtype=np.int64)
+        self.matchup_games = np.zeros((len(LANE_POSITIONS), n, n), dtype=np.int64)
+        self.matchup_wins = np.zeros((len(LANE_POSITIONS), n, n), dtype=np.int64)
+        # "ChampA|ChampB|..." (sorted names) -> [games, wins]
+        self.compositions: Dict[str, List[int]] = {}
+        self.match_ids: List[str] = []
+        self.sources: List[str] = []
+
+    @property
+    def match_count(self) -> int:
+        return len(self.match_ids)
+
+    # ==================== BUILD ====================
+
+    @classmethod
+    def from_table(cls, table: MatchTable, team_riot_ids: List[str]) -> "SynergyMatrices":
+        """Matrices of every game of `table` in which the team plays"""
+        champions = list(table.vocabs["champion"])
+        result = cls(champions)
+        n_matches, n_champions = table.match_count, len(champions)
+        if not len(table) or not n_matches:
+            return result
+
+        match_index = np.asarray(table.columns["match_index"]).astype(np.int64)
+        champion = np.asarray(table.columns["champion"]).astype(np.int64)
+        position = np.asarray(table.columns["position"]).astype(np.int64)
+        win = np.asarray(table.columns["win"])
+        blue = np.asarray(table.columns["team_id"]) == 100
+
+        # The team's side of each game: the side where most of its members are
+        _, _, _, is_team = table.player_groups(team_riot_ids)
+        side_members = np.bincount(match_index[is_team] * 2 + blue[is_team], minlength=2 * n_matches).reshape(-1, 2)
+        played = side_members.sum(axis=1) > 0
+        team_blue = side_members[:, 1] > side_members[:, 0]
+        team_side = played[match_index] & (blue == team_blue[match_index])
+
+        rows = np.flatnonzero(team_side)
+        game_won = np.zeros(n_matches, dtype=bool)
+        game_won[match_index[rows]] = win[rows]
+
+        # Ally pairs: one-hot champions per game
+        one_hot = np.zeros((n_matches, n_champions), dtype=np.int64)
+        one_hot[match_index[rows], champion[rows]] = 1
+        result.ally_games = one_hot.T @ one_hot
+        result.ally_wins = one_hot.T @ (one_hot * game_won[:, None])
+
+        # Lane matchups: team row vs its lane opponent
+        opponent = table.lane_opponents()
+        laned = rows[opponent[rows] >= 0]
+        lane_of_code = np.array([
+            LANE_POSITIONS.index(p) if p in LANE_POSITIONS else -1 for p in table.vocabs["position"]
+        ], dtype=np.int64)
+        lanes = lane_of_code[position[laned]]
+        ours, theirs = champion[laned], champion[opponent[laned]]
+        np.add.at(result.matchup_games, (lanes, ours, theirs), 1)
+        np.add.at(result.matchup_wins, (lanes, ours, theirs), win[laned].astype(np.int64))
+
+        # Compositions: games with a full lineup, champions sorted by name
+        lineup_size = np.bincount(match_index[rows], minlength=n_matches)
+        full = rows[lineup_size[match_index[rows]] == COMPOSITION_SIZE]
+        if len(full):
+            name_rank = np.argsort(np.argsort(np.asarray(champions, dtype=object)))
+            order = full[np.lexsort((name_rank[champion[full]], match_index[full]))]
+            lineups = champion[order].reshape(-1, COMPOSITION_SIZE)
+            lineup_won = game_won[match_index[order][::COMPOSITION_SIZE]].astype(np.int64)
+            unique, inverse = np.unique(lineups, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            games = np.bincount(inverse, minlength=len(unique))
+            wins = np.bincount(inverse, weights=lineup_won, minlength=len(unique)).astype(np.int64)
+            for lineup, g, w in zip(unique.tolist(), games.tolist(), wins.tolist()):
+                result.compositions["|".join(champions[c] for c in lineup)] = [g, w]
+
+        result.match_ids = [m for m, p in zip(table.matches["match_id"], played.tolist()) if p]
+        return result
+
+    def merge(self, other: "SynergyMatrices"):
+        """Add the counts of `other` (any champion vocabulary) into this one"""
+        index = {name: i for i, name in enumerate(self.champions)}
+        for name in other.champions:
+            if name not in index:
+                index[name] = len(self.champions)
+                self.champions.append(name)
+
+        n, old = len(self.champions), self.ally_games.shape[0]
+        if n > old:
+            for name in ("ally_games", "ally_wins"):
+                grown = np.zeros((n, n), dtype=np.int64)
+                grown[:old, :old] = getattr(self, name)
+                setattr(self, name, grown)
+            for name in ("matchup_games", "matchup_wins"):
+                grown = np.zeros((len(LANE_POSITIONS), n, n), dtype=np.int64)
+                grown[:, :old, :old] = getattr(self, name)
+                setattr(self, name, grown)
+
+        codes = np.array([index[name] for name in other.champions], dtype=np.int64)
+        if len(codes):
+            self.ally_games[np.ix_(codes, codes)] += other.ally_games
+            self.ally_wins[np.ix_(codes, codes)] += other.ally_wins
+            self.matchup_games[:, codes[:, None], codes[None, :]] += other.matchup_games
+            self.matchup_wins[:, codes[:, None], codes[None, :]] += other.matchup_wins
+
+        for key, (games, wins) in other.compositions.items():
+            counts = self.compositions.setdefault(key, [0, 0])
+            counts[0] += games
+            counts[1] += wins
+        self.match_ids.extend(other.match_ids)
+
+    # ==================== ON-DISK CACHE ====================
+
+    def to_bytes(self, roster: List[str]) -> bytes:
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            version=np.int64(SYNERGY_VERSION),
+            roster=np.asarray(sorted(roster), dtype=str),
+            champions=np.asarray(self.champions, dtype=str),
+            ally_games=self.ally_games, ally_wins=self.ally_wins,
+            matchup_games=self.matchup_games, matchup_wins=self.matchup_wins,
+            composition_keys=np.asarray(list(self.compositions), dtype=str),
+            composition_counts=np.asarray(list(self.compositions.values()), dtype=np.int64).reshape(-1, 2),
+            match_ids=np.asarray(self.match_ids, dtype=str),
+            sources=np.asarray(self.sources, dtype=str),
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, roster: List[str]) -> Optional["SynergyMatrices"]:
+        """Cached matrices, or None if they are from another version or team roster"""
+        with np.load(io.BytesIO(data), allow_pickle=False) as stored:
+            if int(stored["version"]) != SYNERGY_VERSION or stored["roster"].tolist() != sorted(roster):
+                return None
+            result = cls(stored["champions"].tolist())
+            for name in ("ally_games", "ally_wins", "matchup_games", "matchup_wins"):
+                setattr(result, name, stored[name])
+            result.compositions = dict(zip(stored["composition_keys"].tolist(), stored["composition_counts"].tolist()))
+            result.match_ids = stored["match_ids"].tolist()
+            result.sources = stored["sources"].tolist()
+        return result
+
+    # ==================== REPORT ====================
+
+    def report(self, min_games: int = 1, limit: int = 50) -> Dict[str, Any]:
+        """Pairs, matchups and compositions with at least `min_games` games, most played first"""
+        def entry(games, wins, **fields):
+            fields.update(games=int(games), wins=int(wins), losses=int(games - wins),
+                          winrate=round(wins / games * 100, 1) if games else 0)
+            return fields
+
+        champions = self.champions
+        a, b = np.nonzero(np.triu(self.ally_games, k=1) >= max(min_games, 1))
+        pair_games = self.ally_games[a, b]
+        pairs = [
+            entry(pair_games[i], self.ally_wins[a[i], b[i]], champions=sorted([champions[a[i]], champions[b[i]]]))
+            for i in np.argsort(-pair_games, kind="stable")[:limit]
+        ]
+
+        picks = np.diagonal(self.ally_games)
+        played = np.flatnonzero(picks >= max(min_games, 1))
+        champion_stats = [
+            entry(picks[c], np.diagonal(self.ally_wins)[c], champion=champions[c])
+            for c in played[np.argsort(-picks[played], kind="stable")]
+        ]
+
+        lane, ours, theirs = np.nonzero(self.matchup_games >= max(min_games, 1))
+        matchup_games = self.matchup_games[lane, ours, theirs]
+        matchups = [
+            entry(matchup_games[i], self.matchup_wins[lane[i], ours[i], theirs[i]],
+                  position=LANE_POSITIONS[lane[i]], champion=champions[ours[i]], opponent=champions[theirs[i]])
+            for i in np.argsort(-matchup_games, kind="stable")[:limit]
+        ]
+
+        compositions = sorted(
+            (entry(games, wins, champions=key.split("|"))
+             for key, (games, wins) in self.compositions.items() if games >= min_games),
+            key=lambda c: c["games"], reverse=True
+        )[:limit]
+
+        return {
+            "matches": self.match_count,
+            "champions": champion_stats,
+            "pairs": pairs,
+            "matchups": matchups,
+            "compositions": compositions,
+        }
+
+
+def _cache_path(team_id: str) -> Path:
+    return SYNERGY_CACHE_DIR / f"{team_id}.npz"
+
+
+def update_team_synergy(team_id: str, sources: List[str], team_riot_ids: List[str]) -> SynergyMatrices:
+    """
+    Team matrices including every match of `sources` (upload files). Only the
+    files not counted yet are loaded, and matches already counted are skipped.
+    The cache is rebuilt if the roster changed or a counted file was removed.
+    """
+    path = _cache_path(team_id)
+    matrices = None
+    try:
+        with open(path, "rb") as f:
+            matrices = SynergyMatrices.from_bytes(f.read(), team_riot_ids)
+    except (OSError, ValueError, KeyError):
+        pass
+    # A counted file is no longer part of the team's analyses (deleted): start over
+    if matrices is None or not set(matrices.sources) <= set(sources):
+        matrices = SynergyMatrices()
+
+    counted_sources = set(matrices.sources)
+    seen = set(matrices.match_ids)
+    changed = False
+    for source in sources:
+        if source in counted_sources or not Path(source).exists():
+            continue
+        table = load_match_table(Path(source))
+        keep = np.array([bool(m) and m not in seen for m in table.matches["match_id"]], dtype=bool)
+        if keep.any():
+            new = SynergyMatrices.from_table(table.take_matches(keep), team_riot_ids)
+            seen.update(new.match_ids)
+            matrices.merge(new)
+        matrices.sources.append(source)
+        counted_sources.add(source)
+        changed = True
+
+    if changed:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(matrices.to_bytes(team_riot_ids))
+        os.replace(tmp_path, path)
+    return matrices
+
+
+def team_synergy_report(team_id: str, sources: List[str], team_riot_ids: List[str],
+                        min_games: int = 1) -> Dict[str, Any]:
+    """Up-to-date synergy / matchup / composition report of a team"""
+    report = update_team_synergy(team_id, sources, team_riot_ids).report(min_games=min_games)
+    report["team_id"] = team_id
+    return report
@@ -1,13 +1,15 @@
 """
 Team management schemas and CRUD operations
 """
+import threading
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 
 from database import Team as DBTeam, TeamInvite as DBTeamInvite, Scrim as DBScrim, JoinRequest as DBJoinRequest, team_members, User as DBUser
+from services.riot_api import riot_id_key
 
 
 # ==================== SCHEMAS ====================
@@ -171,6 +173,7 @@ def create_team(db: Session, team_data: TeamCreate, owner_id: str) -> DBTeam:
             .values(role='owner')
         )
         db.commit()
+        invalidate_team_cache(db_team.id)
 
     return db_team
 
@@ -221,64 +224,180 @@ def update_team(db: Session, team_id: str, team_data: TeamUpdate) -> DBTeam:
         team.is_locked = team_data.is_locked
 
     db.commit()
+    invalidate_team_cache(team.id)
     db.refresh(team)
     return team
 
 
 def get_team_members_with_roles(db: Session, team_id: str) -> List[dict]:
-    """Get team members with their roles and summoner data"""
-    from sqlalchemy import text
-    from database import SummonerData
-
-    result = db.execute(
-        text("""
-        SELECT u.id, u.username, u.email, u.riot_game_name, u.riot_tag_line,
-               u.discord, tm.role, tm.joined_at
-        FROM users u
-        JOIN team_members tm ON u.id = tm.user_id
-        WHERE tm.team_id = :team_id
-        ORDER BY tm.joined_at
-        """),
-        {"team_id": team_id}
-    ).fetchall()
-
-    members = []
-    for row in result:
-        member_data = {
-            "id": row[0],
-            "username": row[1],
-            "email": row[2],
-            "riot_game_name": row[3],
-            "riot_tag_line": row[4],
-            "discord": row[5],
-            "role": row[6],
-            "joined_at": row[7],
-            # Add summoner data fields
-            "summoner_level": None,
-            "profile_icon_id": None,
-            "solo_tier": None,
-            "solo_rank": None,
-            "solo_lp": None,
-            "preferred_lane": None,
-            "top_champions": []
-        }
-
-        # Fetch summoner data if exists
-        summoner = db.query(SummonerData).filter(SummonerData.user_id == row[0]).first()
-        if summoner:
-            member_data.update({
-                "summoner_level": summoner.summoner_level,
-                "profile_icon_id": summoner.profile_icon_id,
-                "solo_tier": summoner.solo_tier,
-                "solo_rank": summoner.solo_rank,
-                "solo_lp": summoner.solo_lp,
-                "preferred_lane": summoner.preferred_lane,
-                "top_champions": summoner.top_champions or []
+    """Get team members with their roles and summoner data (shared list: do not modify it)"""
+    return get_team_rosters(db, [team_id])[team_id]
+
+
+def build_team_responses(db: Session, teams: List[DBTeam]) -> List[TeamResponse]:
+    """TeamResponse of each team, with its roster (one query for all uncached rosters)"""
+    rosters = get_team_rosters(db, [team.id for team in teams])
+    return [
+        TeamResponse(
+            id=team.id,
+            name=team.name,
+            tag=team.tag,
+            description=team.description,
+            owner_id=team.owner_id,
+            created_at=team.created_at,
+            team_color=team.team_color,
+            max_members=team.max_members,
+            member_count=len(rosters[team.id]),
+            members=rosters[team.id],
+            is_locked=team.is_locked
+        )
+        for team in teams
+    ]
+
+
+def build_team_response(db: Session, team: DBTeam) -> TeamResponse:
+    """TeamResponse of a team, with its roster"""
+    return build_team_responses(db, [team])[0]
+
+
+# ==================== RIOT ID INDEX ====================
+
+# team_id -> {riot_id_key: member entry}, built on first use and dropped on any roster change
+_riot_id_index: Dict[str, Dict[str, dict]] = {}
+_riot_id_index_lock = threading.Lock()
+
+
+def invalidate_team_cache(team_id: str):
+    """Forget a team's cached Riot-ID index and roster (members, their profiles or the team changed)"""
+    global _roster_generation
+    with _riot_id_index_lock:
+        _riot_id_index.pop(team_id, None)
+        _team_rosters.pop(team_id, None)
+        _roster_generation += 1
+
+
+def invalidate_user_team_caches(user: DBUser):
+    """Forget the Riot-ID index and roster of every team of a user (their profile or summoner data changed)"""
+    for team in user.teams:
+        invalidate_team_cache(team.id)
+
+
+def get_team_riot_id_index(db: Session, team: DBTeam) -> Dict[str, dict]:
+    """
+    Team members with a Riot ID, keyed by riot_id_key() (one query, no
+    summoner data). Entries have "riot_id", "game_name", "tag_line", "user_id",
+    "team_id" and "team_name". The returned dict is shared: do not modify it.
+    """
+    with _riot_id_index_lock:
+        index = _riot_id_index.get(team.id)
+    if index is not None:
+        return index
+
+    rows = db.query(DBUser.id, DBUser.riot_game_name, DBUser.riot_tag_line).join(
+        team_members, team_members.c.user_id == DBUser.id
+    ).filter(
+        team_members.c.team_id == team.id,
+        DBUser.riot_game_name.isnot(None),
+        DBUser.riot_tag_line.isnot(None)
+    ).order_by(team_members.c.joined_at).all()
+
+    index = {}
+    for user_id, game_name, tag_line in rows:
+        if game_name and tag_line:
+            index.setdefault(riot_id_key(game_name, tag_line), {
+                "riot_id": f"{game_name}#{tag_line}",
+                "game_name": game_name,
+                "tag_line": tag_line,
+                "user_id": user_id,
+                "team_id": team.id,
+                "team_name": team.name
             })
 
-        members.append(member_data)
+    with _riot_id_index_lock:
+        _riot_id_index[team.id] = index
+    return index
+
+
+def get_team_riot_ids(db: Session, team: DBTeam) -> List[str]:
+    """Riot IDs ("Name#TAG") of the team members who configured one"""
+    return [member["riot_id"] for member in get_team_riot_id_index(db, team).values()]
+
+
+# ==================== TEAM ROSTERS ====================
+
+# team_id -> member dicts (role + summoner data), ordered by joined_at. Read
+# model of get_team_members_with_roles(): built on first use, dropped with the
+# Riot-ID index (invalidate_team_cache) on roster, profile and summoner changes.
+# Shares _riot_id_index_lock
+_team_rosters: Dict[str, List[dict]] = {}
+# Bumped on every invalidation: a roster loaded meanwhile may be stale, it isn't cached
+_roster_generation = 0
+
+# Teams per roster query (bound parameters of the IN list)
+ROSTER_QUERY_BATCH = 500
+
+
+def _load_rosters(db: Session, team_ids: List[str]) -> Dict[str, List[dict]]:
+    """Members of the given teams: users, roles and summoner data in one query"""
+    from database import SummonerData
 
-    return members
+    rows = db.query(
+        team_members.c.team_id, team_members.c.role, team_members.c.joined_at,
+        DBUser.id, DBUser.username, DBUser.email, DBUser.riot_game_name, DBUser.riot_tag_line, DBUser.discord,
+        SummonerData.summoner_level, SummonerData.profile_icon_id, SummonerData.solo_tier,
+        SummonerData.solo_rank, SummonerData.solo_lp, SummonerData.preferred_lane, SummonerData.top_champions
+    ).join(
+        DBUser, DBUser.id == team_members.c.user_id
+    ).outerjoin(
+        SummonerData, SummonerData.user_id == DBUser.id
+    ).filter(
+        team_members.c.team_id.in_(team_ids)
+    ).order_by(team_members.c.team_id, team_members.c.joined_at).all()
+
+    rosters = {team_id: [] for team_id in team_ids}
+    for row in rows:
+        rosters[row.team_id].append({
+            "id": row.id,
+            "username": row.username,
+            "email": row.email,
+            "riot_game_name": row.riot_game_name,
+            "riot_tag_line": row.riot_tag_line,
+            "discord": row.discord,
+            "role": row.role,
+            "joined_at": row.joined_at,
+            # Summoner data fields (None without summoner data)
+            "summoner_level": row.summoner_level,
+            "profile_icon_id": row.profile_icon_id,
+            "solo_tier": row.solo_tier,
+            "solo_rank": row.solo_rank,
+            "solo_lp": row.solo_lp,
+            "preferred_lane": row.preferred_lane,
+            "top_champions": row.top_champions or []
+        })
+    return rosters
+
+
+def get_team_rosters(db: Session, team_ids: List[str]) -> Dict[str, List[dict]]:
+    """
+    team_id -> members (get_team_members_with_roles entries) of several teams.
+    Cached rosters are reused; the others are loaded together, one query per
+    ROSTER_QUERY_BATCH teams. The returned lists are shared: do not modify them.
+    """
+    with _riot_id_index_lock:
+        rosters = {team_id: _team_rosters[team_id] for team_id in team_ids if team_id in _team_rosters}
+        generation = _roster_generation
+
+    missing = list(dict.fromkeys(team_id for team_id in team_ids if team_id not in rosters))
+    loaded = {}
+    for start in range(0, len(missing), ROSTER_QUERY_BATCH):
+        loaded.update(_load_rosters(db, missing[start:start + ROSTER_QUERY_BATCH]))
+
+    if loaded:
+        with _riot_id_index_lock:
+            if generation == _roster_generation:
+                _team_rosters.update(loaded)
+        rosters.update(loaded)
+    return rosters
 
 
 def create_team_invite(db: Session, team_id: str, invite_data: InviteCreate, invited_by_id: str) -> DBTeamInvite:
@@ -354,6 +473,8 @@ def accept_team_invite(db: Session, invite_id: str, user_id: str) -> DBTeam:
     # Update invite status
     invite.status = "accepted"
     db.commit()
+    if team:
+        invalidate_team_cache(team.id)
 
     return team
 
@@ -513,6 +634,7 @@ def accept_join_request(db: Session, request_id: str, owner_id: str) -> DBTeam:
     # Update request status
     join_request.status = "accepted"
     db.commit()
+    invalidate_team_cache(team.id)
     db.refresh(team)
 
     return team
@@ -0,0 +1,257 @@
+"""
+Match timelines - Riot match-v5 timeline frames as compact per-minute arrays
+
+A timeline payload (one frame per minute, each with nested participant
+frames) is reduced to one int32 array of shape (participants, minutes,
+TIMELINE_FIELDS) plus the participants' PUUIDs. Arrays of many games are
+stacked on the rows of a MatchTable, so lane-opponent diffs (gold@10/15, CS
+and XP diffs...) are computed for every game at once as array operations.
+"""
+import io
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+from match_table import MatchTable
+
+# Per-participant values kept for every minute
+TIMELINE_FIELDS = ("gold", "xp", "cs", "level", "damage")
+
+# Frames past this minute are dropped
+MAX_TIMELINE_MINUTES = 90
+
+# Participants of a game (10 on Summoner's Rift, 16 in Arena)
+MAX_TIMELINE_PARTICIPANTS = 16
+
+# Minutes of the lane diffs reported by the analytics
+LANE_DIFF_MINUTES = (10, 15)
+
+
+class InvalidTimeline(ValueError):
+    """A timeline payload that doesn't have the match-v5 shape"""
+
+
+def _metadata(timeline: Dict[str, Any]) -> Dict[str, Any]:
+    metadata = timeline.get("metadata")
+    return metadata if isinstance(metadata, dict) else {}
+
+
+def timeline_match_id(timeline: Dict[str, Any]) -> str:
+    return str(_metadata(timeline).get("matchId") or "")
+
+
+def _participant_id(value: Any, limit: int) -> int:
+    """participantId of a participant or frame key: an integer from 1 to `limit`"""
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if not isinstance(value, int) or isinstance(value, bool) or not 1 <= value <= limit:
+        raise InvalidTimeline(f"invalid participantId {str(value)[:20]!r}")
+    return value
+
+
+def timeline_arrays(timeline: Dict[str, Any]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    (frames, puuids) of a timeline payload: frames is int32 (participants,
+    minutes, TIMELINE_FIELDS), indexed by participantId - 1. None if the
+    payload has no frames; raises InvalidTimeline if they are malformed.
+    """
+    info = timeline.get("info") if isinstance(timeline, dict) else None
+    if not isinstance(info, dict) or not isinstance(info.get("frames"), list) or not info["frames"]:
+        return None
+
+    # participantId -> puuid (info.participants on recent payloads, metadata order on older ones)
+    participants = info.get("participants")
+    if not (isinstance(participants, list) and participants):
+        participants = [{"puuid": puuid} for puuid in _metadata(timeline).get("participants") or []]
+    if not isinstance(participants, list) or len(participants) > MAX_TIMELINE_PARTICIPANTS:
+        raise InvalidTimeline("invalid participants")
+    puuid_by_id = {}
+    for i, participant in enumerate(participants):
+        if not isinstance(participant, dict):
+            raise InvalidTimeline("invalid participants")
+        pid = _participant_id(participant.get("participantId", i + 1), MAX_TIMELINE_PARTICIPANTS)
+        puuid_by_id[pid] = str(participant.get("puuid", ""))
+
+    # Frame keys are bounded by the participant count, never by their own values
+    limit = max(puuid_by_id, default=0) or MAX_TIMELINE_PARTICIPANTS
+    frames = info["frames"][:MAX_TIMELINE_MINUTES + 1]
+    participant_frames = []
+    for frame in frames:
+        by_id = frame.get("participantFrames") if isinstance(frame, dict) else None
+        if by_id is None and isinstance(frame, dict):
+            by_id = {}
+        if not isinstance(by_id, dict):
+            raise InvalidTimeline("every frame must be an object with participantFrames")
+        participant_frames.append({_participant_id(pid, limit): pf for pid, pf in by_id.items()})
+
+    n_participants = max([limit if puuid_by_id else 0] + [pid for by_id in participant_frames for pid in by_id])
+    values = np.zeros((n_participants, len(frames), len(TIMELINE_FIELDS)), dtype=np.int32)
+
+    for minute, by_id in enumerate(participant_frames):
+        for pid, pf in by_id.items():
+            if not isinstance(pf, dict):
+                raise InvalidTimeline("every participant frame must be an object")
+            get = pf.get
+            damage_stats = get("damageStats")
+            try:
+                values[pid - 1, minute] = (
+                    get("totalGold", 0) or 0,
+                    get("xp", 0) or 0,
+                    (get("minionsKilled", 0) or 0) + (get("jungleMinionsKilled", 0) or 0),
+                    get("level", 0) or 0,
+                    (damage_stats.get("totalDamageDoneToChampions", 0) or 0) if isinstance(damage_stats, dict) else 0,
+                )
+            except (TypeError, ValueError, OverflowError):
+                raise InvalidTimeline("participant frame values must be integers")
+
+    puuids = np.asarray([puuid_by_id.get(i + 1, "") for i in range(n_participants)], dtype=str)
+    return values, puuids
+
+
+def encode_timeline(frames: np.ndarray, puuids: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.savez(buffer, frames=frames, puuids=puuids)
+    return buffer.getvalue()
+
+
+def decode_timeline(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    with np.load(io.BytesIO(data), allow_pickle=False) as stored:
+        return stored["frames"], stored["puuids"]
+
+
+def timelines_by_match(payloads: Any) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """matchId -> (frames, puuids) of the `timelines` array of an upload"""
+    timelines = {}
+    for payload in payloads if isinstance(payloads, list) else ():
+        try:
+            arrays = timeline_arrays(payload) if isinstance(payload, dict) else None
+        except InvalidTimeline:
+            continue
+        if arrays is not None:
+            timelines[timeline_match_id(payload)] = arrays
+    return timelines
+
+
+def encode_timelines(timelines: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> bytes:
+    """Several timelines in one .npz (match IDs + frames_<i>/puuids_<i>)"""
+    arrays = {"match_ids": np.asarray(list(timelines), dtype=str)}
+    for i, (frames, puuids) in enumerate(timelines.values()):
+        arrays[f"frames_{i}"], arrays[f"puuids_{i}"] = frames, puuids
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def decode_timelines(data: bytes) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    with np.load(io.BytesIO(data), allow_pickle=False) as stored:
+        return {
+            str(match_id): (stored[f"frames_{i}"], stored[f"puuids_{i}"])
+            for i, match_id in enumerate(stored["match_ids"])
+        }
+
+
+class TimelineFrames:
+    """Timelines of a MatchTable's games, stacked on its rows: (rows, minutes, fields)"""
+
+    def __init__(self, table: MatchTable, timelines: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+        self.table = table
+        n_rows = len(table)
+        match_index = np.asarray(table.columns["match_index"])
+
+        n_minutes = max([frames.shape[1] for frames, _ in timelines.values()] + [0])
+        self.values = np.zeros((n_rows, n_minutes, len(TIMELINE_FIELDS)), dtype=np.int32)
+        # Last minute with a frame for each row (-1: no timeline)
+        self.last_minute = np.full(n_rows, -1, dtype=np.int32)
+
+        if not timelines or not n_rows:
+            return
+
+        puuid_vocab = table.strings("puuid")
+        puuid_codes = np.asarray(table.columns["puuid"])
+        starts = np.searchsorted(match_index, np.arange(table.match_count))
+        ends = np.searchsorted(match_index, np.arange(table.match_count), side="right")
+
+        for m, match_id in enumerate(table.matches["match_id"]):
+            stored = timelines.get(match_id)
+            if stored is None or starts[m] == ends[m]:
+                continue
+            frames, puuids = stored
+            rows = np.arange(starts[m], ends[m])
+            # Participants by PUUID, else by order (participantId = position in the match)
+            slot = {p: i for i, p in enumerate(puuids.tolist()) if p}
+            order = np.array([slot.get(puuid_vocab[puuid_codes[r]], r - starts[m]) for r in rows])
+            valid = order < frames.shape[0]
+            self.values[rows[valid], :frames.shape[1]] = frames[order[valid]]
+            self.last_minute[rows[valid]] = frames.shape[1] - 1
+
+    def at(self, minute: int, field: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(value, has value) of `field` at `minute` for every row"""
+        has = self.last_minute >= minute
+        if minute >= self.values.shape[1]:
+            return np.zeros(len(has), dtype=np.int64), has
+        return self.values[:, minute, TIMELINE_FIELDS.index(field)].astype(np.int64), has
+
+    def lane_diff(self, minute: int, field: str, opponent: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(row value - lane opponent value, valid) at `minute` for every row"""
+        values, has = self.at(minute, field)
+        safe = np.where(opponent >= 0, opponent, 0)
+        valid = has & (opponent >= 0) & has[safe]
+        return np.where(valid, values - values[safe], 0), valid
+
+    def player_stats(self, team_riot_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Per team player early-game averages and lane diffs over the games that have a timeline"""
+        table = self.table
+        rows, groups, keys, is_team = table.player_groups(team_riot_ids)
+        keep = is_team[rows] & (self.last_minute[rows] >= 0)
+        rows, groups = rows[keep], groups[keep]
+        n_groups = len(keys)
+        if not len(rows):
+            return []
+
+        opponent = table.lane_opponents()
+
+        def group_mean(values, valid):
+            valid = valid[rows]
+            counts = np.bincount(groups, weights=valid, minlength=n_groups)
+            sums = np.bincount(groups, weights=np.where(valid, values[rows], 0), minlength=n_groups)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+        stats = {}
+        for minute in LANE_DIFF_MINUTES:
+            for field in ("gold", "cs", "xp"):
+                stats[f"{field}_at_{minute}"] = group_mean(*self.at(minute, field))
+                stats[f"{field}_diff_at_{minute}"] = group_mean(*self.lane_diff(minute, field, opponent))
+
+        # Average XP curve: one point per minute while at least one game is still running
+        n_minutes = self.values.shape[1]
+        xp = self.values[rows, :, TIMELINE_FIELDS.index("xp")].astype(np.float64)
+        running = np.arange(n_minutes)[None, :] <= self.last_minute[rows][:, None]
+        curve_sums = np.zeros((n_groups, n_minutes))
+        curve_counts = np.zeros((n_groups, n_minutes))
+        np.add.at(curve_sums, groups, np.where(running, xp, 0))
+        np.add.at(curve_counts, groups, running)
+
+        games = np.bincount(groups, minlength=n_groups)
+        last_row = np.full(n_groups, -1, dtype=np.int64)
+        np.maximum.at(last_row, groups, rows)
+        name_vocab = table.strings("summoner_name")
+        position_vocab = table.strings("position")
+
+        result = []
+        for g, key in enumerate(keys):
+            if not games[g]:
+                continue
+            player = {
+                "riot_id": key,
+                "summoner_name": name_vocab[table.columns["summoner_name"][last_row[g]]],
+                "position": position_vocab[table.columns["position"][last_row[g]]],
+                "games_with_timeline": int(games[g]),
+            }
+            for name, values in stats.items():
+                player[name] = None if np.isnan(values[g]) else round(float(values[g]), 1)
+            counts = curve_counts[g]
+            player["xp_curve"] = [
+                round(float(s / c), 1) for s, c in zip(curve_sums[g], counts) if c > 0
+            ]
+            result.append(player)
+        return result
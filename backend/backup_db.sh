@@ -21,6 +21,15 @@ sqlite3 "$DB_PATH" ".backup '$BACKUP_FILE'"
 gzip "$BACKUP_FILE"
 echo "Backup compressed: ${BACKUP_FILE}.gz"
 
+# Mirror the analysis results store (content-addressed, immutable files:
+# only new ones are copied, none is ever overwritten)
+RESULTS_DIR="/app/data/results"
+if [ -d "$RESULTS_DIR" ]; then
+    mkdir -p "$BACKUP_DIR/results"
+    cp -rn "$RESULTS_DIR/." "$BACKUP_DIR/results/"
+    echo "Analysis results mirrored: $BACKUP_DIR/results"
+fi
+
 # Delete old backups (keep only last 7 days)
 echo "Cleaning up old backups..."
 find "$BACKUP_DIR" -name "openrift_backup_*.db.gz" -mtime +$DAYS_TO_KEEP -delete
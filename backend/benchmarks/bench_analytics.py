@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+ScrimAnalytics benchmark suite
+
+Generates seeded synthetic match-v5 uploads (see match_generator.py) and
+measures each analytics step separately:
+
+- load_json / load_artifact   ScrimAnalytics(...) from the raw JSON / the columnar artifact
+- parse_riot_api_matches      _parse_riot_api_matches() on already-decoded matches
+- players_overview            get_players_overview()
+- chart_winrate / chart_kda / chart_radar   each PNG chart generator
+- chart_data                  JSON chart series (no matplotlib)
+- process                     process() (stats + chart URLs)
+
+For every step: wall time (min / median over --repeat runs), peak traced
+memory, and the memory blocks / bytes allocated by the step that are still
+alive when it returns (tracemalloc). Everything runs offline in a temporary
+directory; results are written as JSON so runs can be compared with
+--baseline.
+
+USAGE:
+    python bench_analytics.py
+    python bench_analytics.py --sizes 10,100,1000,10000 --repeat 5 --output results.json
+    python bench_analytics.py --baseline results.json
+"""
+
+import argparse
+import json
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "app"))
+sys.path.append(str(Path(__file__).parent))
+
+import numpy as np
+
+import analysis_cache
+from analytics import ScrimAnalytics
+from match_generator import DEFAULT_TEAM, generate_matches
+from match_table import artifact_dir
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+
+
+def measure(fn, repeat: int):
+    """Run fn() `repeat` times: wall times, then one traced run for memory"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = snapshot.statistics("filename")
+
+    return {
+        "wall_ms_min": round(min(times) * 1000, 3),
+        "wall_ms_median": round(statistics.median(times) * 1000, 3),
+        "peak_kb": round(peak / 1024, 1),
+        "retained_kb": round(sum(stat.size for stat in stats) / 1024, 1),
+        "retained_blocks": sum(stat.count for stat in stats),
+    }
+
+
+def bench_size(workdir: Path, n_matches: int, seed: int, team_riot_ids, repeat: int):
+    data_file = workdir / f"matches_{n_matches}.json"
+    payload = generate_matches(n_matches, seed=seed, team_riot_ids=team_riot_ids)
+    with open(data_file, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    matches = payload["matches"]
+
+    def fresh_charts():
+        # Chart generators reuse existing PNGs: render into an empty directory every time
+        shutil.rmtree(analysis_cache.CHARTS_DIR, ignore_errors=True)
+
+    def load_json():
+        shutil.rmtree(artifact_dir(data_file), ignore_errors=True)
+        return ScrimAnalytics(data_file, team_riot_ids=team_riot_ids)
+
+    steps = {}
+    steps["load_json"] = load_json
+    analytics = load_json()  # also writes the artifact used below
+    steps["load_artifact"] = lambda: ScrimAnalytics(data_file, team_riot_ids=team_riot_ids)
+    steps["parse_riot_api_matches"] = lambda: analytics._parse_riot_api_matches(matches)
+    steps["players_overview"] = lambda: (analytics._rows_cache.clear(), analytics.get_players_overview())
+    steps["chart_data"] = lambda: (analytics._rows_cache.clear(), analytics.chart_data())
+    steps["chart_winrate"] = lambda: (fresh_charts(), analytics.generate_winrate_chart())
+    steps["chart_kda"] = lambda: (fresh_charts(), analytics.generate_kda_chart())
+    steps["chart_radar"] = lambda: (fresh_charts(), analytics.generate_radar_players())
+    steps["process"] = lambda: (fresh_charts(), analytics._rows_cache.clear(), analytics.process())
+
+    results = []
+    for step, fn in steps.items():
+        result = {"matches": n_matches, "step": step}
+        result.update(measure(fn, repeat))
+        results.append(result)
+        print(f"  {n_matches:>6} matches  {step:<24} {result['wall_ms_median']:>10.1f} ms"
+              f"  peak {result['peak_kb']:>10.1f} KB  retained blocks {result['retained_blocks']:>8}")
+    return results
+
+
+def compare(results, baseline_file: Path):
+    """Print median wall-time and peak-memory ratios against a previous run"""
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = {(r["matches"], r["step"]): r for r in json.load(f)["results"]}
+
+    print(f"\n📊 Compared with {baseline_file} (ratio < 1 = faster / smaller)")
+    print("-" * 70)
+    for result in results:
+        old = baseline.get((result["matches"], result["step"]))
+        if not old:
+            continue
+        time_ratio = result["wall_ms_median"] / old["wall_ms_median"] if old["wall_ms_median"] else float("nan")
+        peak_ratio = result["peak_kb"] / old["peak_kb"] if old["peak_kb"] else float("nan")
+        print(f"  {result['matches']:>6} matches  {result['step']:<24} time x{time_ratio:5.2f}  peak x{peak_ratio:5.2f}")
+
+
+def run_benchmarks(sizes, seed: int, team_riot_ids, repeat: int):
+    workdir = Path(tempfile.mkdtemp(prefix="openrift-bench-"))
+    charts_dir = analysis_cache.CHARTS_DIR
+    analysis_cache.CHARTS_DIR = workdir / "charts"
+    try:
+        results = []
+        for n_matches in sizes:
+            results.extend(bench_size(workdir, n_matches, seed, team_riot_ids, repeat))
+        return results
+    finally:
+        analysis_cache.CHARTS_DIR = charts_dir
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ScrimAnalytics")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Match counts, comma-separated")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--team", default=",".join(DEFAULT_TEAM), help="Comma-separated team Riot IDs (5)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Previous --output file to compare with")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    team_riot_ids = args.team.split(",")
+
+    print(f"🏁 ScrimAnalytics benchmark (seed {args.seed}, {args.repeat} runs per step)")
+    print("-" * 70)
+    results = run_benchmarks(sizes, args.seed, team_riot_ids, args.repeat)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "sizes": sizes,
+            "team_riot_ids": team_riot_ids,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+
+    if args.baseline:
+        compare(results, Path(args.baseline))
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Synthetic Riot match-v5 generator (seeded, offline)
+
+Produces `{"matches": [...]}` payloads shaped like the files users upload:
+10 participants per match, the team's players on a random side, opponents
+drawn from a pool of rival teams, and stats in realistic per-role ranges.
+The same seed always produces the same file.
+
+USAGE:
+    python match_generator.py 1000 matches.json
+    python match_generator.py 200 scrim.json --seed 7 --team "Alpha#EUW,Bravo#EUW,Charlie#EUW,Delta#EUW,Echo#EUW"
+    python match_generator.py 100 scrim_timelines.json --timelines
+"""
+
+import argparse
+import json
+import random
+import sys
+from typing import Any, Dict, List, Optional, Sequence
+
+DEFAULT_TEAM = ("Alpha#EUW", "Bravo#EUW", "Charlie#EUW", "Delta#EUW", "Echo#EUW")
+
+POSITIONS = ("TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY")
+
+CHAMPIONS = {
+    "TOP": ("Aatrox", "Camille", "Darius", "Fiora", "Garen", "Gnar", "Jax", "KSante", "Ornn", "Renekton"),
+    "JUNGLE": ("Elise", "Graves", "Hecarim", "JarvanIV", "LeeSin", "Maokai", "Nidalee", "Sejuani", "Vi", "Viego"),
+    "MIDDLE": ("Ahri", "Akali", "Azir", "Corki", "LeBlanc", "Orianna", "Sylas", "Syndra", "Taliyah", "Yone"),
+    "BOTTOM": ("Aphelios", "Ashe", "Ezreal", "Jinx", "Kaisa", "Kalista", "Lucian", "Varus", "Xayah", "Zeri"),
+    "UTILITY": ("Alistar", "Braum", "Karma", "Leona", "Lulu", "Milio", "Nautilus", "Rakan", "Renata", "Thresh"),
+}
+
+# Per-minute (low, high) ranges by role: cs, gold, damage, vision
+ROLE_RATES = {
+    "TOP": {"cs": (6.5, 9.0), "gold": (360, 470), "damage": (450, 800), "vision": (0.6, 1.0)},
+    "JUNGLE": {"cs": (4.5, 6.5), "gold": (340, 440), "damage": (350, 650), "vision": (1.0, 1.6)},
+    "MIDDLE": {"cs": (7.5, 10.0), "gold": (380, 500), "damage": (550, 950), "vision": (0.7, 1.1)},
+    "BOTTOM": {"cs": (8.0, 10.5), "gold": (400, 520), "damage": (550, 1000), "vision": (0.6, 1.0)},
+    "UTILITY": {"cs": (0.8, 1.8), "gold": (230, 300), "damage": (180, 400), "vision": (2.2, 3.5)},
+}
+
+PLATFORM = "EUW1"
+FIRST_GAME_CREATION = 1_700_000_000_000  # ms
+
+
+def _opponent_pool(rng: random.Random, n_teams: int) -> List[List[Dict[str, str]]]:
+    """Rival teams: 5 players each with stable puuid / Riot ID"""
+    teams = []
+    for t in range(n_teams):
+        tag = rng.choice(("EUW", "KR", "NA1", "EUNE"))
+        teams.append([
+            {"game_name": f"Rival{t}{position.title()}", "tag_line": tag, "puuid": f"opp-{t}-{i}-{rng.getrandbits(48):012x}"}
+            for i, position in enumerate(POSITIONS)
+        ])
+    return teams
+
+
+def _participant(rng: random.Random, player: Dict[str, str], team_id: int, position: str, win: bool,
+                 minutes: float, team_kills: int, participant_id: int) -> Dict[str, Any]:
+    rates = ROLE_RATES[position]
+    rate = lambda key: rng.uniform(*rates[key]) * (1.08 if win else 0.94)
+
+    kills = min(team_kills, int(rng.betavariate(2, 5) * team_kills * 0.9))
+    cs = int(rate("cs") * minutes)
+    neutral = int(cs * 0.75) if position == "JUNGLE" else int(cs * rng.uniform(0.0, 0.08))
+
+    return {
+        "participantId": participant_id,
+        "puuid": player["puuid"],
+        "riotIdGameName": player["game_name"],
+        "riotIdTagline": player["tag_line"],
+        "summonerName": player["game_name"],
+        "teamId": team_id,
+        "teamPosition": position,
+        "individualPosition": position,
+        "championName": rng.choice(CHAMPIONS[position]),
+        "champLevel": min(18, int(minutes / 2) + rng.randint(0, 4)),
+        "win": win,
+        "kills": kills,
+        "deaths": rng.randint(0, 4 if win else 9),
+        "assists": rng.randint(max(0, team_kills // 4), max(1, team_kills)),
+        "totalDamageDealtToChampions": int(rate("damage") * minutes),
+        "goldEarned": int(rate("gold") * minutes),
+        "totalMinionsKilled": cs - neutral if position == "JUNGLE" else cs,
+        "neutralMinionsKilled": neutral,
+        "visionScore": int(rate("vision") * minutes),
+        "wardsPlaced": int(rate("vision") * minutes * 0.45),
+        "wardsKilled": rng.randint(0, int(minutes / 3)),
+        "damageDealtToObjectives": int(rng.uniform(500, 25000 if position == "JUNGLE" else 9000)),
+        "damageDealtToBuildings": int(rng.uniform(0, 9000)),
+        "item0": rng.randint(1000, 7000),
+        "item1": rng.randint(1000, 7000),
+        "item2": rng.randint(1000, 7000),
+        "summoner1Id": 4,
+        "summoner2Id": 11 if position == "JUNGLE" else rng.choice((7, 12, 14)),
+    }
+
+
+def generate_match(rng: random.Random, index: int, team: Sequence[Dict[str, str]],
+                   opponents: Sequence[Dict[str, str]]) -> Dict[str, Any]:
+    """One match-v5 payload: `team` on a random side against `opponents`"""
+    duration = rng.randint(22 * 60, 42 * 60)
+    minutes = duration / 60
+    team_side = rng.choice((100, 200))
+    blue_wins = rng.random() < 0.5
+
+    participants = []
+    for side in (100, 200):
+        players = team if side == team_side else opponents
+        win = (side == 100) == blue_wins
+        team_kills = rng.randint(12, 35) if win else rng.randint(4, 22)
+        for i, position in enumerate(POSITIONS):
+            participants.append(_participant(
+                rng, players[i], side, position, win, minutes, team_kills, len(participants) + 1
+            ))
+
+    match_id = f"{PLATFORM}_{7_000_000_000 + index}"
+    return {
+        "metadata": {
+            "dataVersion": "2",
+            "matchId": match_id,
+            "participants": [p["puuid"] for p in participants],
+        },
+        "info": {
+            "gameCreation": FIRST_GAME_CREATION + index * 3_600_000,
+            "gameDuration": duration,
+            "gameMode": "CLASSIC",
+            "gameType": "CUSTOM_GAME",
+            "mapId": 11,
+            "platformId": PLATFORM,
+            "participants": participants,
+            "teams": [
+                {"teamId": side, "win": (side == 100) == blue_wins}
+                for side in (100, 200)
+            ],
+        },
+    }
+
+
+def generate_timeline(rng: random.Random, match: Dict[str, Any]) -> Dict[str, Any]:
+    """match-v5 timeline of a generated match: per-minute frames growing towards the final stats"""
+    info = match["info"]
+    minutes = info["gameDuration"] // 60
+    frames = []
+    for minute in range(minutes + 1):
+        progress = minute / max(minutes, 1)
+        participant_frames = {}
+        for p in info["participants"]:
+            # Early game is slower than the average rate; the curve still ends on the final totals
+            share = progress ** rng.uniform(1.05, 1.25)
+            participant_frames[str(p["participantId"])] = {
+                "participantId": p["participantId"],
+                "totalGold": 500 + int((p["goldEarned"] - 500) * share),
+                "xp": int(p["champLevel"] * 1000 * share),
+                "minionsKilled": int(p["totalMinionsKilled"] * share),
+                "jungleMinionsKilled": int(p["neutralMinionsKilled"] * share),
+                "level": max(1, int(p["champLevel"] * share)),
+                "damageStats": {"totalDamageDoneToChampions": int(p["totalDamageDealtToChampions"] * share)},
+            }
+        frames.append({"timestamp": minute * 60_000, "participantFrames": participant_frames, "events": []})
+
+    return {
+        "metadata": dict(match["metadata"]),
+        "info": {
+            "frameInterval": 60_000,
+            "frames": frames,
+            "participants": [{"participantId": p["participantId"], "puuid": p["puuid"]} for p in info["participants"]],
+        },
+    }
+
+
+def generate_matches(n_matches: int, seed: int = 42, team_riot_ids: Optional[Sequence[str]] = None,
+                     n_opponent_teams: int = 8, timelines: bool = False) -> Dict[str, Any]:
+    """A full upload payload with `n_matches` matches (and their timelines if `timelines`)"""
+    rng = random.Random(seed)
+    team_riot_ids = list(team_riot_ids or DEFAULT_TEAM)
+    if len(team_riot_ids) != len(POSITIONS):
+        raise ValueError(f"Expected {len(POSITIONS)} team Riot IDs, got {len(team_riot_ids)}")
+
+    team = []
+    for riot_id in team_riot_ids:
+        game_name, tag_line = riot_id.split("#", 1)
+        team.append({"game_name": game_name, "tag_line": tag_line, "puuid": f"team-{rng.getrandbits(64):016x}"})
+
+    pool = _opponent_pool(rng, n_opponent_teams)
+    payload = {"matches": [generate_match(rng, i, team, rng.choice(pool)) for i in range(n_matches)]}
+    if timelines:
+        # Separate generator: the matches are the same with or without timelines
+        timeline_rng = random.Random(seed + 1)
+        payload["timelines"] = [generate_timeline(timeline_rng, match) for match in payload["matches"]]
+    return payload
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic Riot match-v5 data")
+    parser.add_argument("matches", type=int, help="Number of matches (e.g. 10 to 10000)")
+    parser.add_argument("output", help="Output JSON file ('-' for stdout)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--team", default=",".join(DEFAULT_TEAM), help="Comma-separated team Riot IDs (5)")
+    parser.add_argument("--timelines", action="store_true", help="Also generate match-v5 timelines")
+    args = parser.parse_args()
+
+    payload = generate_matches(args.matches, seed=args.seed, team_riot_ids=args.team.split(","),
+                               timelines=args.timelines)
+    if args.output == "-":
+        json.dump(payload, sys.stdout)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        print(f"✅ Wrote {args.matches} matches to {args.output}")
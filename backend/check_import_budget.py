@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+OpenRift API Import Budget Check
+
+Imports app/main.py in a fresh interpreter with `python -X importtime` and
+reports what every top-level import of the API costs (cumulative time,
+including everything it pulls in).
+
+FAILS (exit code 1) IF:
+- Importing the API takes longer than the budget (--budget-ms)
+- A heavy analytics module (NumPy, matplotlib, ...) is loaded at startup.
+  These must only be imported by the analytics workers / on first use.
+
+USAGE:
+    python check_import_budget.py
+    python check_import_budget.py --budget-ms 1500 --top 30
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).parent / "app"
+
+# Modules that must never be imported when the API starts
+HEAVY_MODULES = ("numpy", "pandas", "matplotlib", "seaborn", "PIL", "analytics", "match_table", "timeline", "synergy")
+
+DEFAULT_BUDGET_MS = 2500
+
+PROBE = (
+    "import json, sys; import main; "
+    f"print(json.dumps(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules)))"
+)
+
+
+def parse_importtime(stderr: str):
+    """Parse `-X importtime` output into (level, self_us, cumulative_us, module) tuples"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        level = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        entries.append((level, int(self_us), int(cumulative_us), name.strip()))
+    return entries
+
+
+def main_imports(entries):
+    """Direct imports of `main` (importtime lists children before their parent)"""
+    for index, (level, _, cumulative_us, name) in enumerate(entries):
+        if level == 0 and name == "main":
+            break
+    else:
+        raise RuntimeError("main was not imported")
+
+    children = []
+    for level, _, child_cumulative_us, child_name in reversed(entries[:index]):
+        if level == 0:
+            break
+        if level == 1:
+            children.append((child_cumulative_us, child_name))
+    return cumulative_us, sorted(children, reverse=True)
+
+
+def check_import_budget(budget_ms: float, top: int) -> bool:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=APP_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr[-4000:])
+        print("❌ Importing the API failed")
+        return False
+
+    total_us, children = main_imports(parse_importtime(result.stderr))
+    heavy_loaded = json.loads(result.stdout.strip().splitlines()[-1])
+
+    print(f"📦 Import cost of app/main.py (top {top} top-level imports)")
+    print("-" * 60)
+    for cumulative_us, name in children[:top]:
+        print(f"  {cumulative_us / 1000:9.1f} ms  {name}")
+    print("-" * 60)
+    print(f"  {total_us / 1000:9.1f} ms  TOTAL (budget {budget_ms:g} ms)")
+
+    ok = True
+    if total_us / 1000 > budget_ms:
+        print(f"❌ Import time over budget by {total_us / 1000 - budget_ms:.1f} ms")
+        ok = False
+    if heavy_loaded:
+        print(f"❌ Heavy modules loaded at startup: {', '.join(heavy_loaded)}")
+        ok = False
+    if ok:
+        print("✅ Import budget OK")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the API import-time budget")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    sys.exit(0 if check_import_budget(args.budget_ms, args.top) else 1)
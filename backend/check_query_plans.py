@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+OpenRift Query Plan Check
+
+Runs EXPLAIN QUERY PLAN on the hot query paths (membership checks, team
+pages, notifications, champion pools) against a fresh SQLite database built
+like the app builds it (create_all + versioned migrations), or against an
+existing one with --database-url (e.g. a copy of production; its pending
+migrations are applied first, as at startup).
+
+FAILS (exit code 1) IF:
+- A query reads one of its tables with a full scan (of the table, or of an
+  index that doesn't match its filter)
+
+Sorts the index can't serve ("USE TEMP B-TREE") are only reported.
+tests/test_query_plans.py runs the same check in CI (fresh database).
+
+USAGE:
+    python check_query_plans.py
+    python check_query_plans.py --database-url sqlite:///./data/openrift.db --verbose
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+APP_DIR = Path(__file__).parent / "app"
+
+# "SCAN <table>", with or without "USING [COVERING] INDEX": every row is read
+# (SQLite >= 3.36; older versions print "SCAN TABLE <table>"). Lookups are "SEARCH".
+FULL_SCAN_RE = re.compile(r"^SCAN (TABLE )?\w+")
+
+SAMPLE_DATE = "2026-01-01 00:00:00.000000"
+
+
+def hot_queries():
+    """(label, statement) of the queries to check, written like the routes write them"""
+    from sqlalchemy import func, select
+    from database import (
+        team_members, Scrim, ScrimGame, Notification, AvailabilitySlot, TeamEvent, Draft,
+        TeamAnalytics, UserAnalytics, ChampionPoolEntry, TeamInvite, JoinRequest
+    )
+
+    return [
+        ("my teams (membership by user)",
+         select(team_members.c.team_id).where(team_members.c.user_id == "u")),
+        ("membership check",
+         select(team_members.c.role).where(team_members.c.team_id == "t", team_members.c.user_id == "u")),
+        ("team roster",
+         select(team_members).where(team_members.c.team_id == "t")),
+        ("team scrims",
+         select(Scrim).where(Scrim.team_id == "t").order_by(Scrim.scheduled_at.desc())),
+        ("scrim games",
+         select(ScrimGame).where(ScrimGame.scrim_id == "s")),
+        ("scrim game count",
+         select(func.count(ScrimGame.id)).where(ScrimGame.scrim_id == "s")),
+        ("game of a draft",
+         select(ScrimGame).where(ScrimGame.draft_id == "d")),
+        ("notifications",
+         select(Notification).where(Notification.user_id == "u")
+         .order_by(Notification.created_at.desc()).limit(50)),
+        ("unread notifications",
+         select(Notification).where(Notification.user_id == "u", Notification.is_read == False)
+         .order_by(Notification.created_at.desc()).limit(50)),
+        ("unread count",
+         select(func.count(Notification.id)).where(Notification.user_id == "u", Notification.is_read == False)),
+        ("my availability (team)",
+         select(AvailabilitySlot).where(
+             AvailabilitySlot.user_id == "u", AvailabilitySlot.team_id == "t",
+             AvailabilitySlot.start_time >= SAMPLE_DATE
+         )),
+        ("member availability",
+         select(AvailabilitySlot).where(
+             AvailabilitySlot.user_id == "u", AvailabilitySlot.start_time >= SAMPLE_DATE,
+             AvailabilitySlot.end_time <= SAMPLE_DATE
+         )),
+        ("team events",
+         select(TeamEvent).where(TeamEvent.team_id == "t", TeamEvent.start_time >= SAMPLE_DATE)
+         .order_by(TeamEvent.start_time)),
+        ("team drafts",
+         select(Draft).where(Draft.team_id == "t").order_by(Draft.updated_at.desc())),
+        ("my drafts",
+         select(Draft).where(Draft.user_id == "u").order_by(Draft.updated_at.desc())),
+        ("scrim drafts",
+         select(Draft).where(Draft.scrim_id == "s")),
+        ("team analytics",
+         select(TeamAnalytics.id, TeamAnalytics.name).where(TeamAnalytics.team_id == "t")
+         .order_by(TeamAnalytics.uploaded_at.desc())),
+        ("scrim analytics",
+         select(TeamAnalytics.id).where(TeamAnalytics.scrim_id == "s")),
+        ("personal analytics",
+         select(UserAnalytics.id, UserAnalytics.name).where(UserAnalytics.user_id == "u")
+         .order_by(UserAnalytics.uploaded_at.desc())),
+        ("champion pool tier",
+         select(func.count(ChampionPoolEntry.id)).where(
+             ChampionPoolEntry.pool_id == "p", ChampionPoolEntry.tier == "S"
+         )),
+        ("champion pool entries",
+         select(ChampionPoolEntry).where(ChampionPoolEntry.pool_id == "p").order_by(ChampionPoolEntry.position)),
+        ("my invites",
+         select(TeamInvite).where(TeamInvite.invited_user_id == "u", TeamInvite.status == "pending")),
+        ("team join requests",
+         select(JoinRequest).where(JoinRequest.team_id == "t", JoinRequest.status == "pending")
+         .order_by(JoinRequest.created_at.desc())),
+        ("my pending join request",
+         select(JoinRequest).where(JoinRequest.user_id == "u", JoinRequest.status == "pending")),
+    ]
+
+
+def query_plan(connection, statement):
+    """EXPLAIN QUERY PLAN detail lines of a statement"""
+    compiled = statement.compile(dialect=connection.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def check_query_plans(verbose: bool) -> bool:
+    from database import engine, init_db
+
+    if engine.dialect.name != "sqlite":
+        print(f"❌ EXPLAIN QUERY PLAN needs SQLite (DATABASE_URL is {engine.dialect.name})")
+        return False
+
+    init_db()
+
+    print("🔎 Query plans of the hot query paths")
+    print("-" * 60)
+    failures = 0
+    with engine.connect() as connection:
+        for label, statement in hot_queries():
+            plan = query_plan(connection, statement)
+            scans = [step for step in plan if FULL_SCAN_RE.match(step)]
+            sorts = [step for step in plan if step.startswith("USE TEMP B-TREE")]
+            if scans:
+                failures += 1
+                print(f"  ❌ {label}: {'; '.join(scans)}")
+            elif sorts:
+                print(f"  ⚠️  {label}: {'; '.join(sorts)}")
+            else:
+                print(f"  ✅ {label}")
+            if verbose or scans:
+                for step in plan:
+                    print(f"       {step}")
+    print("-" * 60)
+
+    if failures:
+        print(f"❌ {failures} queries fall back to a full scan")
+        return False
+    print("✅ Query plans OK")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that the hot queries use indexes")
+    parser.add_argument("--database-url", help="Database to check (default: a fresh temporary one)")
+    parser.add_argument("--verbose", action="store_true", help="Print every plan")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp_dir}/query_plans.db"
+        sys.path.insert(0, str(APP_DIR))
+        ok = check_query_plans(args.verbose)
+        # Release the database file before the directory is removed
+        from database import engine
+        engine.dispose()
+
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,39 @@
+"""
+Migration: Add indexes for the hot query paths
+Date: 2026-10-17
+
+Membership checks, team pages (scrims, events, drafts, analytics,
+availability), notifications and champion pools filtered these columns
+with full table scans. Applied at startup by app/schema_migrations.py; the
+index names match the models' declarations, so new databases (create_all)
+already have them and this is a no-op there.
+"""
+from sqlalchemy import text
+
+INDEXES = (
+    ("ix_team_members_user_id", "team_members", ("user_id",)),
+    ("ix_user_analytics_user_id_uploaded_at", "user_analytics", ("user_id", "uploaded_at")),
+    ("ix_scrims_team_id_scheduled_at", "scrims", ("team_id", "scheduled_at")),
+    ("ix_scrim_games_scrim_id_game_number", "scrim_games", ("scrim_id", "game_number")),
+    ("ix_scrim_games_draft_id", "scrim_games", ("draft_id",)),
+    ("ix_team_analytics_team_id_uploaded_at", "team_analytics", ("team_id", "uploaded_at")),
+    ("ix_team_analytics_scrim_id", "team_analytics", ("scrim_id",)),
+    ("ix_team_invites_invited_user_id_status", "team_invites", ("invited_user_id", "status")),
+    ("ix_team_invites_team_id", "team_invites", ("team_id",)),
+    ("ix_join_requests_team_id_status_created_at", "join_requests", ("team_id", "status", "created_at")),
+    ("ix_join_requests_user_id_status", "join_requests", ("user_id", "status")),
+    ("ix_availability_slots_user_id_team_id_start_time", "availability_slots", ("user_id", "team_id", "start_time")),
+    ("ix_team_events_team_id_start_time", "team_events", ("team_id", "start_time")),
+    ("ix_notifications_user_id_is_read_created_at", "notifications", ("user_id", "is_read", "created_at")),
+    ("ix_champion_pool_entries_pool_id_tier_position", "champion_pool_entries", ("pool_id", "tier", "position")),
+    ("ix_drafts_team_id_updated_at", "drafts", ("team_id", "updated_at")),
+    ("ix_drafts_user_id_updated_at", "drafts", ("user_id", "updated_at")),
+    ("ix_drafts_scrim_id", "drafts", ("scrim_id",)),
+)
+
+
+def upgrade(connection):
+    for name, table, columns in INDEXES:
+        # "position" is a keyword in PostgreSQL: quote every column
+        quoted = ", ".join(f'"{column}"' for column in columns)
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({quoted})"))
@@ -0,0 +1,11 @@
+"""
+Migration: Add aggregates column to team_analytics table
+Date: 2026-10-17
+
+Existing analyses start without aggregates (rebuilt on first append).
+"""
+from schema_migrations import add_column_if_missing
+
+
+def upgrade(connection):
+    add_column_if_missing(connection, "team_analytics", "aggregates", "JSON")
@@ -0,0 +1,88 @@
+"""
+Migration: Move saved analysis_results out of the database into the results store
+Date: 2026-10-17
+
+Adds results_blob_id to user_analytics and team_analytics, writes every
+payload still in analysis_results to the compressed results store (decoding
+the JSON strings saved by the scrim hub upload) and clears the column.
+
+apply_migrations runs this in one transaction: an interrupted run is rolled
+back entirely and starts over at next startup. The payload files a failed run
+wrote are removed; after a hard kill they stay, but payloads are
+content-addressed, so the rerun finds them again instead of writing new ones.
+Where the storage manager already tracks files, the moved payloads are
+registered as results blobs held by their analysis in the same transaction;
+otherwise its first reconcile tracks them. SQLite doesn't shrink by itself: run
+`sqlite3 data/openrift.db VACUUM` afterwards to give the space back.
+"""
+from datetime import datetime
+
+from sqlalchemy import select, text
+
+from database import StoredBlob, StoredBlobRef
+from schema_migrations import add_column_if_missing
+from results_store import store_results, decode_results, results_path
+
+TABLES = {
+    # table -> (user column, team column) of the blob owner
+    "user_analytics": ("user_id", "NULL"),
+    "team_analytics": ("created_by_id", "team_id"),
+}
+
+
+def _track(connection, holder_kind: str, holder_id: str, results_id: str, user_id, team_id):
+    """Register a moved payload as a results blob held by its analysis (storage.attach_results)"""
+    blobs, refs = StoredBlob.__table__, StoredBlobRef.__table__
+    blob_id = f"results:{results_id}"
+    if connection.execute(select(blobs.c.id).where(blobs.c.id == blob_id)).first() is None:
+        connection.execute(blobs.insert().values(
+            id=blob_id, kind="results", size_bytes=results_path(results_id).stat().st_size, ref_count=1,
+            user_id=user_id, team_id=team_id, created_at=datetime.utcnow(), unreferenced_since=None
+        ))
+    else:
+        connection.execute(blobs.update().where(blobs.c.id == blob_id).values(
+            ref_count=blobs.c.ref_count + 1, unreferenced_since=None
+        ))
+    connection.execute(refs.insert().values(holder_kind=holder_kind, holder_id=holder_id, blob_id=blob_id))
+
+
+def upgrade(connection):
+    tracked = connection.execute(text("SELECT 1 FROM stored_blobs LIMIT 1")).first() is not None
+    written = []
+    try:
+        for table, (user_column, team_column) in TABLES.items():
+            add_column_if_missing(connection, table, "results_blob_id", "VARCHAR")
+
+            row_ids = connection.execute(text(
+                f"SELECT id FROM {table} WHERE results_blob_id IS NULL AND analysis_results IS NOT NULL"
+            )).scalars().all()
+
+            moved = 0
+            # One row at a time: payloads can be several MB each
+            for row_id in row_ids:
+                row = connection.execute(
+                    text(f"SELECT analysis_results, {user_column}, {team_column} FROM {table} WHERE id = :id"),
+                    {"id": row_id}
+                ).first()
+                # Raw column value: decoded once, or twice for double-encoded rows
+                results = decode_results(row[0])
+                if results is None:
+                    # JSON null, or unreadable: nothing to move
+                    continue
+                results_id, created = store_results(results)
+                if created:
+                    written.append(results_path(results_id))
+                connection.execute(
+                    text(f"UPDATE {table} SET results_blob_id = :blob_id, analysis_results = NULL WHERE id = :id"),
+                    {"blob_id": results_id, "id": row_id}
+                )
+                if tracked:
+                    _track(connection, table, row_id, results_id, row[1], row[2])
+                moved += 1
+            if moved:
+                print(f"✅ {table}: {moved} analyses moved to the results store")
+    except BaseException:
+        # Rolled back: only the files this run created would be left untracked
+        for path in written:
+            path.unlink(missing_ok=True)
+        raise
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+OpenRift Percentile Distributions Rebuild
+
+Recounts the per-position player totals behind the percentiles
+(percentile_matches / percentile_players tables) from every match in the
+global match store. Accepted uploads keep them up to date incrementally; run
+this after changing the metrics, or to backfill an existing store. The
+recount is swapped in with one transaction at the end: running servers keep
+serving the previous distributions meanwhile, and pick the new ones up within
+PERCENTILE_REFRESH_SECONDS.
+
+USAGE:
+    python rebuild_percentiles.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# Add app directory to path
+sys.path.append(str(Path(__file__).parent / "app"))
+
+from database import init_db
+from match_store import match_store
+from percentiles import percentile_distributions
+
+
+if __name__ == "__main__":
+    init_db()
+    print(f"🔄 Rebuilding percentile distributions from {match_store.root}")
+    start = time.perf_counter()
+    matches = percentile_distributions.rebuild(match_store)
+    print(f"✅ {matches} matches counted in {time.perf_counter() - start:.1f}s")
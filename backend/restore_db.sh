@@ -44,5 +44,11 @@ echo "Current database backed up to: $CURRENT_BACKUP"
 echo "Restoring database..."
 gunzip -c "$BACKUP_FILE" > "$DB_PATH"
 
+# Analysis results referenced by the restored database
+if [ -d "$BACKUP_DIR/results" ]; then
+    mkdir -p /app/data/results
+    cp -rn "$BACKUP_DIR/results/." /app/data/results/
+fi
+
 echo "✅ Database restored successfully!"
 echo "If something went wrong, you can restore from: $CURRENT_BACKUP"
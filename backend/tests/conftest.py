@@ -0,0 +1,27 @@
+"""
+Test setup: the app modules import each other by name (app/ on sys.path, as
+main.py does), and the database and the match and results stores are fresh
+per test session. Their environment variables must be set before the modules
+that read them are first imported.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+_TMP_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP_DIR.name}/test.db"
+os.environ["MATCH_STORE_DIR"] = f"{_TMP_DIR.name}/matches"
+os.environ["RESULTS_STORE_DIR"] = f"{_TMP_DIR.name}/results"
+
+sys.path.insert(0, str(BACKEND_DIR / "app"))
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+def pytest_sessionfinish(session, exitstatus):
+    # Release the database file before the directory is removed
+    if "database" in sys.modules:
+        sys.modules["database"].engine.dispose()
+    _TMP_DIR.cleanup()
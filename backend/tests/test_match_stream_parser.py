@@ -0,0 +1,84 @@
+"""
+MatchStreamParser: the elements of the streamed arrays come out the same
+wherever the chunks split the text, and invalid JSON is rejected as soon as
+it is received, not when the upload ends.
+"""
+import json
+
+import pytest
+
+from ingest import MatchStreamParser, UploadRejected
+
+DOCUMENT = {
+    "version": 1.5e-3,
+    "matches": [
+        {"metadata": {"matchId": "EUW1_1"}, "info": {"gameDuration": 1800, "ratio": -0.25, "win": True}},
+        {"metadata": {"matchId": "EUW1_2"}, "info": {"name": "Kén \"\\\" ☺", "items": [1, 20, 300]}},
+        12,
+    ],
+    "skipped": {"nested": [None, False, {"x": -1e10}]},
+    "timelines": [{"metadata": {"matchId": "EUW1_1"}, "info": {"frames": []}}],
+    "count": 3,
+}
+TEXT = json.dumps(DOCUMENT, ensure_ascii=False, indent=1)
+EXPECTED = [("matches", match) for match in DOCUMENT["matches"]] + [("timelines", DOCUMENT["timelines"][0])]
+
+
+def _parse(chunks):
+    parser = MatchStreamParser()
+    elements = []
+    for chunk in chunks:
+        elements.extend(parser.feed(chunk))
+    elements.extend(parser.close())
+    return parser, elements
+
+
+def _chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 16, 64, len(TEXT)])
+def test_elements_are_the_same_for_every_chunk_size(size):
+    parser, elements = _parse(_chunks(TEXT, size))
+    assert elements == EXPECTED
+    assert parser.found_matches
+
+
+@pytest.mark.parametrize("split", range(1, len(TEXT)))
+def test_elements_are_the_same_for_every_split_point(split):
+    _, elements = _parse([TEXT[:split], TEXT[split:]])
+    assert elements == EXPECTED
+
+
+def test_numbers_split_across_chunks_are_not_cut():
+    _, elements = _parse(['{"matches": [1', '2.', '5e', '-', '3, -', '7]}'])
+    assert elements == [("matches", 12.5e-3), ("matches", -7)]
+
+
+def test_elements_are_yielded_before_the_upload_ends():
+    parser = MatchStreamParser()
+    assert list(parser.feed('{"matches": [{"a": 1')) == []
+    assert list(parser.feed('}, {"b"')) == [("matches", {"a": 1})]
+    assert list(parser.feed(': 2}')) == [("matches", {"b": 2})]
+
+
+@pytest.mark.parametrize("text", [
+    '{"matches": [{"a": 1,, ',
+    '{"matches": [{"a": tru3',
+    '{"matches": [1 2',
+    '{"matches": {',
+    '[{"matches": ',
+    '{"matches": [], "x": 1} {',
+])
+def test_invalid_json_is_rejected_when_received(text):
+    parser = MatchStreamParser()
+    with pytest.raises(UploadRejected):
+        list(parser.feed(text))
+
+
+@pytest.mark.parametrize("text", ['{"matches": [{"a": "unterminated', '{"matches": [1, 2', '{"matches": [], "x": nul'])
+def test_incomplete_documents_are_rejected_at_the_end(text):
+    parser = MatchStreamParser()
+    list(parser.feed(text))
+    with pytest.raises(UploadRejected):
+        list(parser.close())
@@ -0,0 +1,29 @@
+"""
+Hot query paths must use their indexes: EXPLAIN QUERY PLAN of every query
+listed in check_query_plans.py, on a database built like the app builds it
+(create_all + versioned migrations), may not contain a full scan.
+"""
+import pytest
+
+from check_query_plans import FULL_SCAN_RE, hot_queries, query_plan
+
+HOT_QUERIES = hot_queries()
+
+
+@pytest.fixture(scope="module")
+def connection():
+    from database import engine, init_db
+
+    if engine.dialect.name != "sqlite":
+        pytest.skip("EXPLAIN QUERY PLAN needs SQLite")
+    init_db()
+    with engine.connect() as connection:
+        yield connection
+
+
+@pytest.mark.parametrize("statement", [statement for _, statement in HOT_QUERIES],
+                         ids=[label for label, _ in HOT_QUERIES])
+def test_hot_query_uses_an_index(connection, statement):
+    plan = query_plan(connection, statement)
+    scans = [step for step in plan if FULL_SCAN_RE.match(step)]
+    assert not scans, "full scan: " + "; ".join(scans) + "\nplan:\n  " + "\n  ".join(plan)
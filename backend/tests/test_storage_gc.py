@@ -0,0 +1,166 @@
+"""
+Storage GC: reference counting of uploads and stored matches, retention of
+unsaved uploads vs the grace period of everything else, references left by
+cascade deletes and the skip of blobs an ingest just touched.
+"""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import storage
+from database import (
+    SessionLocal, StoredBlob, StoredBlobRef, User, UserAnalytics, init_db
+)
+from match_store import MatchStore
+
+RETENTION = timedelta(days=storage.STORAGE_UPLOAD_RETENTION_DAYS)
+GRACE = timedelta(minutes=storage.STORAGE_GC_GRACE_MINUTES)
+MINUTE = timedelta(minutes=1)
+
+
+@pytest.fixture
+def db():
+    init_db()
+    session = SessionLocal()
+    yield session
+    session.rollback()
+    for model in (StoredBlobRef, StoredBlob, UserAnalytics, User):
+        session.query(model).delete()
+    session.commit()
+    session.close()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Uploads and matches in a directory of their own"""
+    monkeypatch.setattr(storage, "UPLOAD_DIR", tmp_path / "uploads")
+    storage.UPLOAD_DIR.mkdir()
+    matches = MatchStore(tmp_path / "matches")
+    monkeypatch.setattr(storage, "match_store", matches)
+    return matches
+
+
+def _put_matches(store, *match_ids):
+    return [store.put({"metadata": {"matchId": match_id}, "info": {}})[0] for match_id in match_ids]
+
+
+def _upload(db, name, keys):
+    path = storage.UPLOAD_DIR / name
+    path.write_text("{}")
+    storage.register_upload(db, path, None, keys)
+    db.commit()
+    return path
+
+
+def _saved_analysis(db, path, username):
+    user = User(email=f"{username}@x.io", username=username, hashed_password="x")
+    db.add(user)
+    db.flush()
+    analytics = UserAnalytics(user_id=user.id, name="Scrims", data_path=str(path))
+    db.add(analytics)
+    db.flush()
+    storage.register_analytics(db, "user_analytics", analytics.id, [path], user_id=user.id)
+    db.commit()
+    return user, analytics
+
+
+def _blob(db, blob_id):
+    db.expire_all()
+    return db.query(StoredBlob).filter(StoredBlob.id == blob_id).first()
+
+
+def _age(paths, age: timedelta):
+    timestamp = (datetime.now() - age).timestamp()
+    for path in paths:
+        os.utime(path, (timestamp, timestamp))
+
+
+def test_upload_holds_its_matches_until_collected(db, store):
+    keys = _put_matches(store, "EUW1_1", "EUW1_2")
+    path = _upload(db, "upload_a.json", keys + keys[:1])
+
+    assert _blob(db, "upload:upload_a.json").ref_count == 0
+    for key in keys:
+        assert _blob(db, f"match:{key}").ref_count == 1
+    assert db.query(StoredBlobRef).filter(StoredBlobRef.holder_id == "upload:upload_a.json").count() == 2
+
+    # Saved, then deleted: the upload is collectable again
+    _, analytics = _saved_analysis(db, path, "gc_a")
+    assert _blob(db, "upload:upload_a.json").ref_count == 1
+    assert storage.collect_garbage(db, now=datetime.utcnow() + 2 * RETENTION)["deleted"] == 0
+
+    storage.release_analytics(db, "user_analytics", analytics.id)
+    db.commit()
+    upload = _blob(db, "upload:upload_a.json")
+    assert upload.ref_count == 0 and upload.unreferenced_since is not None
+
+    collected_at = upload.unreferenced_since + RETENTION + MINUTE
+    assert storage.collect_garbage(db, now=collected_at)["deleted"] == 1
+    assert not path.exists()
+    assert _blob(db, "upload:upload_a.json") is None
+    # Its matches are released, and collected on a later pass
+    for key in keys:
+        assert _blob(db, f"match:{key}").ref_count == 0
+        assert store.contains(key)
+
+    _age([p for key in keys for p in store.files(key)], 2 * GRACE)
+    result = storage.collect_garbage(db, now=datetime.utcnow() + GRACE + MINUTE)
+    assert result["deleted"] == 2 and result["freed_bytes"] > 0
+    for key in keys:
+        assert not store.files(key)
+        assert _blob(db, f"match:{key}") is None
+
+
+def test_uploads_are_kept_for_the_retention_period(db, store):
+    keys = _put_matches(store, "EUW1_3")
+    path = _upload(db, "upload_b.json", [])
+    # Written by a rejected upload: referenced by nothing
+    storage.release_store_keys(db, keys)
+    _age(store.files(keys[0]), 2 * GRACE)
+    since = _blob(db, "upload:upload_b.json").unreferenced_since
+
+    assert storage.collect_garbage(db, now=since + GRACE - MINUTE)["deleted"] == 0
+
+    assert storage.collect_garbage(db, now=since + GRACE + MINUTE)["deleted"] == 1
+    assert _blob(db, f"match:{keys[0]}") is None
+    assert path.exists()
+
+    assert storage.collect_garbage(db, now=since + RETENTION - MINUTE)["deleted"] == 0
+    assert storage.collect_garbage(db, now=since + RETENTION + MINUTE)["deleted"] == 1
+    assert not path.exists()
+
+
+def test_orphan_refs_of_cascade_deleted_analyses_are_dropped(db, store):
+    path = _upload(db, "upload_c.json", [])
+    user, analytics = _saved_analysis(db, path, "gc_c")
+    assert storage.drop_orphan_refs(db) == 0
+
+    # Account deletion cascades to the analysis without the storage hook
+    db.delete(user)
+    db.commit()
+    assert _blob(db, "upload:upload_c.json").ref_count == 1
+
+    assert storage.drop_orphan_refs(db) == 1
+    db.commit()
+    upload = _blob(db, "upload:upload_c.json")
+    assert upload.ref_count == 0 and upload.unreferenced_since is not None
+    assert db.query(StoredBlobRef).filter(StoredBlobRef.holder_id == analytics.id).count() == 0
+
+
+def test_recently_touched_matches_are_skipped(db, store):
+    keys = _put_matches(store, "EUW1_4")
+    storage.release_store_keys(db, keys)
+    blob = _blob(db, f"match:{keys[0]}")
+    blob.unreferenced_since = datetime.utcnow() - 2 * GRACE
+    db.commit()
+
+    # Unreferenced long enough, but its files were just written (an upload still being ingested)
+    now = datetime.utcnow()
+    assert storage.collect_garbage(db, now=now)["deleted"] == 0
+    assert store.contains(keys[0])
+    assert _blob(db, f"match:{keys[0]}").unreferenced_since == now
+
+    _age(store.files(keys[0]), 2 * GRACE)
+    assert storage.collect_garbage(db, now=now + GRACE + MINUTE)["deleted"] == 1
+    assert not store.files(keys[0])
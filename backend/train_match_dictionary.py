@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+OpenRift Match Dictionary Training
+
+Trains a zstd dictionary on a sample of the matches in the global match
+store, makes it the dictionary of new matches and recompresses the stored
+ones with it. Matches compressed with an older dictionary stay readable, so
+it can be re-run at any time (e.g. after a game patch changes the payloads).
+
+With --migrate-uploads, uploads still saved as plain Riot matches JSON files
+(before the match store) are first moved into the store and rewritten as
+manifests, which is where most of the uploads volume goes.
+
+USAGE:
+    python train_match_dictionary.py [--samples 2000] [--migrate-uploads]
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+# Add app directory to path
+sys.path.append(str(Path(__file__).parent / "app"))
+
+from database import init_db
+from match_store import MatchCodec, match_store, read_manifest, write_manifest
+from percentiles import percentile_distributions
+
+UPLOAD_DIR = Path(__file__).parent / "uploads"
+
+# zstd needs a reasonable number of samples to find shared content
+MIN_SAMPLES = 20
+
+
+def migrate_uploads() -> int:
+    """Rewrite plain JSON uploads as manifests of stored matches. Returns the bytes saved."""
+    from match_table import remove_artifact
+    from timeline import InvalidTimeline
+
+    saved = 0
+    for path in sorted(UPLOAD_DIR.glob("*.json")):
+        try:
+            if read_manifest(path) is not None:
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Skipping {path.name}: {e}")
+            continue
+        if not isinstance(data, dict) or not isinstance(data.get("matches"), list):
+            continue
+
+        match_refs, timeline_refs, match_rows = [], [], []
+        for match in data["matches"]:
+            if not isinstance(match, dict):
+                continue
+            key, rows, _ = match_store.put(match)
+            if key not in match_refs:
+                match_refs.append(key)
+            if rows is not None:
+                match_rows.append((key, rows))
+        for timeline in data.get("timelines") or ():
+            try:
+                key, _ = match_store.put_timeline(timeline) if isinstance(timeline, dict) else (None, False)
+            except InvalidTimeline as e:
+                print(f"⚠️  {path.name}: timeline skipped ({e})")
+                continue
+            if key and key not in timeline_refs:
+                timeline_refs.append(key)
+
+        percentile_distributions.add_matches(match_rows)
+        before = path.stat().st_size
+        write_manifest(path, match_refs, timeline_refs)
+        remove_artifact(path)
+        saved += before - path.stat().st_size
+        print(f"📦 {path.name}: {len(match_refs)} matches → manifest ({before / 1024 / 1024:.1f} MB freed)")
+
+    return saved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the match store compression dictionary")
+    parser.add_argument("--samples", type=int, default=2000, help="Matches used for training")
+    parser.add_argument("--seed", type=int, default=0, help="Sampling seed")
+    parser.add_argument("--migrate-uploads", action="store_true", help="Move plain JSON uploads into the store first")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.migrate_uploads:
+        init_db()
+        print(f"🔄 Migrating plain JSON uploads in {UPLOAD_DIR}")
+        print(f"✅ {migrate_uploads() / 1024 / 1024:.1f} MB freed")
+
+    keys = sorted(match_store.keys())
+    if len(keys) < MIN_SAMPLES:
+        print(f"❌ Only {len(keys)} matches in {match_store.root} (need {MIN_SAMPLES} to train)")
+        sys.exit(1)
+
+    sample = random.Random(args.seed).sample(keys, min(args.samples, len(keys)))
+    print(f"🧠 Training on {len(sample)} of {len(keys)} matches")
+    dictionary = MatchCodec.train([match_store.get_bytes(key) for key in sample])
+    dict_id = match_store.codec.add_dictionary(dictionary)
+    print(f"✅ Dictionary {dict_id} ({len(dictionary) / 1024:.0f} KB)")
+
+    print("🔄 Recompressing stored matches")
+    delta = sum(match_store.recompress(key) for key in keys)
+    print(f"✅ {len(keys)} matches recompressed ({-delta / 1024 / 1024:+.1f} MB saved) in {time.perf_counter() - start:.1f}s")
@@ -66,6 +66,9 @@ interface SavedAnalytics {
   uploaded_at: string;
   created_by?: string;
   data_path: string;
+}
+
+interface SavedAnalyticsDetail extends SavedAnalytics {
   analysis_results: AnalyticsData;
 }
 
@@ -381,10 +384,23 @@ export default function DataAnalyticsPage() {
     }
   };
 
-  const handleLoadSaved = (analytics: SavedAnalytics) => {
-    setAnalyticsData(analytics.analysis_results);
-    setCurrentFilePath(analytics.data_path);
-    setViewMode('upload');
+  const handleLoadSaved = async (analytics: SavedAnalytics) => {
+    // The list only has summaries: fetch the full results of this analysis
+    try {
+      const token = localStorage.getItem('token');
+      const response = await fetch(`${API_BASE_URL}/api/analytics/detail/team/${analytics.id}`, {
+        headers: { 'Authorization': `Bearer ${token}` }
+      });
+      if (!response.ok) {
+        throw new Error('Failed to load analysis');
+      }
+      const detail: SavedAnalyticsDetail = await response.json();
+      setAnalyticsData(detail.analysis_results);
+      setCurrentFilePath(detail.data_path);
+      setViewMode('upload');
+    } catch (err) {
+      toast.error(err instanceof Error ? err.message : 'Failed to load analysis');
+    }
   };
 
   const handleDeleteTeam = async (id: string) => {